@@ -0,0 +1,266 @@
+"""
+Headless batch merge of PO emails.
+
+Runs the same render -> merge flow as the "Email to PDF" section of the app for
+every email of a mailbox, in parallel, and writes the merged PDFs plus a
+manifest of subject, factory code, COO and PO numbers.
+
+Usage:
+    python batch_email.py MAILBOX [--out DIR] [--workers N] [--reprocess]
+
+MAILBOX may be:
+  * a directory of .msg / .eml files
+  * a Maildir (a directory with cur/, new/ and tmp/)
+  * an mbox file
+
+Every email is identified by a hash of its Message-ID (of its content when it
+has none). Emails already listed in the manifest with status OK are skipped,
+so the same folder can be run again as new emails arrive.
+"""
+import os
+import sys
+import csv
+import time
+import hashlib
+import mailbox
+import argparse
+import traceback
+from datetime import datetime
+from email.parser import BytesHeaderParser
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from email_processor import import_dependencies, merge_email
+
+EMAIL_EXTENSIONS = (".msg", ".eml")
+
+MANIFEST_NAME = "manifest.csv"
+MANIFEST_COLUMNS = [
+    "message_hash", "message_id", "source", "subject", "factory_code", "coo",
+    "po_numbers", "attachments", "merged_pdf", "status", "error", "seconds", "processed_at",
+]
+
+
+def message_id(name, data):
+    """Message-ID header of a .msg/.eml, or "" if it has none"""
+    try:
+        if name.lower().endswith(".msg"):
+            import extract_msg
+            msg = extract_msg.Message(data)
+            try:
+                return (msg.messageId or "").strip()
+            finally:
+                msg.close()
+        return (BytesHeaderParser().parsebytes(data).get("Message-ID") or "").strip()
+    except Exception:
+        return ""
+
+
+def message_hash(msg_id, data):
+    """Short stable id of an email: hash of its Message-ID, of its content without one"""
+    key = msg_id.encode("utf-8") if msg_id else data
+    return hashlib.sha256(key).hexdigest()[:16]
+
+
+def find_emails(mailbox_path):
+    """
+    Emails of a directory, Maildir or mbox: dicts with source, name, message_id,
+    message_hash and either path (files) or data (mailbox messages).
+    """
+    emails = []
+    if os.path.isdir(mailbox_path) and all(
+            os.path.isdir(os.path.join(mailbox_path, sub)) for sub in ("cur", "new", "tmp")):
+        box = mailbox.Maildir(mailbox_path, create=False)
+        label = os.path.basename(os.path.normpath(mailbox_path))
+    elif os.path.isdir(mailbox_path):
+        for name in sorted(os.listdir(mailbox_path)):
+            path = os.path.join(mailbox_path, name)
+            # "~$" files are Outlook lock files
+            if not name.lower().endswith(EMAIL_EXTENSIONS) or name.startswith("~$") or not os.path.isfile(path):
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            msg_id = message_id(name, data)
+            emails.append({
+                "source": path,
+                "name": name,
+                "path": path,
+                "message_id": msg_id,
+                "message_hash": message_hash(msg_id, data),
+            })
+        return emails
+    else:
+        box = mailbox.mbox(mailbox_path, create=False)
+        label = os.path.splitext(os.path.basename(mailbox_path))[0]
+
+    try:
+        for key in sorted(box.keys(), key=str):
+            data = box.get_bytes(key)
+            msg_id = message_id(".eml", data)
+            emails.append({
+                "source": f"{mailbox_path}#{key}",
+                "name": f"{label}_{key}.eml",
+                "data": data,
+                "message_id": msg_id,
+                "message_hash": message_hash(msg_id, data),
+            })
+    finally:
+        box.close()
+    return emails
+
+
+def read_manifest(manifest_path):
+    """Hashes of the emails the manifest lists as processed successfully"""
+    if not os.path.exists(manifest_path) or os.path.getsize(manifest_path) == 0:
+        return set()
+    manifest = pd.read_csv(manifest_path, dtype=str, keep_default_na=False)
+    return set(manifest.loc[manifest["status"] == "OK", "message_hash"])
+
+
+def open_manifest(manifest_path):
+    """Manifest opened for appending, with the header written if the file is new"""
+    new_file = not os.path.exists(manifest_path) or os.path.getsize(manifest_path) == 0
+    f = open(manifest_path, "a", newline="", encoding="utf-8")
+    writer = csv.DictWriter(f, fieldnames=MANIFEST_COLUMNS)
+    if new_file:
+        writer.writeheader()
+        f.flush()
+    return f, writer
+
+
+def manifest_row(email):
+    return {
+        "message_hash": email["message_hash"],
+        "message_id": email["message_id"],
+        "source": email["source"],
+    }
+
+
+def error_row(email, e):
+    """Manifest row of an email whose worker failed outright (e.g. a broken process pool)"""
+    row = manifest_row(email)
+    row.update({
+        "status": "ERROR",
+        "error": f"{type(e).__name__}: {e}",
+        "processed_at": datetime.now().isoformat(timespec="seconds"),
+    })
+    return row
+
+
+def process_email(email, out_dir):
+    """Worker: merge one email, write its PDF and return its manifest row"""
+    start = time.perf_counter()
+    row = manifest_row(email)
+    try:
+        if "data" in email:
+            email_file = BytesIO(email["data"])
+            email_file.name = email["name"]
+        else:
+            email_file = email["path"]
+
+        result = merge_email(email_file, import_dependencies())
+
+        # The hash keeps names unique when several emails share a factory code and file name
+        stem = os.path.splitext(result["merged_pdf_name"])[0]
+        merged_pdf = f"{stem}_{email['message_hash'][:8]}.pdf"
+        with open(os.path.join(out_dir, merged_pdf), "wb") as f:
+            f.write(result["merged_pdf"])
+
+        row.update({
+            "subject": result["subject"],
+            "factory_code": result["factory_code"],
+            "coo": result["coo"],
+            "po_numbers": "; ".join(result["po_numbers"]),
+            "attachments": "; ".join(result["attachments"]),
+            "merged_pdf": merged_pdf,
+            "status": "OK",
+            "error": "",
+        })
+    except ValueError as e:
+        # Expected failures, such as an email without PDF attachments
+        row.update({"status": "ERROR", "error": str(e)})
+    except Exception as e:
+        row.update({"status": "ERROR", "error": f"{e}\n{traceback.format_exc()}"})
+    row["seconds"] = round(time.perf_counter() - start, 2)
+    row["processed_at"] = datetime.now().isoformat(timespec="seconds")
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge a folder or mailbox of PO emails without the Streamlit UI")
+    parser.add_argument("mailbox", help="directory of .msg/.eml files, Maildir or mbox file")
+    parser.add_argument("--out", default="merged_emails", help="output directory (default: merged_emails)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    parser.add_argument("--reprocess", action="store_true", help="process emails already in the manifest again")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.mailbox):
+        print(f"Mailbox not found: {args.mailbox}")
+        return 1
+    emails = find_emails(args.mailbox)
+    if not emails:
+        print("No emails found")
+        return 1
+
+    os.makedirs(args.out, exist_ok=True)
+    manifest_path = os.path.join(args.out, MANIFEST_NAME)
+    done = set() if args.reprocess else read_manifest(manifest_path)
+
+    # Skip processed emails and copies of the same message within this run
+    pending = []
+    skipped = duplicates = 0
+    seen = set()
+    for email in emails:
+        if email["message_hash"] in done:
+            skipped += 1
+        elif email["message_hash"] in seen:
+            duplicates += 1
+        else:
+            seen.add(email["message_hash"])
+            pending.append(email)
+
+    print(f"{len(emails)} email(s), {skipped} already processed, {duplicates} duplicate(s),"
+          f" merging {len(pending)} with {args.workers} worker(s)")
+    if not pending:
+        return 0
+
+    started = time.perf_counter()
+    rows = []
+    manifest_file, writer = open_manifest(manifest_path)
+
+    def record(row):
+        # Each row is on disk as soon as its email is done, so an interrupted
+        # run still skips the emails it finished
+        writer.writerow(row)
+        manifest_file.flush()
+        rows.append(row)
+        print(f"[{len(rows)}/{len(pending)}] {row['source']}: {row['status']} ({row.get('seconds', '-')}s)")
+
+    try:
+        if args.workers > 1 and len(pending) > 1:
+            with ProcessPoolExecutor(max_workers=min(args.workers, len(pending))) as executor:
+                futures = {executor.submit(process_email, email, args.out): email for email in pending}
+                for future in as_completed(futures):
+                    try:
+                        row = future.result()
+                    except Exception as e:
+                        row = error_row(futures[future], e)
+                    record(row)
+        else:
+            for email in pending:
+                record(process_email(email, args.out))
+    finally:
+        manifest_file.close()
+
+    counts = pd.Series([r["status"] for r in rows]).value_counts()
+    print(f"\nDone in {time.perf_counter() - started:.1f}s")
+    for status, count in counts.items():
+        print(f"  {status}: {count}")
+    print(f"Manifest written to {manifest_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
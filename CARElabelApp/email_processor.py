@@ -1,86 +1,143 @@
 import re
 import os
+import importlib.util
 import tempfile
+from io import BytesIO
+import pandas as pd
 import streamlit as st
 from collections import OrderedDict
 import time
 
+# Engine that renders the email body to PDF: "xhtml2pdf" (pisa, the original
+# layout) or "pymupdf" (MuPDF's Story layout: native code, laid out one page
+# at a time, many times faster on long tables; needs PyMuPDF)
+HTML_RENDERERS = ("xhtml2pdf", "pymupdf")
+HTML_RENDERER = "xhtml2pdf"
+
+# Page size and margin (points) of the "pymupdf" renderer
+PDF_PAGE_SIZE = "a4"
+PDF_PAGE_MARGIN = 36
+
+# Engine that merges the email PDF with the attachments: "pypdf2" (PdfMerger)
+# or "pymupdf" (fitz insert_pdf, as CSAPP's merge_pdfs_with_po; copies the pages
+# natively and is much faster on large scanned attachments; needs PyMuPDF)
+PDF_MERGE_ENGINES = ("pypdf2", "pymupdf")
+PDF_MERGE_ENGINE = "pypdf2"
+
+# Save options of the "pymupdf" engine: garbage collection level (0 = off, 1-4 =
+# remove unused objects, up to merging duplicates) and deflate-compressing streams
+PDF_MERGE_GARBAGE = 0
+PDF_MERGE_DEFLATE = False
+
+# PDF attachments stay in memory up to this size; larger ones spill to a
+# private temporary file that is deleted when it is closed
+ATTACHMENT_SPOOL_BYTES = 32 * 1024 * 1024
+
+# pip package of each required module, for the "not found" message
+INSTALL_NAMES = {
+    "PyPDF2": "PyPDF2",
+    "extract_msg": "extract-msg",
+    "xhtml2pdf": "xhtml2pdf",
+    "bs4": "beautifulsoup4",
+}
+
+def import_dependencies():
+    """
+    Import the email and PDF libraries into a dict; raises ModuleNotFoundError
+    for a missing required one. PyMuPDF is optional ('fitz' is None without it).
+    """
+    import email
+    import PyPDF2
+    import extract_msg
+    from xhtml2pdf import pisa
+    from PyPDF2 import PdfMerger, PdfReader
+    from bs4 import BeautifulSoup
+
+    deps = {
+        'PyPDF2': PyPDF2,
+        'extract_msg': extract_msg,
+        'pisa': pisa,
+        'PdfMerger': PdfMerger,
+        'PdfReader': PdfReader,
+        'email': email,
+        'BeautifulSoup': BeautifulSoup,
+    }
+
+    # Optional: only the "pymupdf" renderer and merge engine need it
+    try:
+        import fitz
+        deps['fitz'] = fitz
+    except ModuleNotFoundError:
+        deps['fitz'] = None
+
+    return deps
+
 # Lazy loading of heavy dependencies
 @st.cache_resource
 def load_dependencies():
     """Load heavy dependencies only when needed"""
-    deps = {}
     try:
-        import PyPDF2
-        deps['PyPDF2'] = PyPDF2
-    except ModuleNotFoundError:
-        st.error("Module 'PyPDF2' not found. Install with: pip install PyPDF2")
+        return import_dependencies()
+    except ModuleNotFoundError as e:
+        module = (e.name or "").split(".")[0]
+        st.error(f"Module '{module}' not found. Install with: pip install {INSTALL_NAMES.get(module, module)}")
         st.stop()
-    
-    try:
-        import extract_msg
-        deps['extract_msg'] = extract_msg
-    except ModuleNotFoundError:
-        st.error("Module 'extract_msg' not found. Install with: pip install extract-msg")
-        st.stop()
-    
-    try:
-        from xhtml2pdf import pisa
-        deps['pisa'] = pisa
-    except ModuleNotFoundError:
-        st.error("Module 'xhtml2pdf' not found. Install with: pip install xhtml2pdf")
-        st.stop()
-    
-    try:
-        from PyPDF2 import PdfMerger, PdfReader
-        deps['PdfMerger'] = PdfMerger
-        deps['PdfReader'] = PdfReader
-    except ModuleNotFoundError:
-        st.error("Module 'PyPDF2' not found. Install with: pip install PyPDF2")
-        st.stop()
-    
-    try:
-        import email
-        deps['email'] = email
-    except ModuleNotFoundError:
-        st.error("Module 'email' not found.")
-        st.stop()
-    
-    try:
-        from bs4 import BeautifulSoup
-        deps['BeautifulSoup'] = BeautifulSoup
-    except ModuleNotFoundError:
-        st.error("Module 'beautifulsoup4' not found. Install with: pip install beautifulsoup4")
-        st.stop()
-    
-    return deps
 
-def extract_email_details(file_path, deps):
+def spool_attachment(data):
+    """Attachment bytes in a SpooledTemporaryFile, rewound for reading"""
+    buffer = tempfile.SpooledTemporaryFile(max_size=ATTACHMENT_SPOOL_BYTES)
+    buffer.write(data)
+    buffer.seek(0)
+    return buffer
+
+def close_attachments(attachments):
+    for _, buffer in attachments:
+        buffer.close()
+
+def _read_email_file(email_file):
+    """(file name, bytes) of an email path or uploaded/file-like email"""
+    if isinstance(email_file, str):
+        with open(email_file, "rb") as f:
+            return os.path.basename(email_file), f.read()
+    email_file.seek(0)
+    data = email_file.read()
+    email_file.seek(0)
+    return getattr(email_file, "name", ""), data
+
+def extract_email_details(email_file, deps, with_attachments=True):
+    """
+    Subject, factory code, COO, body HTML and PDF attachments of a .msg/.eml
+    (a path or an uploaded file).
+
+    Attachments are (file name, buffer) pairs held in memory (see
+    ATTACHMENT_SPOOL_BYTES); close them with close_attachments(). With
+    with_attachments=False they are not decoded and the list is empty.
+    """
     subject, factory_code, coo = "", "", ""
     attachments = []
     html_content = ""
+    file_name, data = _read_email_file(email_file)
 
-    if file_path.lower().endswith(".msg"):
+    if file_name.lower().endswith(".msg"):
         try:
-            msg = deps['extract_msg'].Message(file_path)
-            subject = msg.subject or "No Subject"
-            html_content = msg.htmlBody or msg.body or ""
-            if isinstance(html_content, bytes):
-                html_content = html_content.decode(errors="ignore")
-            for att in msg.attachments:
-                if att.longFilename and att.longFilename.lower().endswith(".pdf"):
-                    att_path = os.path.join(tempfile.gettempdir(), att.longFilename)
-                    if not os.path.exists(att_path):
-                        with open(att_path, "wb") as f:
-                            f.write(att.data)
-                    attachments.append(att_path)
+            msg = deps['extract_msg'].Message(data)
+            try:
+                subject = msg.subject or "No Subject"
+                html_content = msg.htmlBody or msg.body or ""
+                if isinstance(html_content, bytes):
+                    html_content = html_content.decode(errors="ignore")
+                for att in (msg.attachments if with_attachments else []):
+                    if att.longFilename and att.longFilename.lower().endswith(".pdf"):
+                        attachments.append((att.longFilename, spool_attachment(att.data)))
+            finally:
+                msg.close()
         except Exception as e:
             st.error(f"Error reading .msg file: {e}")
 
-    elif file_path.lower().endswith(".eml"):
+    elif file_name.lower().endswith(".eml"):
+        plain_content = ""
         try:
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                msg = deps['email'].message_from_file(f)
+            msg = deps['email'].message_from_bytes(data)
             subject = msg.get("subject", "No Subject")
 
             for part in msg.walk():
@@ -90,19 +147,17 @@ def extract_email_details(file_path, deps):
                 if ctype == "text/html" and not html_content:
                     payload = part.get_payload(decode=True)
                     html_content = payload.decode(errors="ignore") if isinstance(payload, bytes) else str(payload)
-                elif ctype == "text/plain" and not html_content:
+                elif ctype == "text/plain" and not plain_content:
+                    # multipart/alternative lists the plain text first; the HTML part wins
                     payload = part.get_payload(decode=True)
-                    html_content = payload.decode(errors="ignore") if isinstance(payload, bytes) else str(payload)
-                elif "attachment" in disp and ctype == "application/pdf":
+                    plain_content = payload.decode(errors="ignore") if isinstance(payload, bytes) else str(payload)
+                elif with_attachments and "attachment" in disp and ctype == "application/pdf":
                     filename = part.get_filename()
                     if filename:
-                        att_path = os.path.join(tempfile.gettempdir(), filename)
-                        if not os.path.exists(att_path):
-                            with open(att_path, "wb") as f:
-                                f.write(part.get_payload(decode=True))
-                        attachments.append(att_path)
+                        attachments.append((filename, spool_attachment(part.get_payload(decode=True))))
         except Exception as e:
             st.error(f"Error reading .eml file: {e}")
+        html_content = html_content or plain_content
 
     # Extract Factory Code & COO
     text_content = deps['BeautifulSoup'](html_content, "html.parser").get_text(" ", strip=True)
@@ -116,17 +171,200 @@ def extract_email_details(file_path, deps):
 
     return subject, factory_code, coo, html_content, attachments
 
-def convert_html_to_pdf(source_html, output_filename, pisa):
+# ---------------------- Structured email ingest ----------------------
+# The email tables and subject are read straight from the HTML body, instead of
+# rendering it to PDF and extracting the same table back with pdfplumber.
+
+# Column positions of the item table used by the PDF extractor, kept as a fallback
+EMAIL_PO_NO_IDX = 5
+EMAIL_GARMENT_DESC_IDX = 8
+
+def _html_parser():
+    """lxml when it is installed (much faster), else the parser bundled with Python"""
+    return "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+def _cell_text(cell):
+    return re.sub(r"\s+", " ", cell.get_text(" ", strip=True)).strip()
+
+def _span(cell, attr):
+    value = str(cell.get(attr, "1")).strip()
+    return int(value) if value.isdigit() and int(value) > 0 else 1
+
+def html_table_to_dataframe(table):
+    """One HTML table as a DataFrame; the first row is the header, rowspan/colspan are expanded"""
+    grid = []
+    spans = {}  # column -> [rows left, text] of cells spanning down from earlier rows
+    for tr in table.find_all("tr"):
+        cells = iter(tr.find_all(["td", "th"], recursive=False))
+        row = []
+        while True:
+            col = len(row)
+            if col in spans:
+                span = spans[col]
+                row.append(span[1])
+                span[0] -= 1
+                if span[0] == 0:
+                    del spans[col]
+                continue
+            cell = next(cells, None)
+            if cell is None:
+                break
+            text = _cell_text(cell)
+            rowspan = _span(cell, "rowspan")
+            for _ in range(_span(cell, "colspan")):
+                if rowspan > 1:
+                    spans[len(row)] = [rowspan - 1, text]
+                row.append(text)
+        if any(row):
+            grid.append(row)
+
+    if len(grid) < 2:
+        return None
+    width = max(len(row) for row in grid)
+    grid = [row + [""] * (width - len(row)) for row in grid]
+
+    # Unique, non-empty column names
+    headers = []
+    for i, name in enumerate(grid[0]):
+        name = name or f"Column {i + 1}"
+        base, n = name, 2
+        while name in headers:
+            name = f"{base} ({n})"
+            n += 1
+        headers.append(name)
+    return pd.DataFrame(grid[1:], columns=headers)
+
+def parse_email_tables(html_content, BeautifulSoup):
+    """Every table of the email body with at least one data row, as DataFrames"""
+    if not html_content:
+        return []
+    soup = BeautifulSoup(html_content, _html_parser())
+    tables = []
+    for table in soup.find_all("table"):
+        # Outlook wraps content in layout tables; only read the innermost ones
+        if table.find("table"):
+            continue
+        df = html_table_to_dataframe(table)
+        if df is not None:
+            tables.append(df)
+    return tables
+
+def po_numbers_from_subject(subject):
+    """PO numbers (6+ digits) of the subject, e.g. "PO 5791097/ 5791121 /5791125 (N51)", in order"""
+    subject_cleaned = re.sub(r"\s*\([^)]*\)\s*$", "", subject or "")
+    return list(OrderedDict.fromkeys(re.findall(r"\b(\d{6,})\b", subject_cleaned)))
+
+def _normalized_header(name):
+    return re.sub(r"[\s_]+", " ", str(name)).strip().lower()
+
+def find_garment_description_table(tables):
+    """The email table that has a "Garment description" column, or None"""
+    for df in tables:
+        if any("garment description" in _normalized_header(col) for col in df.columns):
+            return df
+    return None
+
+def email_item_data(tables):
+    """
+    'PO NO' and 'Garment description' of the email item table, as
+    extract_email_body_item_data reads them from the rendered PDF; None if not found.
+    """
+    df = find_garment_description_table(tables)
+    if df is None:
+        return None
+    headers = [_normalized_header(col) for col in df.columns]
+    garment_idx = next(i for i, h in enumerate(headers) if "garment description" in h)
+    po_idx = next((i for i, h in enumerate(headers) if h in ("po", "po no", "po#", "po #")), None)
+    if po_idx is None:
+        if df.shape[1] <= max(EMAIL_PO_NO_IDX, EMAIL_GARMENT_DESC_IDX):
+            return None
+        po_idx, garment_idx = EMAIL_PO_NO_IDX, EMAIL_GARMENT_DESC_IDX
+
+    items = pd.DataFrame({
+        "PO NO": df.iloc[:, po_idx].astype(str).str.strip(),
+        "Garment description": df.iloc[:, garment_idx].astype(str).str.strip(),
+    })
+    # Skip rows where essential data is missing
+    items = items[(items["PO NO"] != "") & (items["Garment description"] != "")].reset_index(drop=True)
+    return items if not items.empty else None
+
+def ingest_email(email_file):
+    """
+    Structured content of an uploaded .msg/.eml, read from its HTML body.
+
+    Returns a dict with subject, factory_code, coo, po_numbers (from the
+    subject), tables (every body table as a DataFrame), item_data (PO NO /
+    Garment description) and garment_df, or None if the email cannot be read.
+    """
+    try:
+        deps = load_dependencies()
+        # Only the headers and body are needed here; the attachments are read when merging
+        subject, factory_code, coo, html_content, _ = extract_email_details(email_file, deps, with_attachments=False)
+        tables = parse_email_tables(html_content, deps['BeautifulSoup'])
+        return {
+            "subject": subject,
+            "factory_code": factory_code,
+            "coo": coo,
+            "po_numbers": po_numbers_from_subject(subject),
+            "tables": tables,
+            "item_data": email_item_data(tables),
+            "garment_df": find_garment_description_table(tables),
+        }
+    except Exception as e:
+        st.error(f"Error reading email: {e}")
+        return None
+
+def sanitize_filename(filename):
+    """File name without the characters Windows does not allow"""
+    return re.sub(r'[\\/*?:"<>|]', "", filename)
+
+def merged_pdf_name(factory_code, email_name):
+    """Download name of the merged PDF; the factory code comes from the email text, so it is sanitized as well"""
+    return sanitize_filename(f"Merged_PO_{factory_code or 'Unknown'}_{os.path.basename(email_name)}.pdf")
+
+def render_html_pymupdf(source_html, output_filename, fitz):
+    """Lay out the HTML with MuPDF's Story one page at a time and write the pages to output_filename"""
+    mediabox = fitz.paper_rect(PDF_PAGE_SIZE)
+    where = mediabox + (PDF_PAGE_MARGIN, PDF_PAGE_MARGIN, -PDF_PAGE_MARGIN, -PDF_PAGE_MARGIN)
+    story = fitz.Story(html=source_html)
+    writer = fitz.DocumentWriter(output_filename, "compress")
+    try:
+        more = True
+        while more:
+            device = writer.begin_page(mediabox)
+            more, _ = story.place(where)
+            story.draw(device)
+            writer.end_page()
+    finally:
+        writer.close()
+    return 0
+
+def convert_html_to_pdf(source_html, output_filename, pisa, renderer=None, fitz=None):
+    """
+    Render HTML to a PDF with the selected renderer; output_filename is a path
+    or a writable buffer. Returns the number of errors (0 = success).
+    """
+    renderer = renderer or HTML_RENDERER
+    if renderer not in HTML_RENDERERS:
+        raise ValueError(f"Unknown HTML renderer '{renderer}', expected one of {HTML_RENDERERS}")
     if not source_html:
         source_html = "<p>No content available.</p>"
     if isinstance(source_html, bytes):
         source_html = source_html.decode(errors="ignore")
 
+    if renderer == "pymupdf":
+        if fitz is not None:
+            return render_html_pymupdf(source_html, output_filename, fitz)
+        st.warning("PyMuPDF is not installed; rendering the email with xhtml2pdf. Install with: pip install pymupdf")
+
+    if hasattr(output_filename, "write"):
+        return pisa.CreatePDF(source_html, dest=output_filename, encoding="utf-8").err
     with open(output_filename, "wb") as output_file:
         pisa_status = pisa.CreatePDF(source_html, dest=output_file, encoding="utf-8")
     return pisa_status.err
 
-def create_pdf_from_html(html_content, output_path, subject="", factory_code="", coo="", pisa=None):
+def create_pdf_from_html(html_content, output_path, subject="", factory_code="", coo="", pisa=None,
+                         renderer=None, fitz=None):
     header_html = f"""
     <div style="font-family: Arial, sans-serif; padding:10px;">
     <h2 style="color:#2c3e50;">📧 Email Details</h2>
@@ -152,66 +390,105 @@ def create_pdf_from_html(html_content, output_path, subject="", factory_code="",
     """
 
     final_html = table_style + header_html + body_html + "</div>"
-    convert_html_to_pdf(final_html, output_path, pisa)
+    convert_html_to_pdf(final_html, output_path, pisa, renderer=renderer, fitz=fitz)
 
 def merge_pdfs(pdf_list, output_path, PdfMerger, PdfReader):
+    """Merge PDFs given as (name, buffer) pairs into output_path (a path or a writable buffer)"""
     merger = PdfMerger()
-    for pdf in pdf_list:
+    for name, buffer in pdf_list:
         try:
-            with open(pdf, "rb") as f:
-                merger.append(PdfReader(f, strict=False))
+            buffer.seek(0)
+            merger.append(PdfReader(buffer, strict=False))
         except Exception as e:
-            st.warning(f"⚠️ Skipping invalid PDF {pdf}: {e}")
+            st.warning(f"⚠️ Skipping invalid PDF {name}: {e}")
     merger.write(output_path)
     merger.close()
 
-def process_email_to_pdf(email_file):
-    """Process email file and return merged PDF"""
-    # Create a dedicated temporary directory for this operation to avoid permission errors
-    temp_dir = tempfile.mkdtemp()
-    st.info(f"🔧 Using temporary directory: `{temp_dir}`")
+def merge_pdfs_pymupdf(pdf_list, output_path, fitz, garbage=None, deflate=None):
+    """merge_pdfs with PyMuPDF: insert_pdf of every (name, buffer) pair, saved with the given options"""
+    garbage = PDF_MERGE_GARBAGE if garbage is None else garbage
+    deflate = PDF_MERGE_DEFLATE if deflate is None else deflate
+    merged = fitz.open()
+    try:
+        for name, buffer in pdf_list:
+            try:
+                buffer.seek(0)
+                with fitz.open(stream=buffer.read(), filetype="pdf") as pdf:
+                    merged.insert_pdf(pdf)
+            except Exception as e:
+                st.warning(f"⚠️ Skipping invalid PDF {name}: {e}")
+        merged.save(output_path, garbage=garbage, deflate=deflate)
+    finally:
+        merged.close()
+
+def merge_email_pdfs(pdf_list, output_path, deps, engine=None):
+    """Merge (name, buffer) PDFs with the selected engine (PDF_MERGE_ENGINE by default)"""
+    engine = engine or PDF_MERGE_ENGINE
+    if engine not in PDF_MERGE_ENGINES:
+        raise ValueError(f"Unknown PDF merge engine '{engine}', expected one of {PDF_MERGE_ENGINES}")
+    if engine == "pymupdf":
+        if deps['fitz'] is not None:
+            return merge_pdfs_pymupdf(pdf_list, output_path, deps['fitz'])
+        st.warning("PyMuPDF is not installed; merging with PyPDF2. Install with: pip install pymupdf")
+    return merge_pdfs(pdf_list, output_path, deps['PdfMerger'], deps['PdfReader'])
 
-    # Helper function to create a safe filename
-    def sanitize_filename(filename):
-        return re.sub(r'[\\/*?:"<>|]', "", filename)
+def merge_email(email_file, deps):
+    """
+    Render the email body and merge it with the PDF attachments, without any UI.
 
+    email_file is a path or a file-like email with a name. Returns a dict with
+    subject, factory_code, coo, po_numbers, attachments (file names),
+    merged_pdf_name and merged_pdf (bytes); raises ValueError if the email has
+    no PDF attachment.
+    """
+    attachments = []
     try:
-        with st.spinner("⏳ Processing email..."):
-            # Load dependencies only when needed
-            deps = load_dependencies()
-            
-            # Sanitize the uploaded filename to remove problematic characters
-            safe_filename = sanitize_filename(email_file.name)
-            email_path = os.path.join(temp_dir, safe_filename)
-            
-            st.write(f"🔧 Attempting to save email to: `{email_path}`")
-
-            # Try to save the uploaded file to our safe temp directory
-            try:
-                with open(email_path, "wb") as f:
-                    f.write(email_file.read())
-            except PermissionError as e:
-                st.error(f"❌ CRITICAL: Permission denied when trying to save the email file.")
-                st.error(f"Your system's security software (Antivirus) is likely blocking access to the temp folder.")
-                st.error(f"Please add an exclusion for Python or the temp folder in your Antivirus settings.")
-                st.exception(e)
-                return None
+        file_name, _ = _read_email_file(email_file)
+        # Sanitize the filename to remove problematic characters
+        safe_filename = sanitize_filename(os.path.basename(file_name))
+
+        subject, factory_code, coo, html_content, attachments = extract_email_details(email_file, deps)
+
+        if not attachments:
+            raise ValueError("No PO PDF attachments found in the email.")
 
-            subject, factory_code, coo, html_content, attachments = extract_email_details(email_path, deps)
+        email_pdf = BytesIO()
+        create_pdf_from_html(html_content, email_pdf, subject, factory_code, coo, deps['pisa'],
+                             fitz=deps['fitz'])
 
-            if not attachments:
-                st.error("⚠️ No PO PDF attachments found in the email.")
-                return None
+        merged_pdf = BytesIO()
+        merge_email_pdfs([(f"{safe_filename}_content.pdf", email_pdf)] + attachments, merged_pdf, deps)
 
-            email_pdf = os.path.join(temp_dir, f"{safe_filename}_content.pdf")
-            create_pdf_from_html(html_content, email_pdf, subject, factory_code, coo, deps['pisa'])
+        return {
+            "subject": subject,
+            "factory_code": factory_code,
+            "coo": coo,
+            "po_numbers": po_numbers_from_subject(subject),
+            "attachments": [name for name, _ in attachments],
+            "merged_pdf_name": merged_pdf_name(factory_code, file_name),
+            "merged_pdf": merged_pdf.getvalue(),
+        }
+    finally:
+        close_attachments(attachments)
+
+def process_email_to_pdf(email_file):
+    """
+    Render the email body and merge it with the PDF attachments.
 
-            merged_pdf = os.path.join(temp_dir, f"Merged_PO_{factory_code or 'Unknown'}_{safe_filename}.pdf")
-            merge_pdfs([email_pdf] + attachments, merged_pdf, deps['PdfMerger'], deps['PdfReader'])
+    Everything stays in memory (attachments above ATTACHMENT_SPOOL_BYTES spill to
+    private temporary files). Returns (merged PDF file name, merged PDF bytes), or None.
+    """
+    try:
+        with st.spinner("⏳ Processing email..."):
+            # Load dependencies only when needed
+            deps = load_dependencies()
+            result = merge_email(email_file, deps)
+            return result["merged_pdf_name"], result["merged_pdf"]
 
-            return merged_pdf, temp_dir
-    
+    except ValueError as e:
+        st.error(f"⚠️ {e}")
+        return None
     except Exception as e:
         st.error(f"❌ An unexpected error occurred during processing.")
         st.exception(e)
-        return None, temp_dir
\ No newline at end of file
+        return None
@@ -1,15 +1,14 @@
 import streamlit as st
-import os
 import tempfile
-import shutil
 import sys
 import pandas as pd
 import re
+import hashlib
 import pdfplumber
 
 # Import modules
 from ui_components import initialize_page, initialize_session_state, create_sidebar, display_wo_details
-from email_processor import process_email_to_pdf
+from email_processor import process_email_to_pdf, ingest_email
 from wo_extractor import process_wo_file, extract_wo_items_table_enhanced, extract_size_breakdown_table_robust, extract_and_sort_wo_sizes
 # Corrected and Consolidated po_extractor imports
 from po_extractor import (
@@ -66,6 +65,18 @@ def extract_po_size_breakdown(po_list):
     
     return po_sizes
 
+def email_data_for(merged_po_file):
+    """
+    Content parsed from the uploaded email, if merged_po_file is the PDF that
+    Convert & Merge built from it (same bytes), otherwise None.
+    """
+    email_data = st.session_state.get("email_data")
+    if not email_data or not email_data.get("merged_pdf_hash"):
+        return None
+    if hashlib.sha256(merged_po_file.getvalue()).hexdigest() != email_data["merged_pdf_hash"]:
+        return None
+    return email_data
+
 # --- CORRECTION APPLIED HERE (Outside main() for testing/demonstration) ---
 pdf_file_path = "Merged_PO_Unknown_BIA_FF_SP_26_INQ_02_PINK KNIT 2_  K43913A6  N51  LBL.CARE_LB 5801 PO 5786464  5786466.msg.pdf"
 
@@ -104,23 +115,33 @@ def main():
         st.markdown("### 📧 Email → PDF Merger (Multiple POs Supported)")
         email_file = st.file_uploader("📩 Upload your email file", type=["msg", "eml"], key="email_uploader")
         
+        # Read the subject and body tables straight from the email; the PO analysis
+        # uses them for the merged PDF built from this email instead of re-extracting them
+        if email_file:
+            # Content hash: another email with the same name and size is a new upload
+            email_key = hashlib.sha256(email_file.getvalue()).hexdigest()
+            if st.session_state.get("email_key") != email_key:
+                st.session_state.email_data = ingest_email(email_file)
+                st.session_state.email_key = email_key
+        else:
+            st.session_state.pop("email_data", None)
+            st.session_state.pop("email_key", None)
+        
         if email_file and st.button("⚡ Convert & Merge", key="convert_merge"):
             result = process_email_to_pdf(email_file)
             
             if result:
-                merged_pdf, temp_dir = result
+                merged_pdf_name, merged_pdf = result
+                # Ties the parsed email content to exactly this PDF for the PO analysis
+                if st.session_state.get("email_data"):
+                    st.session_state.email_data["merged_pdf_hash"] = hashlib.sha256(merged_pdf).hexdigest()
                 
-                with open(merged_pdf, "rb") as f:
-                    st.download_button(
-                        label="⬇️ Download Merged PDF",
-                        data=f,
-                        file_name=os.path.basename(merged_pdf),
-                        mime="application/pdf"
-                    )
-                
-                # --- CLEANUP ---
-                st.write(f"🧹 Cleaning up temporary directory: `{temp_dir}`")
-                shutil.rmtree(temp_dir, ignore_errors=True)
+                st.download_button(
+                    label="⬇️ Download Merged PDF",
+                    data=merged_pdf,
+                    file_name=merged_pdf_name,
+                    mime="application/pdf"
+                )
     
     st.markdown("---")
     
@@ -237,33 +258,46 @@ def main():
                     if st.checkbox("Show debug info", key="po_debug"):
                         display_email_po_debug_info(merged_po_file)
                     
+                    # Email content parsed from the uploaded email, when this PDF was merged from it
+                    email_data = email_data_for(merged_po_file)
+                    
                     # Extract and display the email subject line
-                    with pdfplumber.open(merged_po_file) as pdf:
-                        first_page_text = pdf.pages[0].extract_text() or ""
-                        # Look for subject after "PO #" or "PO "
-                        subject_match = re.search(r'PO\s*#?\s*(.*?)(?:\n|Factory\s*Code:|COO:)', first_page_text, re.IGNORECASE | re.DOTALL)
-                        if subject_match:
-                            subject = subject_match.group(1).strip()
-                            st.markdown("### 📧 Email Subject")
-                            st.info(subject)
+                    subject, po_numbers = None, []
+                    if email_data:
+                        subject, po_numbers = email_data["subject"], email_data["po_numbers"]
+                    else:
+                        with pdfplumber.open(merged_po_file) as pdf:
+                            first_page_text = pdf.pages[0].extract_text() or ""
+                            # Look for subject after "PO #" or "PO "
+                            subject_match = re.search(r'PO\s*#?\s*(.*?)(?:\n|Factory\s*Code:|COO:)', first_page_text, re.IGNORECASE | re.DOTALL)
+                            if subject_match:
+                                subject = subject_match.group(1).strip()
+                                # Extract all numbers separated by "/"
+                                po_numbers = re.findall(r'(\d+)\s*/\s*', subject)
+                    
+                    if subject:
+                        st.markdown("### 📧 Email Subject")
+                        st.info(subject)
+                        
+                        if po_numbers:
+                            st.markdown("### 📋 Extracted PO Numbers")
+                            # Display all extracted numbers
+                            for i, po_num in enumerate(po_numbers, 1):
+                                st.write(f"{i}. {po_num}")
                             
-                            # Extract all numbers separated by "/"
-                            po_numbers = re.findall(r'(\d+)\s*/\s*', subject)
-                            if po_numbers:
-                                st.markdown("### 📋 Extracted PO Numbers")
-                                # Display all extracted numbers
-                                for i, po_num in enumerate(po_numbers, 1):
-                                    st.write(f"{i}. {po_num}")
-                                
-                                # Also show as a comma-separated list
-                                po_list_str = ", ".join(po_numbers)
-                                st.text(f"All PO Numbers: {po_list_str}")
+                            # Also show as a comma-separated list
+                            po_list_str = ", ".join(po_numbers)
+                            st.text(f"All PO Numbers: {po_list_str}")
                     
-                    po_list = extract_merged_po_details(merged_po_file)
+                    # Show PO numbers found only in subject line
+                    if email_data:
+                        email_po_numbers = email_data["po_numbers"]
+                    else:
+                        email_po_numbers = extract_po_numbers_from_email_body(merged_po_file)
+                    
+                    po_list = extract_merged_po_details(merged_po_file, email_po_numbers=email_po_numbers)
                     st.session_state.po_data = po_list
                     
-                    # Show PO numbers found only in subject line
-                    email_po_numbers = extract_po_numbers_from_email_body(merged_po_file)
                     if email_po_numbers:
                         st.info(f"📧 Found {len(email_po_numbers)} PO numbers in subject line:")
                         # Display all PO numbers in a clean format
@@ -289,7 +323,10 @@ def main():
                     st.subheader("📋 Email Body Item Data (Color/Garment)")
                     
                     # Use the new, correct extraction function
-                    email_items_df = extract_email_body_item_data(merged_po_file)
+                    if email_data:
+                        email_items_df = email_data["item_data"]
+                    else:
+                        email_items_df = extract_email_body_item_data(merged_po_file)
                     
                     if email_items_df is not None:
                         st.dataframe(email_items_df, use_container_width=True)
@@ -339,8 +376,12 @@ def main():
         st.markdown("### 📋 Garment Description Table (PO Attachments)")
         
         # Extract the garment description table
-        with st.spinner("Extracting Garment description table..."):
-            garment_df = extract_garment_description_table(merged_po_file)
+        email_data = email_data_for(merged_po_file)
+        if email_data:
+            garment_df = email_data["garment_df"]
+        else:
+            with st.spinner("Extracting Garment description table..."):
+                garment_df = extract_garment_description_table(merged_po_file)
         
         if garment_df is not None and not garment_df.empty:
             st.success("✅ Garment description table extracted successfully!")
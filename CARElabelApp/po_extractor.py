@@ -1,9 +1,20 @@
 import streamlit as st
+import io
+import os
 import re
 import pdfplumber
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import List, Dict, Any, Optional
 
+# Parallel extraction of merged PO PDFs: worker processes (None = CPU count),
+# minimum page count before the pool is worth its start-up cost, and page
+# ranges handed out per worker so uneven pages balance out
+PARALLEL_WORKERS = None
+PARALLEL_MIN_PAGES = 8
+PARALLEL_CHUNKS_PER_WORKER = 2
+
 
 # =============================================================================
 # MAIN EXTRACTION FUNCTIONS
@@ -144,71 +155,144 @@ def extract_email_body_data(pdf_file) -> Optional[pd.DataFrame]:
     
     return None
 
-def extract_merged_po_details(pdf_file) -> List[Dict[str, Any]]:
+def _read_pdf_bytes(pdf_file) -> bytes:
+    """Raw bytes of a path, bytes object or uploaded/file-like PDF"""
+    if isinstance(pdf_file, (bytes, bytearray)):
+        return bytes(pdf_file)
+    if isinstance(pdf_file, str):
+        with open(pdf_file, "rb") as f:
+            return f.read()
+    pdf_file.seek(0)
+    data = pdf_file.read()
+    pdf_file.seek(0)
+    return data
+
+def extract_po_from_page_text(text: str, page_num: int, email_po_numbers: List[str]) -> Optional[Dict[str, Any]]:
+    """Build the PO record for one page of a merged PDF, or None if it is not a PO page"""
+    # More flexible PO detection - check for multiple patterns
+    is_po_page = (
+        ("Purchase Order" in text and "PO No." in text) or
+        ("BFF" in text and re.search(r'BFF\s+\d+', text)) or
+        ("PO No." in text and re.search(r'PO\s*No\.?\s*:?\s*\d+', text))
+    )
+    if not is_po_page:
+        return None
+
+    # Extract PO number using multiple methods
+    po_number = extract_po_number(text)
+    if not po_number:
+        # Try alternative extraction
+        alt_po_match = re.search(r'PO\s*No\.?\s*:?\s*(\d+)', text)
+        if alt_po_match:
+            po_number = alt_po_match.group(1)
+
+    if not po_number:  # Only process if we found a PO number
+        return None
+
+    supplier_info = extract_supplier_info(text)
+    items = extract_po_items_enhanced(text)
+    
+    # 🔥 NEW: Consolidate duplicate sizes
+    items = consolidate_duplicate_sizes(items)
+    
+    po_details = extract_additional_po_details(text)
+    
+    # Calculate total quantity safely
+    total_quantity = 0
+    for item in items:
+        try:
+            if item.get('quantity') and item['quantity'] != '':
+                total_quantity += float(item['quantity'])
+        except (ValueError, TypeError):
+            # Skip invalid quantities
+            continue
+    
+    # Check if this PO number matches any from the email
+    matching_email_po = ""
+    for email_po in email_po_numbers:
+        if po_number == email_po:
+            matching_email_po = email_po
+            break
+    
+    print(f"Extracted PO {po_number} from page {page_num + 1}")
+    return {
+        'po_number': po_number,
+        'email_po_number': matching_email_po,  # Add the matching email PO number
+        'supplier': supplier_info['supplier'],
+        'items': items,
+        'total_quantity': int(total_quantity),  # Convert to int at end
+        'page_number': page_num + 1,  # Add page number for debugging
+        **po_details
+    }
+
+def extract_po_page_range(pdf_bytes: bytes, page_nums: List[int], email_po_numbers: List[str]) -> List[Dict[str, Any]]:
+    """Extract the PO records of a range of pages; runs inside a worker process in parallel mode"""
+    results = []
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for page_num in page_nums:
+            text = pdf.pages[page_num].extract_text() or ""
+            po = extract_po_from_page_text(text, page_num, email_po_numbers)
+            if po:
+                results.append(po)
+    return results
+
+def split_page_ranges(page_count: int, chunks: int) -> List[List[int]]:
+    """Split 0..page_count-1 into at most `chunks` contiguous ranges of near-equal size"""
+    chunks = max(1, min(chunks, page_count))
+    size, extra = divmod(page_count, chunks)
+    ranges = []
+    start = 0
+    for i in range(chunks):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+def extract_merged_po_details(pdf_file, workers: Optional[int] = None,
+                              min_parallel_pages: int = PARALLEL_MIN_PAGES,
+                              email_po_numbers: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Extract every PO page of a merged email+PO PDF.
+
+    email_po_numbers are the PO numbers of the email subject; when they are
+    already known from the email itself, the subject is not searched in the PDF.
+
+    Documents with at least min_parallel_pages pages are split into contiguous
+    page ranges that are processed in a process pool of `workers` processes
+    (default PARALLEL_WORKERS, or the CPU count); results are reassembled in
+    page order. Smaller documents, workers=1 or a failing pool use the serial path.
+    """
     po_list = []
     try:
         # Extract all PO numbers from email body first
-        email_po_numbers = extract_po_numbers_from_email_body(pdf_file)
+        if email_po_numbers is None:
+            email_po_numbers = extract_po_numbers_from_email_body(pdf_file)
+        pdf_bytes = _read_pdf_bytes(pdf_file)
         
-        with pdfplumber.open(pdf_file) as pdf:
+        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+            page_count = len(pdf.pages)
+        
+        workers = workers or PARALLEL_WORKERS or os.cpu_count() or 1
+        page_ranges = None
+        if workers > 1 and page_count >= min_parallel_pages:
+            page_ranges = split_page_ranges(page_count, workers * PARALLEL_CHUNKS_PER_WORKER)
+            try:
+                with ProcessPoolExecutor(max_workers=min(workers, len(page_ranges))) as executor:
+                    futures = [
+                        executor.submit(extract_po_page_range, pdf_bytes, page_nums, email_po_numbers)
+                        for page_nums in page_ranges
+                    ]
+                    # Futures are in page-range order, so the PO list stays in page order
+                    for future in futures:
+                        po_list.extend(future.result())
+            except (OSError, BrokenProcessPool) as e:
+                print(f"Parallel PO extraction unavailable ({e}), falling back to serial")
+                po_list = []
+                page_ranges = None
+        
+        if page_ranges is None:
             # Process ALL pages for detailed extraction (including first page)
-            for page_num in range(len(pdf.pages)):  # Start from 0 to include first page
-                page = pdf.pages[page_num]
-                text = page.extract_text() or ""
-                
-                # More flexible PO detection - check for multiple patterns
-                is_po_page = (
-                    ("Purchase Order" in text and "PO No." in text) or
-                    ("BFF" in text and re.search(r'BFF\s+\d+', text)) or
-                    ("PO No." in text and re.search(r'PO\s*No\.?\s*:?\s*\d+', text))
-                )
-                
-                if is_po_page:
-                    # Extract PO number using multiple methods
-                    po_number = extract_po_number(text)
-                    if not po_number:
-                        # Try alternative extraction
-                        alt_po_match = re.search(r'PO\s*No\.?\s*:?\s*(\d+)', text)
-                        if alt_po_match:
-                            po_number = alt_po_match.group(1)
-                    
-                    if po_number:  # Only process if we found a PO number
-                        supplier_info = extract_supplier_info(text)
-                        items = extract_po_items_enhanced(text)
-                        
-                        # 🔥 NEW: Consolidate duplicate sizes
-                        items = consolidate_duplicate_sizes(items)
-                        
-                        po_details = extract_additional_po_details(text)
-                        
-                        # Calculate total quantity safely
-                        total_quantity = 0
-                        for item in items:
-                            try:
-                                if item.get('quantity') and item['quantity'] != '':
-                                    total_quantity += float(item['quantity'])
-                            except (ValueError, TypeError):
-                                # Skip invalid quantities
-                                continue
-                        
-                        # Check if this PO number matches any from the email
-                        matching_email_po = ""
-                        for email_po in email_po_numbers:
-                            if po_number == email_po:
-                                matching_email_po = email_po
-                                break
-                        
-                        po_list.append({
-                            'po_number': po_number,
-                            'email_po_number': matching_email_po,  # Add the matching email PO number
-                            'supplier': supplier_info['supplier'],
-                            'items': items,
-                            'total_quantity': int(total_quantity),  # Convert to int at end
-                            'page_number': page_num + 1,  # Add page number for debugging
-                            **po_details
-                        })
-                        
-                        print(f"Extracted PO {po_number} from page {page_num + 1}")
+            po_list = extract_po_page_range(pdf_bytes, list(range(page_count)), email_po_numbers)
     
     except Exception as e:
         st.error(f"Error extracting PO details: {str(e)}")
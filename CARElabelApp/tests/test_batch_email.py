@@ -0,0 +1,56 @@
+import os
+import sys
+from email.message import EmailMessage
+
+import fitz  # PyMuPDF
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch_email
+
+
+def make_po_email(path, factory_code, message_id="<po1@example.com>"):
+    """.eml with a factory code in the body and a one-page PO PDF attached"""
+    with fitz.open() as pdf:
+        pdf.new_page().insert_text((72, 72), "PO 5786464")
+        attachment = pdf.tobytes()
+
+    msg = EmailMessage()
+    msg["Subject"] = "PO 5786464 (N51)"
+    msg["Message-ID"] = message_id
+    msg.set_content(f"Factory Code: {factory_code}\nCOO: Sri Lanka")
+    msg.add_attachment(attachment, maintype="application", subtype="pdf", filename="po1.pdf")
+    with open(path, "wb") as f:
+        f.write(msg.as_bytes())
+
+
+def test_factory_code_with_slash_gives_a_safe_file_name(tmp_path):
+    mailbox_dir = tmp_path / "mail"
+    out_dir = tmp_path / "out"
+    mailbox_dir.mkdir()
+    make_po_email(mailbox_dir / "po.eml", "AB/12")
+
+    assert batch_email.main([str(mailbox_dir), "--out", str(out_dir), "--workers", "1"]) == 0
+
+    manifest = pd.read_csv(out_dir / batch_email.MANIFEST_NAME, dtype=str, keep_default_na=False)
+    assert list(manifest["status"]) == ["OK"]
+    assert manifest.loc[0, "factory_code"] == "AB/12"
+    merged_pdf = manifest.loc[0, "merged_pdf"]
+    assert "/" not in merged_pdf
+    assert (out_dir / merged_pdf).is_file()
+
+
+def test_processed_emails_are_skipped_on_the_next_run(tmp_path):
+    mailbox_dir = tmp_path / "mail"
+    out_dir = tmp_path / "out"
+    mailbox_dir.mkdir()
+    make_po_email(mailbox_dir / "po.eml", "K43913A6")
+    args = [str(mailbox_dir), "--out", str(out_dir), "--workers", "1"]
+
+    batch_email.main(args)
+    make_po_email(mailbox_dir / "po2.eml", "K43913A6", message_id="<po2@example.com>")
+    batch_email.main(args)
+
+    manifest = pd.read_csv(out_dir / batch_email.MANIFEST_NAME, dtype=str, keep_default_na=False)
+    assert sorted(manifest["source"].map(os.path.basename)) == ["po.eml", "po2.eml"]
@@ -0,0 +1,246 @@
+import hashlib
+
+import pandas as pd
+
+from excel_utils import combine_excel_tables
+from excel_cache import read_excel_files_cached
+from extraction_cache import cached_extract
+from pdf_utils import (
+    ParsedPDF,
+    DEFAULT_TEXT_BACKEND,
+    extract_style_numbers_from_po_first_page,
+    extract_po_number,
+    extract_all_so_numbers_from_wo,
+    extract_wo_fields,
+    extract_po_fields,
+    extract_wo_items_table,
+    extract_po_details,
+    reorder_wo_by_size,
+    reorder_po_by_size,
+    compare_addresses,
+    check_vsba_in_po_line,
+    extract_item_description_product_code_and_check_vsba,
+    extract_wo_product_code_with_vsba,
+    extract_po_product_code_with_vsba,
+    compare_vsba_status
+)
+from data_comparison import (
+    enhanced_quantity_matching,
+    compare_codes,
+    build_code_table,
+    get_excel_style_number,
+    backfill_style_2_from_excel,
+    combine_wo_and_excel_data,
+    build_so_color_table
+)
+
+
+def load_excel_data(excel_files, workers=None):
+    """Read and process the table data of one or more Excel files, as the Excel extractor does"""
+    normalized_tables = [normalized for _, normalized in read_excel_files_cached(excel_files, workers=workers)]
+    if all(normalized.empty for normalized in normalized_tables):
+        return None
+    return combine_excel_tables(normalized_tables)
+
+
+def dataframe_sha256(df):
+    """Content hash of a DataFrame (values, index and columns); None for no data"""
+    if df is None:
+        return None
+    digest = hashlib.sha256()
+    digest.update(repr(list(df.columns)).encode("utf-8"))
+    try:
+        digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    except TypeError:
+        # Unhashable cell values (lists, dicts): fall back to the CSV text
+        digest.update(df.to_csv().encode("utf-8"))
+    return digest.hexdigest()
+
+
+def drop_empty_wo_columns(wo_items):
+    """WO items as a DataFrame without empty columns and without WO Product Code"""
+    wo_df = pd.DataFrame(wo_items)
+    for col in wo_df.columns:
+        if wo_df[col].isnull().all() or (wo_df[col].astype(str).str.strip() == '').all():
+            wo_df = wo_df.drop(columns=[col])
+    if 'WO Product Code' in wo_df.columns:
+        wo_df = wo_df.drop(columns=['WO Product Code'])
+    return wo_df
+
+
+def get_vsba_status(vsba_comparison):
+    """Overall VSBA status from compare_vsba_status output (dict or DataFrame)"""
+    if isinstance(vsba_comparison, dict):
+        return vsba_comparison.get("Status", "")
+    if isinstance(vsba_comparison, pd.DataFrame) and not vsba_comparison.empty:
+        if "Status" in vsba_comparison.columns:
+            return vsba_comparison["Status"].iloc[0]
+        if "Overall Status" in vsba_comparison.columns:
+            return vsba_comparison["Overall Status"].iloc[0]
+    return None
+
+
+def evaluate_match_status(addr_res, code_table_df, matched, mismatched, combined_df, so_color_df, vsba_comparison):
+    """Run every verification check; returns (match_status, issues, checks)"""
+    combined_perfect_match = False
+    if not combined_df.empty and "Overall Match" in combined_df.columns:
+        combined_perfect_match = all(combined_df["Overall Match"] == "✅ Full Match")
+
+    so_color_perfect_match = False
+    if not so_color_df.empty and "Status" in so_color_df.columns:
+        so_color_perfect_match = all(so_color_df["Status"] == "✅ Match")
+
+    matched_df = pd.DataFrame(matched) if matched else pd.DataFrame()
+    vsba_status = get_vsba_status(vsba_comparison)
+
+    checks = {
+        "address_ok": addr_res.get("Status", "") == "✅ Match",
+        "codes_ok": not code_table_df.empty and all(code_table_df["🔍 Match Status"].isin(["✅ Exact Match", "✅ Partial Match"])),
+        "matched_ok": not matched_df.empty and all(matched_df["Status"] == "🟩 Full Match"),
+        "mismatched_empty": len(mismatched) == 0,
+        "combined_perfect_match": combined_perfect_match,
+        "so_color_perfect_match": so_color_perfect_match,
+        "vsba_ok": vsba_status in ("✅ Both have VSBA", "❌ Neither has VSBA"),
+    }
+
+    if all(checks.values()):
+        return "PERFECT MATCH!", [], checks
+
+    issues = []
+    if not checks["address_ok"]:
+        issues.append("Address mismatch")
+    if not checks["codes_ok"]:
+        issues.append("Product code mismatch")
+    if not checks["matched_ok"] or not checks["mismatched_empty"]:
+        issues.append("Item matching issues")
+    if not checks["combined_perfect_match"]:
+        issues.append("WO/Excel data mismatch")
+    if not checks["so_color_perfect_match"]:
+        issues.append("SO/Color mismatch")
+    if not checks["vsba_ok"]:
+        if vsba_status:
+            issues.append(f"VSBA mismatch (Status: {vsba_status})")
+        else:
+            issues.append("VSBA mismatch (status not found)")
+    return "NOT PERFECT", issues, checks
+
+
+def run_analysis(wo_file, po_file, excel_data=None, backend=DEFAULT_TEXT_BACKEND, matching_mode="indexed"):
+    """
+    Run the full WO vs PO comparison without any UI.
+
+    wo_file and po_file may be uploads, file-like objects, bytes or ParsedPDF
+    objects; excel_data is the processed Excel table (or None); matching_mode
+    is one of data_comparison.MATCHING_MODES. Returns a dict
+    with every intermediate table the Streamlit page displays plus the final
+    match status and log fields.
+    """
+    wo_doc = wo_file if isinstance(wo_file, ParsedPDF) else ParsedPDF(wo_file, backend=backend)
+    po_doc = po_file if isinstance(po_file, ParsedPDF) else ParsedPDF(po_file, backend=backend)
+
+    wo = cached_extract(wo_doc, extract_wo_fields)
+    po = cached_extract(po_doc, extract_po_fields)
+    wo_items = cached_extract(wo_doc, extract_wo_items_table, wo["product_codes"])
+    wo_items = reorder_wo_by_size(wo_items)
+
+    po_details_result = cached_extract(po_doc, extract_po_details)
+    po_product_codes_from_item = po_details_result.get("po_product_codes_from_item", [])
+    po_details = reorder_po_by_size(po_details_result["po_items"])
+
+    addr_res = compare_addresses(wo, po)
+    code_res = compare_codes(po_details, wo_items, po_product_codes_from_item)
+    code_table_df = build_code_table(po_details, wo_items, po_product_codes_from_item)
+
+    po_number = cached_extract(po_doc, extract_po_number)
+    so_numbers = cached_extract(wo_doc, extract_all_so_numbers_from_wo)
+    vsba_in_po_line = cached_extract(po_doc, check_vsba_in_po_line)
+    item_desc_product_code, vsba_in_item_desc = cached_extract(po_doc, extract_item_description_product_code_and_check_vsba)
+
+    excel_style_number = None
+    if excel_data is not None:
+        excel_style_number = get_excel_style_number(excel_data)
+
+    matched, mismatched = enhanced_quantity_matching(
+        wo_items, po_details, tolerance=0, excel_style=excel_style_number, mode=matching_mode
+    )
+
+    wo_vsba_data = cached_extract(wo_doc, extract_wo_product_code_with_vsba)
+    po_vsba_data = cached_extract(po_doc, extract_po_product_code_with_vsba)
+    vsba_comparison = compare_vsba_status(wo_vsba_data, po_vsba_data)
+
+    # Tell the user when the Excel style filled in for a PO without Style 2
+    excel_style_notice = None
+    if excel_data is not None and matched and any(not item.get("Style 2", "") for item in matched + mismatched):
+        po_has_style_2 = any(po_item.get("Style 2", "") for po_item in po_details)
+        items_have_style_2 = any(item.get("Style 2", "") for item in matched + mismatched)
+        if not po_has_style_2 and items_have_style_2:
+            excel_style_notice = get_excel_style_number(excel_data)
+
+    matched, mismatched = backfill_style_2_from_excel(matched, mismatched, excel_data)
+
+    wo_df = drop_empty_wo_columns(wo_items)
+    combined_df = pd.DataFrame()
+    if excel_data is not None and not excel_data.empty:
+        combined_df = combine_wo_and_excel_data(wo_df, excel_data)
+
+    so_color_df = build_so_color_table(so_numbers, wo_items)
+
+    match_status, issues, checks = evaluate_match_status(
+        addr_res, code_table_df, matched, mismatched, combined_df, so_color_df, vsba_comparison
+    )
+
+    wo_product_codes = []
+    for item in wo_items:
+        code = item.get("WO Product Code", "")
+        if code:
+            if isinstance(code, list):
+                for c in code:
+                    if c and c.strip():
+                        wo_product_codes.append(c.strip().upper())
+            elif code.strip():
+                wo_product_codes.append(code.strip().upper())
+
+    references = []
+    extracted_styles = cached_extract(po_doc, extract_style_numbers_from_po_first_page)
+    if extracted_styles:
+        references.extend(extracted_styles)
+    for item in wo_items:
+        style = item.get("Style", "")
+        if style and style not in references:
+            references.append(style)
+    for item in po_details:
+        style = item.get("Style 2", "")
+        if style and style not in references:
+            references.append(style)
+
+    return {
+        "wo": wo,
+        "po": po,
+        "wo_items": wo_items,
+        "wo_df": wo_df,
+        "po_details": po_details,
+        "po_product_codes_from_item": po_product_codes_from_item,
+        "addr_res": addr_res,
+        "code_res": code_res,
+        "code_table_df": code_table_df,
+        "matched": matched,
+        "mismatched": mismatched,
+        "po_number": po_number,
+        "so_numbers": so_numbers,
+        "vsba_in_po_line": vsba_in_po_line,
+        "item_desc_product_code": item_desc_product_code,
+        "vsba_in_item_desc": vsba_in_item_desc,
+        "excel_style_number": excel_style_number,
+        "excel_style_notice": excel_style_notice,
+        "wo_vsba_data": wo_vsba_data,
+        "po_vsba_data": po_vsba_data,
+        "vsba_comparison": vsba_comparison,
+        "combined_df": combined_df,
+        "so_color_df": so_color_df,
+        "match_status": match_status,
+        "issues": issues,
+        "checks": checks,
+        "references": references,
+        "first_product_code": wo_product_codes[0] if wo_product_codes else "",
+        "first_reference": references[0] if references else "",
+    }
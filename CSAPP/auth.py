@@ -36,27 +36,52 @@ def authenticate_user():
             </div>
             """, unsafe_allow_html=True)
             
-            search_date = st.date_input(
-                "Select date to search:",
-                help="Select the date for which you want to retrieve logs"
+            today = datetime.now().date()
+            search_dates = st.date_input(
+                "Select date range to search:",
+                value=(today, today),
+                help="Select one date, or the first and last date of a range"
             )
             
             if st.button("Search Logs", key="search_logs"):
-                from logging_utils import read_log_file_and_convert_to_excel
-                date_str = search_date.strftime("%Y-%m-%d")
-                excel_file, message = read_log_file_and_convert_to_excel(date_str)
+                from logging_utils import log_report, report_to_excel, NOT_PERFECT_STATUS
+                # A single picked date is a one-day range
+                if isinstance(search_dates, (tuple, list)):
+                    start_date = search_dates[0]
+                    end_date = search_dates[-1]
+                else:
+                    start_date = end_date = search_dates
+                start_str = start_date.strftime("%Y-%m-%d")
+                end_str = end_date.strftime("%Y-%m-%d")
+                label = start_str if start_str == end_str else f"{start_str}_to_{end_str}"
+                
+                try:
+                    report = log_report(start_str, end_str)
+                except Exception as e:
+                    st.error(f"Error reading logs: {e}")
+                    report = None
                 
-                if excel_file:
-                    st.success(message)
+                if report is not None and report["entries"].empty:
+                    st.error(f"No log entries found for {label.replace('_', ' ')}")
+                elif report is not None:
+                    entries = report["entries"]
+                    not_perfect = (entries["Status"] == NOT_PERFECT_STATUS).sum()
+                    st.success(f"{len(entries)} checks, {not_perfect} NOT PERFECT")
+                    
+                    with st.expander("👥 Checks per user"):
+                        st.dataframe(report["users"], hide_index=True, use_container_width=True)
+                    with st.expander("📦 NOT PERFECT rate per product code"):
+                        st.dataframe(report["product_codes"], hide_index=True, use_container_width=True)
+                    with st.expander("🔁 Most re-checked references"):
+                        st.dataframe(report["rechecked_references"], hide_index=True, use_container_width=True)
+                    
                     st.download_button(
-                        label=f"⬇️ Download Log for {date_str}",
-                        data=excel_file,
-                        file_name=f"CS_AI_Tool_Log_{date_str}.xlsx",
+                        label=f"⬇️ Download Log for {label.replace('_', ' ')}",
+                        data=report_to_excel(report),
+                        file_name=f"CS_AI_Tool_Log_{label}.xlsx",
                         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                         use_container_width=True
                     )
-                else:
-                    st.error(message)
         elif pin_input:
             st.error("❌ Incorrect PIN. Please try again.")
     
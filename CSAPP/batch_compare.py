@@ -0,0 +1,216 @@
+"""
+Headless batch comparison of WO/PO pairs.
+
+Runs the same extract -> match -> compare flow as the Streamlit app for every
+pair, in parallel, and writes one JSON results file per pair plus a summary.
+
+Usage:
+    python batch_compare.py PAIRS_DIR_OR_MANIFEST [--out DIR] [--workers N]
+
+PAIRS may be:
+  * a manifest CSV with columns wo, po and optional name, excel
+    (several Excel files separated by ";"); relative paths are resolved
+    against the manifest's folder
+  * a directory of <name>_WO.pdf / <name>_PO.pdf files, with optional
+    <name>.xlsx / <name>.xls Excel data
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from analysis import run_analysis, load_excel_data
+from pdf_utils import DEFAULT_TEXT_BACKEND, TEXT_BACKENDS
+from data_comparison import MATCHING_MODES
+
+# Result keys written to each pair's JSON file
+RESULT_FIELDS = [
+    "match_status", "issues", "checks", "po_number", "so_numbers",
+    "first_product_code", "first_reference", "references", "excel_style_number",
+    "addr_res", "code_table_df", "code_res", "matched", "mismatched",
+    "vsba_comparison", "combined_df", "so_color_df", "wo_items", "po_details",
+]
+
+SUMMARY_COLUMNS = [
+    "name", "wo", "po", "excel", "match_status", "issues", "po_number",
+    "so_numbers", "matched", "mismatched", "seconds", "error",
+]
+
+
+def read_manifest(manifest_path):
+    """Pairs listed in a manifest CSV"""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    pairs = []
+    with open(manifest_path, newline="", encoding="utf-8-sig") as f:
+        for i, row in enumerate(csv.DictReader(f), start=1):
+            row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+            if not row.get("wo") or not row.get("po"):
+                print(f"Skipping manifest row {i}: wo and po are required")
+                continue
+            # The name becomes <name>.json in --out, so it must be a plain file name, as in directory mode
+            name = row.get("name") or os.path.splitext(os.path.basename(row["wo"]))[0]
+            if name in (".", "..") or "/" in name or "\\" in name:
+                print(f"Skipping manifest row {i}: name '{name}' must not contain path separators or be '.'/'..'")
+                continue
+            excel = [os.path.join(base_dir, p.strip()) for p in row.get("excel", "").split(";") if p.strip()]
+            pairs.append({
+                "name": name,
+                "wo": os.path.join(base_dir, row["wo"]),
+                "po": os.path.join(base_dir, row["po"]),
+                "excel": excel,
+            })
+    return pairs
+
+
+def find_pairs(directory):
+    """Pairs of <name>_WO.pdf / <name>_PO.pdf in a directory"""
+    files = {}
+    for file_name in os.listdir(directory):
+        if file_name.startswith("~$"):
+            continue
+        files[file_name.lower()] = os.path.join(directory, file_name)
+
+    pairs = []
+    for lower_name, wo_path in sorted(files.items()):
+        if not lower_name.endswith("_wo.pdf"):
+            continue
+        name = os.path.basename(wo_path)[:-len("_WO.pdf")]
+        po_path = files.get(f"{name.lower()}_po.pdf")
+        if not po_path:
+            print(f"Skipping {os.path.basename(wo_path)}: no matching _PO.pdf")
+            continue
+        excel = [files[f"{name.lower()}{ext}"] for ext in (".xlsx", ".xls") if f"{name.lower()}{ext}" in files]
+        pairs.append({"name": name, "wo": wo_path, "po": po_path, "excel": excel})
+    return pairs
+
+
+def to_jsonable(value):
+    if isinstance(value, pd.DataFrame):
+        return value.to_dict(orient="records")
+    return value
+
+
+def pair_summary(pair):
+    return {
+        "name": pair["name"],
+        "wo": pair["wo"],
+        "po": pair["po"],
+        "excel": "; ".join(pair["excel"]),
+    }
+
+
+def error_summary(pair, e):
+    """Summary row of a pair whose worker failed outright (e.g. a broken process pool)"""
+    summary = pair_summary(pair)
+    summary.update({"match_status": "ERROR", "error": f"{type(e).__name__}: {e}"})
+    return summary
+
+
+def compare_pair(pair, out_dir, backend, matching_mode="indexed"):
+    """Worker: analyse one pair, write <name>.json and return its summary row"""
+    start = time.perf_counter()
+    summary = pair_summary(pair)
+    try:
+        with open(pair["wo"], "rb") as f:
+            wo_bytes = f.read()
+        with open(pair["po"], "rb") as f:
+            po_bytes = f.read()
+        # Pairs already run in parallel, so each pair reads its workbooks serially
+        excel_data = load_excel_data(pair["excel"], workers=1) if pair["excel"] else None
+
+        result = run_analysis(wo_bytes, po_bytes, excel_data, backend=backend, matching_mode=matching_mode)
+
+        output = {"name": pair["name"], "wo": pair["wo"], "po": pair["po"], "excel": pair["excel"]}
+        output.update({field: to_jsonable(result[field]) for field in RESULT_FIELDS})
+        with open(os.path.join(out_dir, f"{pair['name']}.json"), "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2, ensure_ascii=False, default=str)
+
+        summary.update({
+            "match_status": result["match_status"],
+            "issues": ", ".join(result["issues"]),
+            "po_number": result["po_number"],
+            "so_numbers": "; ".join(result["so_numbers"]),
+            "matched": len(result["matched"]),
+            "mismatched": len(result["mismatched"]),
+            "error": "",
+        })
+    except Exception as e:
+        summary.update({"match_status": "ERROR", "error": f"{e}\n{traceback.format_exc()}"})
+    summary["seconds"] = round(time.perf_counter() - start, 2)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare WO/PO pairs without the Streamlit UI")
+    parser.add_argument("pairs", help="manifest CSV or directory of <name>_WO.pdf / <name>_PO.pdf files")
+    parser.add_argument("--out", default="batch_results", help="output directory (default: batch_results)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    parser.add_argument("--backend", choices=TEXT_BACKENDS, default=DEFAULT_TEXT_BACKEND, help="PDF text backend")
+    parser.add_argument("--matching", choices=MATCHING_MODES, default="indexed", help="WO/PO item matching mode")
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.pairs):
+        pairs = find_pairs(args.pairs)
+    else:
+        pairs = read_manifest(args.pairs)
+    if not pairs:
+        print("No WO/PO pairs found")
+        return 1
+
+    names = [pair["name"] for pair in pairs]
+    if len(set(names)) != len(names):
+        print("Pair names must be unique, they are used as result file names")
+        return 1
+
+    os.makedirs(args.out, exist_ok=True)
+    print(f"Comparing {len(pairs)} pair(s) with {args.workers} worker(s)")
+
+    started = time.perf_counter()
+    summaries = []
+    summary_path = os.path.join(args.out, "summary.csv")
+    with open(summary_path, "w", newline="", encoding="utf-8") as summary_file:
+        writer = csv.DictWriter(summary_file, fieldnames=SUMMARY_COLUMNS)
+        writer.writeheader()
+
+        def record(summary):
+            # Each row is on disk as soon as its pair is done, so a run that dies keeps the finished pairs
+            writer.writerow(summary)
+            summary_file.flush()
+            summaries.append(summary)
+            print(f"[{len(summaries)}/{len(pairs)}] {summary['name']}: {summary['match_status']} ({summary.get('seconds', '-')}s)")
+
+        if args.workers > 1 and len(pairs) > 1:
+            with ProcessPoolExecutor(max_workers=min(args.workers, len(pairs))) as executor:
+                futures = {executor.submit(compare_pair, pair, args.out, args.backend, args.matching): pair
+                           for pair in pairs}
+                for future in as_completed(futures):
+                    try:
+                        summary = future.result()
+                    except Exception as e:
+                        summary = error_summary(futures[future], e)
+                    record(summary)
+        else:
+            for pair in pairs:
+                record(compare_pair(pair, args.out, args.backend, args.matching))
+
+    # Rewritten in the input order once every pair is done
+    order = {name: i for i, name in enumerate(names)}
+    summaries.sort(key=lambda s: order[s["name"]])
+    pd.DataFrame(summaries, columns=SUMMARY_COLUMNS).to_csv(summary_path, index=False)
+
+    counts = pd.Series([s["match_status"] for s in summaries]).value_counts()
+    print(f"\nDone in {time.perf_counter() - started:.1f}s")
+    for status, count in counts.items():
+        print(f"  {status}: {count}")
+    print(f"Summary written to {summary_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
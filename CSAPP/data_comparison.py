@@ -1,9 +1,265 @@
 import streamlit as st  # Added this import
 import pandas as pd
 import re
+from collections import deque
 from fuzzywuzzy import fuzz
+from excel_utils import excel_style_number
+from timing_utils import timed
+
+# Matching algorithms of enhanced_quantity_matching: "indexed" (hash join on the
+# exact key, then greedy partial matching of the leftovers), "optimal" (same
+# full matches, globally optimal partial pairing; needs SciPy) or "scan" (the
+# original WO x PO nested loop, kept as the reference implementation)
+MATCHING_MODES = ("indexed", "optimal", "scan")
+
+@timed()
+def enhanced_quantity_matching(wo_items, po_details, tolerance=0, excel_style=None, mode="indexed"):
+    """Match WO items to PO items by size, colour, style and quantity; returns (matched, mismatched)"""
+    if mode == "indexed":
+        return indexed_quantity_matching(wo_items, po_details, tolerance, excel_style)
+    if mode == "optimal":
+        return optimal_quantity_matching(wo_items, po_details, tolerance, excel_style)
+    if mode == "scan":
+        return scan_quantity_matching(wo_items, po_details, tolerance, excel_style)
+    raise ValueError(f"Unknown matching mode '{mode}', expected one of {MATCHING_MODES}")
+
+def _normalize_po_item(po, excel_style=None):
+    """(qty, size, colour, effective style) of a PO item, with the Excel style standing in for an empty Style 2"""
+    pstyle = po.get("Style 2", "").strip()
+    if not pstyle and excel_style:
+        pstyle = excel_style
+    return po["Quantity"], po.get("Size", "").strip().upper(), po.get("Colour_Code", "").strip().upper(), pstyle
+
+def _normalize_wo_item(wo):
+    """(qty, size, colour, style) of a WO item"""
+    return wo["Quantity"], wo.get("Size 1", "").strip().upper(), wo.get("WO Colour Code", "").strip().upper(), wo.get("Style", "").strip()
+
+def _full_match_row(wo_norm, po_norm, item_code):
+    wq, ws, wc, wstyle = wo_norm
+    pq, ps, pc, pstyle = po_norm
+    return {
+        "Style": wstyle, "Style 2": pstyle,
+        "WO Size": ws, "PO Size": ps,
+        "WO Colour Code": wc, "PO Colour Code": pc,
+        "WO Qty": wq, "PO Qty": pq,
+        "Qty Match": "👍 Yes", "Size Match": "👍 Yes",
+        "Colour Match": "👍 Yes", "Style Match": "👍 Yes",
+        "Diff": 0,
+        "Status": "🟩 Full Match",
+        "PO Item Code": item_code
+    }
+
+def _partial_match_row(wo_norm, po_norm, item_code, tolerance):
+    wq, ws, wc, wstyle = wo_norm
+    pq, ps, pc, pstyle = po_norm
+    return {
+        "Style": wstyle, "Style 2": pstyle,
+        "WO Size": ws, "PO Size": ps,
+        "WO Colour Code": wc, "PO Colour Code": pc,
+        "WO Qty": wq, "PO Qty": pq,
+        "Qty Match": "👍 Yes" if abs(pq - wq) <= tolerance else "❌ No",
+        "Size Match": "👍 Yes" if ws == ps else "❌ No",
+        "Colour Match": "👍 Yes" if wc == pc else "❌ No",
+        "Style Match": "👍 Yes" if wstyle == pstyle else "❌ No",
+        "Diff": pq - wq,
+        "Status": "🟨 Partial Match",
+        "PO Item Code": item_code
+    }
+
+def _no_po_match_row(wo_norm):
+    wq, ws, wc, wstyle = wo_norm
+    return {
+        "Style": wstyle, "Style 2": "",
+        "WO Size": ws, "PO Size": "",
+        "WO Colour Code": wc, "PO Colour Code": "",
+        "WO Qty": wq, "PO Qty": None,
+        "Qty Match": "❌ No", "Size Match": "❌ No",
+        "Colour Match": "❌ No", "Style Match": "❌ No",
+        "Diff": "", "Status": "❌ No PO Match", "PO Item Code": ""
+    }
+
+def _extra_po_row(po_norm, item_code):
+    pq, ps, pc, pstyle = po_norm
+    return {
+        "Style": "", "Style 2": pstyle,
+        "WO Size": "", "PO Size": ps,
+        "WO Colour Code": "", "PO Colour Code": pc,
+        "WO Qty": None, "PO Qty": pq,
+        "Qty Match": "❌ No", "Size Match": "❌ No",
+        "Colour Match": "❌ No", "Style Match": "❌ No",
+        "Diff": "", "Status": "❌ Extra PO Item", "PO Item Code": item_code
+    }
+
+def _build_exact_index(normalized):
+    """(size, colour, style, qty) -> deque of PO indexes in ascending order"""
+    exact_index = {}
+    for idx, (pq, ps, pc, pstyle) in enumerate(normalized):
+        # NaN quantities never compare equal, so they can never be a full match
+        if pq == pq:
+            exact_index.setdefault((ps, pc, pstyle, pq), deque()).append(idx)
+    return exact_index
+
+def _take_first_unused(candidates, unused):
+    """Lowest unused PO index of an index bucket, dropping used ones from its front"""
+    while candidates and candidates[0] not in unused:
+        candidates.popleft()
+    return candidates[0] if candidates else None
+
+def indexed_quantity_matching(wo_items, po_details, tolerance=0, excel_style=None):
+    """
+    Same result as scan_quantity_matching, without the WO x PO nested loop.
+
+    PO items are normalized once and indexed by (size, colour, style, qty), so a
+    full match is a dict lookup that takes the lowest unused PO index, as the
+    scan does. With tolerance 0 they are also indexed by the four keys that
+    leave one field out, so a WO item without a full match finds its best
+    partial match (3 of 4 fields) by lookup too. Only the remaining WO items
+    scan the unused PO items, stopping early at the best score still possible.
+    """
+    normalized = [_normalize_po_item(po, excel_style) for po in po_details]
+    exact_index = _build_exact_index(normalized)
+    # One index per left-out field: qty, size, colour, style
+    partial_indexes = None
+    if tolerance == 0:
+        partial_indexes = [{}, {}, {}, {}]
+        for idx, (pq, ps, pc, pstyle) in enumerate(normalized):
+            partial_indexes[0].setdefault((ps, pc, pstyle), deque()).append(idx)
+            if pq == pq:
+                partial_indexes[1].setdefault((pc, pstyle, pq), deque()).append(idx)
+                partial_indexes[2].setdefault((ps, pstyle, pq), deque()).append(idx)
+                partial_indexes[3].setdefault((ps, pc, pq), deque()).append(idx)
+    # Unused PO indexes in ascending order; dicts keep insertion order
+    unused = dict.fromkeys(range(len(po_details)))
+
+    matched, mismatched = [], []
+    for wo in wo_items:
+        wo_norm = _normalize_wo_item(wo)
+        wq, ws, wc, wstyle = wo_norm
+
+        wq_comparable = wq == wq
+        idx = _take_first_unused(exact_index.get((ws, wc, wstyle, wq), ()), unused) if wq_comparable else None
+        if idx is not None:
+            del unused[idx]
+            matched.append(_full_match_row(wo_norm, normalized[idx], po_details[idx].get("Item_Code", "")))
+            continue
+
+        partial_match_idx = None
+        best_possible = 4
+        if partial_indexes is not None:
+            # No unused PO matches all four fields, so 3 is the best partial score
+            keys = [(ws, wc, wstyle)]
+            if wq_comparable:
+                keys += [(wc, wstyle, wq), (ws, wstyle, wq), (ws, wc, wq)]
+            three_field = [_take_first_unused(index.get(key, ()), unused) for index, key in zip(partial_indexes, keys)]
+            three_field = [idx for idx in three_field if idx is not None]
+            if three_field:
+                partial_match_idx = min(three_field)
+            best_possible = 2
+
+        if partial_match_idx is None:
+            partial_match_score = -1
+            for idx in unused:
+                pq, ps, pc, pstyle = normalized[idx]
+                score = (abs(pq - wq) <= tolerance) + (ws == ps) + (wc == pc) + (wstyle == pstyle)
+                if score > partial_match_score:
+                    partial_match_score = score
+                    partial_match_idx = idx
+                    if score >= best_possible:
+                        break
+
+        if partial_match_idx is not None:
+            del unused[partial_match_idx]
+            matched.append(_partial_match_row(
+                wo_norm, normalized[partial_match_idx], po_details[partial_match_idx].get("Item_Code", ""), tolerance
+            ))
+        else:
+            mismatched.append(_no_po_match_row(wo_norm))
+
+    for idx in unused:
+        mismatched.append(_extra_po_row(normalized[idx], po_details[idx].get("Item_Code", "")))
+    matched = sort_items_by_size(matched)
+    mismatched = sort_items_by_size(mismatched)
+    return matched, mismatched
+
+def _field_agreement(wo_values, po_values):
+    """Boolean WO x PO matrix of equal values, compared as integer codes"""
+    codes, _ = pd.factorize(pd.Series(list(wo_values) + list(po_values), dtype=object))
+    wo_codes, po_codes = codes[:len(wo_values)], codes[len(wo_values):]
+    return wo_codes[:, None] == po_codes[None, :]
+
+def _partial_score_matrix(wo_norms, po_norms, tolerance):
+    """WO x PO matrix of partial scores (0-4): qty within tolerance, size, colour and style agreement"""
+    import numpy as np
+
+    wo_qty = pd.to_numeric(pd.Series([n[0] for n in wo_norms], dtype=object), errors="coerce").to_numpy(dtype=float)
+    po_qty = pd.to_numeric(pd.Series([n[0] for n in po_norms], dtype=object), errors="coerce").to_numpy(dtype=float)
+    scores = (np.abs(po_qty[None, :] - wo_qty[:, None]) <= tolerance).astype(np.int8)
+    for field in (1, 2, 3):
+        scores += _field_agreement([n[field] for n in wo_norms], [n[field] for n in po_norms])
+    return scores
+
+def optimal_quantity_matching(wo_items, po_details, tolerance=0, excel_style=None):
+    """
+    Full matches first, then a globally optimal assignment of the leftovers.
+
+    Full matches are taken exactly as the indexed matcher does. The remaining
+    WO and PO items are scored against each other in one NumPy matrix and
+    paired with scipy's linear_sum_assignment, which maximizes the total
+    score over all pairs instead of letting earlier WO items take the best PO
+    items, so the pairing is deterministic and maximal in total score.
+    Falls back to the indexed (greedy) matcher when SciPy is not installed.
+    """
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:
+        st.warning("⚠️ SciPy is not installed, so optimal matching is unavailable. Using greedy matching instead.")
+        return indexed_quantity_matching(wo_items, po_details, tolerance, excel_style)
+
+    po_norms = [_normalize_po_item(po, excel_style) for po in po_details]
+    wo_norms = [_normalize_wo_item(wo) for wo in wo_items]
+    exact_index = _build_exact_index(po_norms)
+    unused = dict.fromkeys(range(len(po_details)))
+
+    # WO index -> PO index
+    full_pairs, partial_pairs = {}, {}
+    for wo_idx, (wq, ws, wc, wstyle) in enumerate(wo_norms):
+        if wq != wq:
+            continue
+        idx = _take_first_unused(exact_index.get((ws, wc, wstyle, wq), ()), unused)
+        if idx is not None:
+            del unused[idx]
+            full_pairs[wo_idx] = idx
+
+    leftover_wo = [wo_idx for wo_idx in range(len(wo_norms)) if wo_idx not in full_pairs]
+    leftover_po = list(unused)
+    if leftover_wo and leftover_po:
+        scores = _partial_score_matrix(
+            [wo_norms[i] for i in leftover_wo], [po_norms[i] for i in leftover_po], tolerance
+        )
+        rows, cols = linear_sum_assignment(scores, maximize=True)
+        for row, col in zip(rows, cols):
+            partial_pairs[leftover_wo[row]] = leftover_po[col]
+            del unused[leftover_po[col]]
 
-def enhanced_quantity_matching(wo_items, po_details, tolerance=0, excel_style=None):
+    matched, mismatched = [], []
+    for wo_idx, wo_norm in enumerate(wo_norms):
+        if wo_idx in full_pairs:
+            idx = full_pairs[wo_idx]
+            matched.append(_full_match_row(wo_norm, po_norms[idx], po_details[idx].get("Item_Code", "")))
+        elif wo_idx in partial_pairs:
+            idx = partial_pairs[wo_idx]
+            matched.append(_partial_match_row(wo_norm, po_norms[idx], po_details[idx].get("Item_Code", ""), tolerance))
+        else:
+            mismatched.append(_no_po_match_row(wo_norm))
+
+    for idx in unused:
+        mismatched.append(_extra_po_row(po_norms[idx], po_details[idx].get("Item_Code", "")))
+    matched = sort_items_by_size(matched)
+    mismatched = sort_items_by_size(mismatched)
+    return matched, mismatched
+
+def scan_quantity_matching(wo_items, po_details, tolerance=0, excel_style=None):
+    """Original greedy matcher: every WO item scans every unused PO item"""
     matched, mismatched = [], []
     used = set()
     for wo in wo_items:
@@ -141,13 +397,8 @@ def fill_empty_style_2_from_excel(matched_items, mismatched_items, processed_exc
     if processed_excel_data is None or processed_excel_data.empty:
         return matched_items, mismatched_items
     
-    # Extract the first style number from Excel data
-    excel_style = None
-    for _, row in processed_excel_data.iterrows():
-        style = str(row.get('Style', '')).strip()
-        if style:
-            excel_style = style
-            break
+    # First style number of the Excel data, recorded when it was processed
+    excel_style = excel_style_number(processed_excel_data)
     
     # If no style found in Excel, return original items
     if not excel_style:
@@ -171,6 +422,7 @@ def fill_empty_style_2_from_excel(matched_items, mismatched_items, processed_exc
     
     return updated_matched, updated_mismatched  
 
+@timed()
 def compare_codes(po_details, wo_items, po_product_codes_from_item=None):
     """
     Compares product codes from PO and WO, removes duplicates, and prepares them for display.
@@ -256,12 +508,7 @@ def update_po_details_with_excel_styles(po_details, processed_data):
         return po_details
     
     # Get the first style number from processed Excel data
-    first_style = None
-    for _, row in processed_data.iterrows():
-        style = str(row.get('Style', '')).strip()
-        if style:
-            first_style = style
-            break  # Only get the first style number
+    first_style = excel_style_number(processed_data)
     
     # If no style found, return original PO details
     if not first_style:
@@ -276,14 +523,7 @@ def get_excel_style_number(processed_data):
     """Get the first style number from processed Excel data"""
     if processed_data.empty:
         return None
-    
-    # Get the first style number from processed Excel data
-    for _, row in processed_data.iterrows():
-        style = str(row.get('Style', '')).strip()
-        if style:
-            return style
-    
-    return None
+    return excel_style_number(processed_data)
 
 def update_matched_items_with_excel_styles(matched_items, mismatched_items, processed_data):
     """Update matched and mismatched items with style numbers from processed Excel data - DISABLED"""
@@ -294,15 +534,9 @@ def extract_style_from_excel(processed_data):
     """Extract the first style number from processed Excel data"""
     if processed_data.empty:
         return None
-    
-    # Get the first style number from processed Excel data
-    for _, row in processed_data.iterrows():
-        style = str(row.get('Style', '')).strip()
-        if style:
-            return style
-    
-    return None
+    return excel_style_number(processed_data)
 
+@timed()
 def combine_wo_and_excel_data(wo_df, excel_df):
     """Combine WO and Excel data into a single table with paired columns and comparison results"""
     try:
@@ -604,9 +838,9 @@ def combine_wo_and_excel_data(wo_df, excel_df):
         st.error(f"Error combining WO and Excel data: {e}")
         return pd.DataFrame()
 
-def update_so_color_display(so_numbers, wo_items):
+def build_so_color_table(so_numbers, wo_items):
     """
-    Display WO Color Codes vs SO Numbers Comparison table with each WO item in a separate row.
+    Build the WO Color Codes vs SO Numbers comparison with each WO item in a separate row.
     
     Args:
         so_numbers: List of SO numbers
@@ -615,13 +849,6 @@ def update_so_color_display(so_numbers, wo_items):
     Returns:
         DataFrame with comparison results
     """
-    # Extract WO color codes (keep duplicates as they appear in the WO)
-    wo_color_codes = []
-    for item in wo_items:
-        color_code = item.get('WO Colour Code', '')
-        if color_code:
-            wo_color_codes.append(color_code)
-    
     # Create comparison data with each WO item in a separate row
     comparison_data = []
     
@@ -651,9 +878,10 @@ def update_so_color_display(so_numbers, wo_items):
             "WO Item": f"Item {i+1}"  # Add item number for reference
         })
     
-    # Create DataFrame
-    df = pd.DataFrame(comparison_data)
-    
+    return pd.DataFrame(comparison_data)
+
+def display_so_color_table(df):
+    """Display the WO Color Codes vs SO Numbers table built by build_so_color_table"""
     # Display summary counts
     total_items = len(df)
     matched_items = len(df[df["Status"] == "✅ Match"])
@@ -676,9 +904,107 @@ def update_so_color_display(so_numbers, wo_items):
         <strong>Summary:</strong> {total_items} WO items — ✅ {matched_items} Matched, ⚠️ {no_so_items} No SO Number
     </div>
     """, unsafe_allow_html=True)
-    
+
+def update_so_color_display(so_numbers, wo_items):
+    """Build and display the WO Color Codes vs SO Numbers table, returning the DataFrame"""
+    df = build_so_color_table(so_numbers, wo_items)
+    display_so_color_table(df)
     return df
 
+@timed()
+def build_code_table(po_details, wo_items, po_product_codes_from_item=None):
+    """Pair PO and WO product codes position by position for the Product Code Analysis table"""
+    po_all_codes = [po.get("Product_Code", "").strip().upper() for po in po_details if po.get("Product_Code")]
+
+    # Add PO product codes from Item column
+    if po_product_codes_from_item:
+        po_all_codes.extend([code.strip().upper() for code in po_product_codes_from_item])
+
+    wo_all_codes = [wo.get("WO Product Code", "").strip().upper() for wo in wo_items if wo.get("WO Product Code")]
+    comparison_rows = []
+    max_len = max(len(po_all_codes), len(wo_all_codes)) if po_all_codes or wo_all_codes else 0
+    for i in range(max_len):
+        po_code = po_all_codes[i] if i < len(po_all_codes) else ""
+        wo_code = wo_all_codes[i] if i < len(wo_all_codes) else ""
+        if po_code and wo_code and po_code == wo_code:
+            status = "✅ Exact Match"
+        elif po_code and wo_code and "/" in wo_code:
+            wo_parts = [part.strip().upper() for part in wo_code.split("/")]
+            status = "✅ Exact Match" if po_code in wo_parts else "❌ No Match"
+        elif po_code and wo_code and "/" in po_code:
+            po_parts = [part.strip().upper() for part in po_code.split("/")]
+            status = "✅ Partial Match" if wo_code in po_parts else "❌ No Match"
+        elif po_code and wo_code:
+            status = "❌ No Match"
+        else:
+            status = "⚪ Empty"
+        comparison_rows.append({
+            "📋 PO Product Code": po_code,
+            "📄 WO Product Code": wo_code,
+            "🔍 Match Status": status
+        })
+    return pd.DataFrame(comparison_rows)
+
+def _excel_style_lookup(excel_data):
+    """(colour code, size) -> Excel Style of the first processed Excel row with a style"""
+    if 'Excel Style' not in excel_data.columns:
+        return {}
+
+    def column(name):
+        if name not in excel_data.columns:
+            return pd.Series("", index=excel_data.index)
+        return excel_data[name].astype(str).str.strip()
+
+    styles = column('Excel Style')
+    keyed = pd.DataFrame({
+        'style': styles,
+        'color': column('Excel Colour Code').str.upper(),
+        'size': column('Excel Size').str.upper(),
+    })[styles != ""]
+    keyed = keyed.drop_duplicates(['color', 'size'])
+    return dict(zip(zip(keyed['color'], keyed['size']), keyed['style']))
+
+def backfill_style_2_from_excel(matched, mismatched, excel_data):
+    """
+    Fill empty Style 2 values of matched/mismatched items from the processed Excel
+    row with the same WO colour code and size. Mismatched items are only filled
+    when they carry WO data (a Style).
+    """
+    if excel_data is None:
+        return matched, mismatched
+    if all(item.get("Style 2", "") for item in matched + mismatched):
+        return matched, mismatched
+    
+    excel_styles = _excel_style_lookup(excel_data)
+    
+    updated_matched = []
+    for match_item in matched:
+        # Only update if Style 2 is empty
+        if not match_item.get("Style 2", ""):
+            excel_style = excel_styles.get((match_item.get("WO Colour Code", "").upper(), match_item.get("WO Size", "").upper()))
+            updated_match_item = match_item.copy()
+            if excel_style:
+                updated_match_item["Style 2"] = excel_style
+            updated_matched.append(updated_match_item)
+        else:
+            # Keep the original item if Style 2 is not empty
+            updated_matched.append(match_item)
+    
+    updated_mismatched = []
+    for mismatch_item in mismatched:
+        # For items with WO data and empty Style 2
+        if mismatch_item.get("Style") and not mismatch_item.get("Style 2", ""):
+            excel_style = excel_styles.get((mismatch_item.get("WO Colour Code", "").upper(), mismatch_item.get("WO Size", "").upper()))
+            updated_mismatch_item = mismatch_item.copy()
+            if excel_style:
+                updated_mismatch_item["Style 2"] = excel_style
+            updated_mismatched.append(updated_mismatch_item)
+        else:
+            # For items with PO data only or already filled Style 2, keep as is
+            updated_mismatched.append(mismatch_item)
+    
+    return updated_matched, updated_mismatched
+
 def clean_product_code(code):
     """Remove '-VSBA' suffix from product codes and clean up"""
     if not code:
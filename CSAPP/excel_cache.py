@@ -0,0 +1,177 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from functools import lru_cache
+
+import pandas as pd
+
+import excel_scan
+import excel_utils
+from excel_utils import read_excel_files, normalize_excel_tables, excel_file_bytes
+from timing_utils import timed
+
+# Parquet needs pyarrow; without it workbooks are simply parsed every time
+try:
+    import pyarrow
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# On-disk cache shared by every session running on this machine
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "CSAPP_Excel_Cache")
+
+# Upper bound for the stored workbooks; least recently used entries are evicted first
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# Errors that make a cache entry unusable; the workbook is parsed instead
+CACHE_ERRORS = (OSError, ValueError, TypeError, KeyError)
+if PARQUET_AVAILABLE:
+    CACHE_ERRORS += (pyarrow.ArrowException,)
+
+
+@lru_cache(maxsize=1)
+def reader_version():
+    """Hash of the Excel reader source code, so any change to it invalidates the cache"""
+    digest = hashlib.sha256()
+    for module in (excel_utils, excel_scan):
+        with open(module.__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _entry_dir(data):
+    key = hashlib.sha256(data).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}-{reader_version()}")
+
+
+def _parquet_safe(df):
+    """Copy of a sheet table that Parquet can store: mixed object columns become text"""
+    if not all(isinstance(col, str) for col in df.columns):
+        raise ValueError("non-text column names")
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].map(str, na_action="ignore")
+    return df
+
+
+def _load_entry(entry_dir, file_name):
+    """(sheets, normalized table) stored in a cache entry"""
+    with open(os.path.join(entry_dir, "sheets.json"), encoding="utf-8") as f:
+        sheets = json.load(f)
+    for i, sheet_data in enumerate(sheets):
+        sheet_path = os.path.join(entry_dir, f"sheet_{i}.parquet")
+        sheet_data['data'] = pd.read_parquet(sheet_path) if os.path.exists(sheet_path) else pd.DataFrame()
+        sheet_data['file_name'] = file_name
+
+    table_path = os.path.join(entry_dir, "table.parquet")
+    normalized = pd.read_parquet(table_path) if os.path.exists(table_path) else pd.DataFrame()
+    if not normalized.empty:
+        # The same workbook may be uploaded under another name
+        normalized['Source File'] = file_name
+
+    # Mark the entry as recently used
+    os.utime(os.path.join(entry_dir, "sheets.json"))
+    return sheets, normalized
+
+
+def _store_entry(entry_dir, sheets, normalized):
+    """Write one workbook's sheets and normalized table; the entry appears atomically"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(dir=CACHE_DIR, prefix=".staging-")
+    try:
+        metadata = []
+        for i, sheet_data in enumerate(sheets):
+            metadata.append({key: value for key, value in sheet_data.items() if key not in ('data', 'file_name')})
+            if not sheet_data['data'].empty:
+                _parquet_safe(sheet_data['data']).to_parquet(os.path.join(staging_dir, f"sheet_{i}.parquet"))
+        if not normalized.empty:
+            normalized.to_parquet(os.path.join(staging_dir, "table.parquet"))
+        with open(os.path.join(staging_dir, "sheets.json"), "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+        os.replace(staging_dir, entry_dir)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def _dir_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def _evict(max_bytes):
+    """Drop entries of other reader versions, then LRU entries until under max_bytes"""
+    entries = []
+    for entry in os.scandir(CACHE_DIR):
+        if not entry.is_dir() or entry.name.startswith(".staging-"):
+            continue
+        if not entry.name.endswith(f"-{reader_version()}"):
+            shutil.rmtree(entry.path, ignore_errors=True)
+            continue
+        try:
+            last_access = os.path.getmtime(os.path.join(entry.path, "sheets.json"))
+        except OSError:
+            last_access = 0
+        entries.append((last_access, entry.path, _dir_size(entry.path)))
+
+    total = sum(size for _, _, size in entries)
+    for _, path, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+@timed()
+def read_excel_files_cached(excel_files, workers=None):
+    """
+    Sheets and normalized table of each workbook, one (sheets, table) pair per
+    file in the given order.
+
+    Workbooks are looked up by the SHA-256 of their bytes and the reader code
+    version. A re-upload loads the stored Parquet tables instead of parsing
+    the workbook again; the others are parsed with read_excel_files (in
+    parallel) and stored. Cache problems never block the extraction.
+    """
+    excel_files = list(excel_files)
+    file_names = [os.path.basename(str(getattr(f, "name", f))) for f in excel_files]
+    results = [None] * len(excel_files)
+    entry_dirs = [None] * len(excel_files)
+
+    if PARQUET_AVAILABLE:
+        for i, excel_file in enumerate(excel_files):
+            try:
+                entry_dirs[i] = _entry_dir(excel_file_bytes(excel_file))
+                if os.path.isdir(entry_dirs[i]):
+                    results[i] = _load_entry(entry_dirs[i], file_names[i])
+            except CACHE_ERRORS:
+                results[i] = None
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        parsed = read_excel_files([excel_files[i] for i in missing], workers=workers)
+        for i, sheets in zip(missing, parsed):
+            for sheet_data in sheets:
+                sheet_data['file_name'] = file_names[i]
+            results[i] = (sheets, normalize_excel_tables(sheets))
+
+        if PARQUET_AVAILABLE:
+            stored = False
+            for i in missing:
+                sheets, normalized = results[i]
+                # An empty result may be a read error; do not remember it
+                if entry_dirs[i] is None or not sheets:
+                    continue
+                try:
+                    _store_entry(entry_dirs[i], sheets, normalized)
+                    stored = True
+                except CACHE_ERRORS:
+                    pass
+            if stored:
+                try:
+                    _evict(MAX_CACHE_BYTES)
+                except OSError:
+                    pass
+
+    return results
@@ -0,0 +1,59 @@
+"""
+Vectorized stop-condition scanning for the PINK BRIEF Excel tables.
+
+Shared by CSAPP/excel_utils.py and MAS/PriceTicket/ExcelExtracter.py. Every
+condition is checked column by column over the whole frame with pandas
+string operations, instead of walking the rows with iloc.
+"""
+import numpy as np
+import pandas as pd
+
+STOP_TEXT = "Ticket quantities will be rounded up in minimums and multiples of 100 pcs."
+
+
+def rows_with_text(df, text, start=0):
+    """Positions (from `start`) of the rows where a string cell contains `text`"""
+    block = df.iloc[start:]
+    found = np.zeros(len(block), dtype=bool)
+    for col in range(block.shape[1]):
+        values = block.iloc[:, col]
+        if values.dtype.kind in "biufcmM":
+            continue  # numeric and date columns hold no strings
+        try:
+            found |= values.str.contains(text, regex=False, na=False).to_numpy(dtype=bool)
+        except AttributeError:
+            continue  # object column without any string cell
+    return (np.flatnonzero(found) + start).tolist()
+
+
+def row_texts(df):
+    """Lower-cased text of each row: its non-empty cells joined with spaces"""
+    text = np.full(len(df), "", dtype=object)
+    for col in range(df.shape[1]):
+        values = df.iloc[:, col]
+        present = values.notna().to_numpy(dtype=bool)
+        if not present.any():
+            continue
+        cells = values[present].astype(str).str.lower().to_numpy(dtype=object)
+        text[present] = text[present] + " " + cells
+    # Every present cell added a leading separator; drop the first one
+    return pd.Series(text, index=df.index, dtype=str).str[1:]
+
+
+def find_table_end(df, stop_phrase=STOP_TEXT):
+    """
+    Position of the first row that ends the table, or None.
+
+    A row ends the table when its text contains the stop phrase or "total"
+    (case-insensitive), or its first cell reads "None".
+    """
+    if df.empty:
+        return None
+    texts = row_texts(df)
+    end = texts.str.contains(stop_phrase.lower(), regex=False, na=False)
+    end |= texts.str.contains("total", regex=False, na=False)
+    # str() per cell as the row loop did: a None cell reads "None" (and ends the table), NaN reads "nan"
+    first_col = df.iloc[:, 0].map(str).astype(object)
+    end |= first_col.str.strip().str.lower() == "none"
+    positions = np.flatnonzero(end.to_numpy(dtype=bool))
+    return int(positions[0]) if len(positions) else None
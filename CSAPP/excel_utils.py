@@ -1,209 +1,390 @@
 from turtle import st
 import streamlit as st
 import pandas as pd
+import numpy as np
+import os
 import re
 from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from pandas.io.parsers import TextParser
+from excel_scan import STOP_TEXT, rows_with_text
+from timing_utils import timed
 
+HEADER_ROW = 21  # Row 22 (0-indexed)
+
+# Worker processes for reading several workbooks (None: CPU count) and
+# workbooks handed out per worker at a time
+EXCEL_READ_WORKERS = None
+EXCEL_READ_IN_FLIGHT = 2
+
+# A bare 8-digit cell value, the fallback style number
+STYLE_NUMBER_PATTERN = r"\d{8}"
+
+
+@timed()
 def read_excel_table(excel_file):
-    """Read tables from all sheets of an Excel file starting from A22, with specific stopping conditions"""
+    """Read tables from all sheets of an Excel file starting from A22, with specific stopping conditions.
+
+    The workbook is parsed once: every sheet is loaded as raw cells (read-only
+    for .xlsx) and the header row, stop rows, QTY column and table are all
+    derived from those cells.
+    """
     try:
-        all_sheets_data = []
-        
-        if excel_file.name.endswith(".xls"):
-            xl_file = pd.ExcelFile(excel_file, engine='xlrd')
-            sheet_names = xl_file.sheet_names
-        else:
-            xl_file = pd.ExcelFile(excel_file)
-            sheet_names = xl_file.sheet_names
-        
-        for sheet_name in sheet_names:
-            # Initialize variables
-            qty_col_idx = None
-            skip_rows = [22]  
-            
-            # Read the entire sheet first to check for stopping conditions
-            df_full = pd.read_excel(excel_file, sheet_name=sheet_name, header=None)
-            
-            # Check if header row (row 22) contains the stopping text
-            header_has_stopping_text = False
-            for cell in df_full.iloc[21]:  # Row 22 (0-indexed)
-                if isinstance(cell, str) and "Ticket quantities will be rounded up in minimums and multiples of 100 pcs." in cell:
-                    header_has_stopping_text = True
-                    break
-            
-            if header_has_stopping_text:
-                # Skip the entire sheet if header contains stopping text
-                all_sheets_data.append({
-                    'sheet_name': sheet_name, 
-                    'data': pd.DataFrame(),  # Empty DataFrame
-                    'style_number': None,
-                    'stop_row': 21,  # Row 22
-                    'qty_col_idx': None
-                })
-                continue
-            
-            # Find all rows (starting from row 22) that contain the stopping text
-            stopping_rows = []
-            for idx in range(21, len(df_full)):  # Start from row 22 (0-indexed)
-                for cell in df_full.iloc[idx]:
-                    if isinstance(cell, str) and "Ticket quantities will be rounded up in minimums and multiples of 100 pcs." in cell:
-                        stopping_rows.append(idx)
-                        break
-            
-            # Add all stopping rows to skip list
-            skip_rows.extend(stopping_rows)
-            
-            # Find the QTY column in the header row (row 22)
-            if len(df_full) > 21:  # Make sure we have at least 22 rows
-                header_row = df_full.iloc[21]  # Row 22 (0-indexed)
-                for idx, cell in enumerate(header_row):
-                    if isinstance(cell, str) and "QTY" in cell.upper():
-                        qty_col_idx = idx
-                        break
-            
-            # Read the data with header at row 22, skipping specified rows
-            usecols = range(qty_col_idx + 1) if qty_col_idx is not None else None
-            df = pd.read_excel(
-                excel_file, 
-                sheet_name=sheet_name, 
-                header=21,  # Row 22 is header
-                skiprows=skip_rows,  # Skip row 23 and any row with stopping text
-                usecols=usecols
-            )
-            
-            # Remove unnamed columns (columns with "Unnamed" in the header)
-            df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
-            
-            # Clean the data
-            df = df.dropna(how='all').dropna(axis=1, how='all').reset_index(drop=True)
-            
-            # Find the first blank row in the STYLE column and truncate
-            if 'STYLE' in df.columns:
-                # Find the first index where STYLE is blank or NaN
-                blank_style_idx = None
-                for idx, style_val in enumerate(df['STYLE']):
-                    if pd.isna(style_val) or str(style_val).strip() == '':
-                        blank_style_idx = idx
-                        break
-                
-                # Truncate the DataFrame at the first blank STYLE
-                if blank_style_idx is not None:
-                    df = df.iloc[:blank_style_idx].reset_index(drop=True)
-            
-            # Extract style number
-            style_number = None
-            if not df.empty and 'STYLE' in df.columns:
-                style_values = df['STYLE'].dropna().values
-                if len(style_values) > 0:
-                    style_number = str(style_values[0]).strip()
-            
-            # Determine the first stopping row for display
-            first_stop_row = min(stopping_rows) if stopping_rows else None
-            
-            # Always add the sheet info with all required keys
-            all_sheets_data.append({
-                'sheet_name': sheet_name, 
-                'data': df, 
-                'style_number': style_number,
-                'stop_row': first_stop_row,
-                'qty_col_idx': qty_col_idx
-            })
-        
-        return all_sheets_data
+        return _read_excel_sheets(excel_file)
     except Exception as e:
         st.error(f"Error reading Excel file: {str(e)}")
         return []
+
+
+def _read_excel_sheets(excel_file):
+    """Sheet tables of one workbook (upload, file-like object or path); raises on unreadable files"""
+    all_sheets_data = []
+    file_name = getattr(excel_file, "name", excel_file)
+
+    if str(file_name).endswith(".xls"):
+        xl_file = pd.ExcelFile(excel_file, engine='xlrd')
+    else:
+        xl_file = pd.ExcelFile(excel_file)
+
+    with xl_file:
+        for sheet_name in xl_file.sheet_names:
+            # Raw cell values, as read_excel hands them to its parser
+            raw = xl_file.parse(sheet_name, header=None, dtype=object, na_filter=False)
+            all_sheets_data.append(_read_sheet_table(sheet_name, raw))
+
+    return all_sheets_data
+
+
+def _read_excel_worker(file_name, data):
+    """Worker: (sheets, error message) of one workbook given as bytes"""
+    excel_file = BytesIO(data)
+    excel_file.name = file_name
+    try:
+        return _read_excel_sheets(excel_file), None
+    except Exception as e:
+        return [], str(e)
+
+
+def excel_file_bytes(excel_file):
+    """Raw bytes of an upload, file-like object or path"""
+    if hasattr(excel_file, "getvalue"):
+        return excel_file.getvalue()
+    if hasattr(excel_file, "read"):
+        excel_file.seek(0)
+        return excel_file.read()
+    with open(excel_file, "rb") as f:
+        return f.read()
+
+
+@timed()
+def read_excel_files(excel_files, workers=None):
+    """
+    read_excel_table over several workbooks, one list of sheets per file in
+    the given order.
+
+    With more than one file the workbooks are parsed in a process pool of
+    `workers` processes (default EXCEL_READ_WORKERS, or the CPU count). At
+    most EXCEL_READ_IN_FLIGHT workbooks per worker are handed out at a time,
+    so a large batch is never copied to the workers all at once. workers=1
+    or a failing pool use the serial path.
+    """
+    excel_files = list(excel_files)
+    results = [None] * len(excel_files)
+
+    workers = workers or EXCEL_READ_WORKERS or os.cpu_count() or 1
+    if workers > 1 and len(excel_files) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(excel_files))) as executor:
+                pending = {}
+                next_file = 0
+                while next_file < len(excel_files) or pending:
+                    while next_file < len(excel_files) and len(pending) < workers * EXCEL_READ_IN_FLIGHT:
+                        excel_file = excel_files[next_file]
+                        file_name = str(getattr(excel_file, "name", excel_file))
+                        future = executor.submit(_read_excel_worker, file_name, excel_file_bytes(excel_file))
+                        pending[future] = next_file
+                        next_file += 1
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results[pending.pop(future)] = future.result()
+        except (OSError, BrokenProcessPool) as e:
+            st.warning(f"Parallel Excel reading unavailable ({e}); reading the files one by one")
+            results = [None] * len(excel_files)
+
+    all_files_data = []
+    for excel_file, result in zip(excel_files, results):
+        if result is None:
+            all_files_data.append(read_excel_table(excel_file))
+            continue
+        sheets, error = result
+        if error is not None:
+            st.error(f"Error reading Excel file: {error}")
+        all_files_data.append(sheets)
+    return all_files_data
+
+
+def _read_sheet_table(sheet_name, raw):
+    """Table of one sheet from its raw cells (header at row 22)"""
+    qty_col_idx = None
+    skip_rows = [HEADER_ROW + 1]
+
+    header_row = raw.iloc[HEADER_ROW]
+
+    # Find all rows (starting from row 22) that contain the stopping text
+    stopping_rows = rows_with_text(raw, STOP_TEXT, start=HEADER_ROW)
+
+    # Check if header row (row 22) contains the stopping text
+    if stopping_rows and stopping_rows[0] == HEADER_ROW:
+        # Skip the entire sheet if header contains stopping text
+        return {
+            'sheet_name': sheet_name,
+            'data': pd.DataFrame(),  # Empty DataFrame
+            'style_number': None,
+            'stop_row': HEADER_ROW,
+            'qty_col_idx': None
+        }
+
+    # Add all stopping rows to skip list
+    skip_rows.extend(stopping_rows)
+
+    # Find the QTY column in the header row (row 22)
+    for idx, cell in enumerate(header_row):
+        if isinstance(cell, str) and "QTY" in cell.upper():
+            qty_col_idx = idx
+            break
+
+    # Parse the table out of the raw cells with header at row 22, skipping specified rows
+    usecols = range(qty_col_idx + 1) if qty_col_idx is not None else None
+    parser = TextParser(
+        raw.values.tolist(),
+        header=HEADER_ROW,
+        skiprows=skip_rows,  # Skip row 23 and any row with stopping text
+        usecols=usecols
+    )
+    with parser:
+        df = parser.read()
+
+    # Remove unnamed columns (columns with "Unnamed" in the header)
+    df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
+
+    # Clean the data
+    df = df.dropna(how='all').dropna(axis=1, how='all').reset_index(drop=True)
+
+    # Find the first blank row in the STYLE column and truncate
+    if 'STYLE' in df.columns:
+        # Find the first index where STYLE is blank or NaN
+        blank_style_idx = None
+        for idx, style_val in enumerate(df['STYLE']):
+            if pd.isna(style_val) or str(style_val).strip() == '':
+                blank_style_idx = idx
+                break
+
+        # Truncate the DataFrame at the first blank STYLE
+        if blank_style_idx is not None:
+            df = df.iloc[:blank_style_idx].reset_index(drop=True)
+
+    # Extract style number
+    style_number = None
+    if not df.empty and 'STYLE' in df.columns:
+        style_values = df['STYLE'].dropna().values
+        if len(style_values) > 0:
+            style_number = str(style_values[0]).strip()
+
+    # Always return the sheet info with all required keys
+    return {
+        'sheet_name': sheet_name,
+        'data': df,
+        'style_number': style_number,
+        'stop_row': min(stopping_rows) if stopping_rows else None,
+        'qty_col_idx': qty_col_idx
+    }
     
 
 print(f"Type of st: {type(st)}")
 print(f"st module: {st}")
 
+# Numeric size codes used in the Excel tables
+EXCEL_SIZE_CODES = {
+    33901: "XS", 33902: "S", 33903: "M",
+    33904: "L", 33905: "XL", 33906: "XXL"
+}
+SIZE_ORDER = {"XS": 0, "S": 1, "M": 2, "L": 3, "XL": 4, "XXL": 5}
+
+
+def map_excel_columns(excel_columns):
+    """Standard column name -> Excel column, for the columns recognised by name"""
+    column_mapping = {}
+    for col in excel_columns:
+        col_lower = str(col).lower()
+        if 'style' in col_lower:
+            column_mapping['Style'] = col
+        elif 'cc' in col_lower or 'color' in col_lower or 'colour' in col_lower:
+            column_mapping['Colour Code'] = col
+        elif 'size' in col_lower:
+            column_mapping['Size'] = col
+        elif 'qty' in col_lower or 'quantity' in col_lower:
+            column_mapping['Quantity'] = col
+        elif 'retail' in col_lower and 'us' in col_lower:
+            column_mapping['Retail US'] = col
+        elif 'retail' in col_lower and 'ca' in col_lower:
+            column_mapping['Retail CA'] = col
+        elif 'sku' in col_lower:
+            column_mapping['SKU'] = col
+        elif 'article' in col_lower:
+            column_mapping['Article'] = col
+    return column_mapping
+
+
+def _cells_to_text(cells):
+    """Stripped text of each cell (object array), "" for empty cells"""
+    text = np.full(len(cells), "", dtype=object)
+    present = pd.notna(cells)
+    if present.any():
+        text[present] = pd.Series(cells[present], dtype=object).astype(str).str.strip().to_numpy(dtype=object)
+    return text
+
+
+def _size_codes_to_text(sizes):
+    """Vectorized convert_excel_size_codes over stripped size text"""
+    sizes = pd.Series(sizes, dtype=object)
+    digits = sizes.str.isdigit().to_numpy(dtype=bool)
+    if not digits.any():
+        return sizes.to_numpy(dtype=object)
+    codes = {str(code): size for code, size in EXCEL_SIZE_CODES.items()}
+    named = sizes[digits].str.lstrip("0").map(codes)
+    result = sizes.to_numpy(dtype=object, copy=True)
+    result[digits] = named.fillna(sizes[digits]).to_numpy(dtype=object)
+    return result
+
+
+def _excel_sheet_layout(excel_df, file_name, sheet_name):
+    """One sheet's standard column names and cells (object array), before text conversion"""
+    column_mapping = map_excel_columns(excel_df.columns)
+    mapped = set(column_mapping.values())
+    # Same cell values as iterrows() hands out (rows share one common dtype)
+    values = excel_df.to_numpy().astype(object)
+
+    names = list(column_mapping) + ['Source File', 'Source Sheet']
+    sources = [excel_df.columns.get_loc(excel_col) for excel_col in column_mapping.values()]
+    for i, col in enumerate(excel_df.columns):
+        if col not in mapped:
+            names.append(f"Excel {col}")
+            sources.append(i)
+
+    cells = np.empty((len(excel_df), len(names)), dtype=object)
+    n_mapped = len(column_mapping)
+    cells[:, :n_mapped] = values[:, sources[:n_mapped]]
+    cells[:, n_mapped] = file_name
+    cells[:, n_mapped + 1] = sheet_name
+    cells[:, n_mapped + 2:] = values[:, sources[n_mapped:]]
+    return names, cells
+
+
+@timed()
+def normalize_excel_tables(all_table_data):
+    """
+    Sheets of read_excel_table in the standard Excel layout: mapped columns
+    renamed, other columns prefixed with "Excel ", every cell as stripped
+    text ("" when empty) and size codes converted to size names.
+    """
+    layouts = [
+        _excel_sheet_layout(table_info['data'], table_info.get('file_name', 'Unknown File'), table_info['sheet_name'])
+        for table_info in all_table_data
+        if not table_info['data'].empty
+    ]
+    if not layouts:
+        return pd.DataFrame()
+
+    # Union of the sheets' columns in order of first appearance
+    columns = list(dict.fromkeys(name for names, _ in layouts for name in names))
+    position = {name: i for i, name in enumerate(columns)}
+    cells = np.full((sum(len(c) for _, c in layouts), len(columns)), np.nan, dtype=object)
+    row = 0
+    for names, sheet_cells in layouts:
+        cells[row:row + len(sheet_cells), [position[name] for name in names]] = sheet_cells
+        row += len(sheet_cells)
+
+    table = {}
+    for i, col in enumerate(columns):
+        text = _cells_to_text(cells[:, i])
+        if col == 'Size':
+            text = _size_codes_to_text(text)
+        table[col] = text
+    return pd.DataFrame(table)
+
+
+@timed()
+def finalize_excel_table(normalized_frames):
+    """Combine normalized tables: drop empty columns, sort by size, record the first style"""
+    normalized_frames = [df for df in normalized_frames if not df.empty]
+    if not normalized_frames:
+        return pd.DataFrame()
+
+    excel_data_df = pd.concat(normalized_frames, ignore_index=True, sort=False)
+    excel_data_df = excel_data_df.replace("", float("nan"))
+    excel_data_df = excel_data_df.dropna(axis=1, how='all')
+    excel_data_df = excel_data_df.fillna("").astype(str)
+
+    if 'Size' in excel_data_df.columns:
+        size_ordinal = excel_data_df["Size"].str.strip().str.upper().map(SIZE_ORDER).fillna(99).astype(int)
+        excel_data_df = excel_data_df.assign(Size_Order=size_ordinal)
+        excel_data_df = excel_data_df.sort_values("Size_Order").drop("Size_Order", axis=1)
+
+    excel_data_df = excel_data_df.reset_index(drop=True)
+    excel_data_df.attrs["style_number"] = find_excel_style_number(excel_data_df)
+    return excel_data_df
+
+
+def find_excel_style_number(processed_data):
+    """First non-blank Style of a processed Excel table, or None"""
+    if processed_data is None or processed_data.empty or 'Style' not in processed_data.columns:
+        return None
+    styles = processed_data['Style'].fillna("nan").astype(str).str.strip()
+    styles = styles[styles != ""]
+    return styles.iloc[0] if len(styles) else None
+
+
+def excel_style_number(processed_data):
+    """First style number of a processed Excel table, as recorded when it was processed"""
+    if processed_data is None:
+        return None
+    if "style_number" in processed_data.attrs:
+        return processed_data.attrs["style_number"]
+    return find_excel_style_number(processed_data)
+
+
 def process_excel_table_data(all_table_data):
     """Process Excel table data from multiple files into a single table format"""
     try:
-        all_excel_items = []
-        
-        for table_info in all_table_data:
-            excel_df = table_info['data']
-            excel_sheet = table_info['sheet_name']
-            file_name = table_info.get('file_name', 'Unknown File')
-            
-            if excel_df.empty:
-                continue
-            
-            excel_columns = list(excel_df.columns)
-            column_mapping = {}
-            
-            for col in excel_columns:
-                col_lower = str(col).lower()
-                if 'style' in col_lower:
-                    column_mapping['Style'] = col
-                elif 'cc' in col_lower or 'color' in col_lower or 'colour' in col_lower:
-                    column_mapping['Colour Code'] = col
-                elif 'size' in col_lower:
-                    column_mapping['Size'] = col
-                elif 'qty' in col_lower or 'quantity' in col_lower:
-                    column_mapping['Quantity'] = col
-                elif 'retail' in col_lower and 'us' in col_lower:
-                    column_mapping['Retail US'] = col
-                elif 'retail' in col_lower and 'ca' in col_lower:
-                    column_mapping['Retail CA'] = col
-                elif 'sku' in col_lower:
-                    column_mapping['SKU'] = col
-                elif 'article' in col_lower:
-                    column_mapping['Article'] = col
-            
-            for _, row in excel_df.iterrows():
-                excel_item = {}
-                
-                for std_col, excel_col in column_mapping.items():
-                    if excel_col in excel_df.columns:
-                        value = row[excel_col]
-                        if pd.notna(value):
-                            if 'size' in std_col.lower():
-                                value = convert_excel_size_codes(value)
-                            excel_item[std_col] = str(value).strip()
-                        else:
-                            excel_item[std_col] = ""
-                    else:
-                        excel_item[std_col] = ""
-                
-                # Add file and sheet information
-                excel_item['Source File'] = file_name
-                excel_item['Source Sheet'] = excel_sheet
-                
-                for col in excel_columns:
-                    if col not in column_mapping.values():
-                        value = row[col]
-                        if pd.notna(value):
-                            excel_item[f"Excel {col}"] = str(value).strip()
-                        else:
-                            excel_item[f"Excel {col}"] = ""
-                
-                all_excel_items.append(excel_item)
-        
-        excel_data_df = pd.DataFrame(all_excel_items)
-        
-        if not excel_data_df.empty:
-            excel_data_df = excel_data_df.replace("", float("nan"))
-            excel_data_df = excel_data_df.dropna(axis=1, how='all')
-            excel_data_df = excel_data_df.fillna("")
-            
-            if 'Size' in excel_data_df.columns:
-                size_order = {"XS": 0, "S": 1, "M": 2, "L": 3, "XL": 4, "XXL": 5}
-                excel_data_df["Size_Order"] = excel_data_df["Size"].map(
-                    lambda x: size_order.get(str(x).strip().upper(), 99)
-                )
-                excel_data_df = excel_data_df.sort_values("Size_Order").drop("Size_Order", axis=1)
-            
-            excel_data_df = excel_data_df.reset_index(drop=True)
-        
-        return excel_data_df
-        
+        return finalize_excel_table([normalize_excel_tables(all_table_data)])
+
     except Exception as e:
         st.error(f"Error processing Excel table data: {str(e)}")
         return pd.DataFrame()
     
+def find_style_in_cells(df):
+    """First 8-digit value of a sheet table, scanning column by column; None if there is none"""
+    if df.empty:
+        return None
+    # Column-major, as the values are read column by column
+    cells = pd.Series(df.to_numpy(dtype=object).ravel(order="F"), dtype=object).dropna()
+    if cells.empty:
+        return None
+    # Object strings keep Python regex semantics for \\d
+    text = cells.astype(str).str.strip().astype(object)
+    found = text[text.str.fullmatch(STYLE_NUMBER_PATTERN).fillna(False).astype(bool)]
+    return found.iloc[0] if len(found) else None
+
+def combine_excel_tables(normalized_frames):
+    """Processed Excel table from the normalized tables of several workbooks"""
+    try:
+        return finalize_excel_table(normalized_frames)
+
+    except Exception as e:
+        st.error(f"Error processing Excel table data: {str(e)}")
+        return pd.DataFrame()
+
 def read_multiple_excel_tables(excel_files):
     """
     Read tables from all sheets of multiple Excel files starting from A22, with specific stopping conditions
@@ -216,9 +397,7 @@ def read_multiple_excel_tables(excel_files):
     """
     all_files_data = []
     
-    for excel_file in excel_files:
-        file_data = read_excel_table(excel_file)
-        
+    for excel_file, file_data in zip(excel_files, read_excel_files(excel_files)):
         # Add file name to each sheet's data
         for sheet_data in file_data:
             sheet_data['file_name'] = excel_file.name
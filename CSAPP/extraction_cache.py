@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from functools import lru_cache
+
+import pdf_utils
+from timing_utils import stage
+
+# On-disk cache shared by every session running on this machine
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "CSAPP_Extraction_Cache")
+CACHE_DB = os.path.join(CACHE_DIR, "extraction_cache.sqlite3")
+
+# Upper bound for the stored results; least recently used entries are evicted first
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# Seconds between eviction passes of one process; the cache may exceed
+# MAX_CACHE_BYTES by what is stored in between
+EVICT_INTERVAL = 60
+
+# Bumped when the stored value format changes, so old entries are not misread
+CACHE_FORMAT = 2
+
+# One connection per thread (sqlite3 connections are bound to their thread),
+# opened once; the schema is created once per process
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+_last_evict = 0.0
+
+
+@lru_cache(maxsize=1)
+def extractor_version():
+    """Hash of the extractor source code, so any change to pdf_utils invalidates the cache"""
+    with open(pdf_utils.__file__, "rb") as f:
+        return hashlib.sha256(f.read() + f"|{CACHE_FORMAT}".encode()).hexdigest()[:16]
+
+
+def _create_schema(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS extraction_cache (
+            cache_key TEXT PRIMARY KEY,
+            version TEXT NOT NULL,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_extraction_cache_access ON extraction_cache (last_access)")
+    conn.commit()
+
+
+def _connect():
+    """This thread's connection to the cache database"""
+    global _schema_ready
+    # A forked batch worker must not reuse its parent's connection
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.conn = None
+        _local.pid = os.getpid()
+    if _local.conn is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        conn = sqlite3.connect(CACHE_DB, timeout=30)
+        with _schema_lock:
+            if not _schema_ready:
+                _create_schema(conn)
+                _schema_ready = True
+        _local.conn = conn
+    return _local.conn
+
+
+def _encode(result):
+    """JSON of a result; a top-level tuple (e.g. (code, vsba_found)) is marked so it comes back as a tuple"""
+    return json.dumps({"tuple": isinstance(result, tuple), "value": result})
+
+
+def _decode(value):
+    stored = json.loads(value)
+    return tuple(stored["value"]) if stored["tuple"] else stored["value"]
+
+
+def _cache_key(doc, extractor, args):
+    args_key = json.dumps(args, sort_keys=True, default=str)
+    raw_key = f"{doc.sha256}|{doc.backend}|{extractor.__name__}|{args_key}|{extractor_version()}"
+    return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+
+def _evict(conn, max_bytes):
+    """Drop entries from stale extractor versions, then LRU entries until under max_bytes"""
+    global _last_evict
+    if time.time() - _last_evict < EVICT_INTERVAL:
+        return
+    _last_evict = time.time()
+    conn.execute("DELETE FROM extraction_cache WHERE version != ?", (extractor_version(),))
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM extraction_cache").fetchone()[0]
+    if total <= max_bytes:
+        return
+    rows = conn.execute("SELECT cache_key, size FROM extraction_cache ORDER BY last_access ASC").fetchall()
+    for cache_key, size in rows:
+        if total <= max_bytes:
+            break
+        conn.execute("DELETE FROM extraction_cache WHERE cache_key = ?", (cache_key,))
+        total -= size
+
+
+def cached_extract(doc, extractor, *args):
+    """
+    Run extractor(doc, *args) through the persistent cache.
+
+    The key is the SHA-256 of the PDF bytes, the text backend, the extractor
+    name and arguments and the extractor code version, so a repeat upload of the same file returns
+    the stored result without opening the PDF at all. Cache problems never
+    block the analysis: on any database error the extractor just runs. A run
+    that reported an error (see pdf_utils.extraction_error) is not stored.
+    """
+    doc = pdf_utils.as_parsed_pdf(doc)
+    try:
+        cache_key = _cache_key(doc, extractor, list(args))
+        conn = _connect()
+        with stage(f"{extractor.__name__} (cache lookup)", nbytes=len(doc.data)), conn:
+            row = conn.execute(
+                "SELECT value FROM extraction_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE extraction_cache SET last_access = ? WHERE cache_key = ?",
+                    (time.time(), cache_key)
+                )
+                return _decode(row[0])
+    except (sqlite3.Error, OSError):
+        return extractor(doc, *args)
+
+    with pdf_utils.track_extraction_errors() as errors:
+        result = extractor(doc, *args)
+    if errors:
+        # The extractor returned its empty fallback; the next run tries again
+        return result
+
+    try:
+        value = _encode(result)
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache VALUES (?, ?, ?, ?, ?)",
+                (cache_key, extractor_version(), value, len(value), time.time())
+            )
+            _evict(conn, MAX_CACHE_BYTES)
+    except (sqlite3.Error, OSError, TypeError):
+        pass
+    return result
+
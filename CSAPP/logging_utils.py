@@ -1,84 +1,465 @@
 import os
+import time
+import atexit
+import sqlite3
+import threading
 import pandas as pd
+from contextlib import closing, contextmanager
 from datetime import datetime
 from io import BytesIO
 
+# Directory of the analysis log; older versions wrote one <date>.txt file per day here
+LOG_DIR = r"C:\Users\APP\Desktop\ITL\CSAPP_Logs"
+LOG_DB = os.path.join(LOG_DIR, "csapp_log.sqlite3")
+
+# Background writer: entries are written in batches of up to LOG_BATCH_SIZE,
+# at least every LOG_FLUSH_INTERVAL seconds
+LOG_BATCH_SIZE = 50
+LOG_FLUSH_INTERVAL = 1.0
+
+# Entries kept queued while the database cannot be written; older ones are
+# moved to the daily .txt log (imported once the database works again)
+LOG_QUEUE_LIMIT = 1000
+
+# Status logged for an analysis with issues
+NOT_PERFECT_STATUS = "NOT PERFECT"
+
+# Columns of the exported log, in order
+LOG_COLUMNS = ["Date", "Time", "User Name", "Product code", "References", "PO Number", "SO Number", "Status"]
+
+
+# Databases whose schema this process has already created
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def _create_schema(conn):
+    """Create the log table, indexes, rollup tables and bookkeeping tables if missing"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            log_date TEXT NOT NULL,
+            log_time TEXT NOT NULL,
+            username TEXT NOT NULL,
+            product_code TEXT NOT NULL,
+            reference_list TEXT NOT NULL,
+            po_number TEXT NOT NULL,
+            so_number TEXT NOT NULL,
+            status TEXT NOT NULL
+        )
+    """)
+    for column in ("log_date", "username", "po_number", "so_number", "product_code"):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_analysis_log_{column} ON analysis_log ({column})")
+    # Daily rollups for reports, maintained from the log rows up to rollup_state.last_id
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS daily_user_counts (
+            log_date TEXT NOT NULL,
+            username TEXT NOT NULL,
+            checks INTEGER NOT NULL,
+            not_perfect INTEGER NOT NULL,
+            PRIMARY KEY (log_date, username)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS daily_product_counts (
+            log_date TEXT NOT NULL,
+            product_code TEXT NOT NULL,
+            checks INTEGER NOT NULL,
+            not_perfect INTEGER NOT NULL,
+            PRIMARY KEY (log_date, product_code)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS daily_reference_counts (
+            log_date TEXT NOT NULL,
+            reference_list TEXT NOT NULL,
+            checks INTEGER NOT NULL,
+            PRIMARY KEY (log_date, reference_list)
+        )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS rollup_state (id INTEGER PRIMARY KEY CHECK (id = 1), last_id INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO rollup_state VALUES (1, 0)")
+    # Legacy text files already copied into the database
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS imported_text_logs (
+            file_name TEXT PRIMARY KEY,
+            size INTEGER NOT NULL
+        )
+    """)
+    # Files imported before 6-field lines were parsed, since rescanned for those lines
+    conn.execute("CREATE TABLE IF NOT EXISTS rescanned_text_logs (file_name TEXT PRIMARY KEY)")
+    conn.commit()
+
+
+def _connect(readonly=False):
+    """
+    Connection to the log database; the schema is created on the first
+    connection of the process. A readonly connection never takes the write
+    lock, so reports do not compete with the LogWriter.
+    """
+    with _schema_lock:
+        if LOG_DB not in _schema_ready:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            with closing(sqlite3.connect(LOG_DB, timeout=30)) as conn:
+                _create_schema(conn)
+            _schema_ready.add(LOG_DB)
+    conn = sqlite3.connect(LOG_DB, timeout=30)
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def _insert_entries(conn, entries):
+    """Append (date, time, username, product_code, references, po_number, so_number, status) rows"""
+    conn.executemany(
+        "INSERT INTO analysis_log (log_date, log_time, username, product_code, reference_list, po_number, so_number, status) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [tuple("" if value is None else str(value) for value in entry) for entry in entries]
+    )
+
+
+@contextmanager
+def _write_transaction(conn):
+    """
+    Transaction that takes the write lock up front with BEGIN IMMEDIATE.
+
+    A deferred transaction that reads and then writes has to upgrade its lock,
+    and SQLite fails that upgrade at once with "database is locked" instead of
+    waiting out the busy timeout.
+    """
+    conn.isolation_level = None
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _write_batch(entries):
+    """Write a batch of entries in one transaction, taking the write lock up front"""
+    with closing(_connect()) as conn, _write_transaction(conn):
+        _insert_entries(conn, entries)
+
+
+class LogWriter:
+    """
+    Background thread that writes queued log entries in batches.
+
+    Every session of the server shares one writer, so log calls in the
+    request path only append to an in-memory queue. Entries are flushed when
+    LOG_BATCH_SIZE are waiting or LOG_FLUSH_INTERVAL has passed; each batch
+    is one SQLite transaction started with BEGIN IMMEDIATE, so concurrent
+    writers (other processes included) wait on the database lock instead of
+    interleaving. A batch that fails goes back to the queue and is retried;
+    past LOG_QUEUE_LIMIT the oldest entries go to the daily .txt log, or are
+    dropped (and counted in last_error) if that cannot be written either.
+    """
+
+    def __init__(self):
+        self.pending = []
+        self.last_error = None
+        self.dropped = 0
+        self.condition = threading.Condition()
+        # Held while a batch is taken and written, so flush() never misses one in flight
+        self.write_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="csapp-log-writer", daemon=True)
+        self.thread.start()
+
+    def put(self, entry):
+        with self.condition:
+            self.pending.append(entry)
+            if len(self.pending) >= LOG_BATCH_SIZE:
+                self.condition.notify()
+
+    def flush(self):
+        """Write every queued entry now; returns True when the queue is empty"""
+        with self.write_lock:
+            with self.condition:
+                batch, self.pending = self.pending, []
+            if not batch:
+                return True
+            try:
+                _write_batch(batch)
+            except Exception as e:
+                with self.condition:
+                    self.pending = batch + self.pending
+                    overflow = self.pending[:max(len(self.pending) - LOG_QUEUE_LIMIT, 0)]
+                    del self.pending[:len(overflow)]
+                self.last_error = f"Error logging to log database: {e}"
+                if overflow:
+                    self._spill(overflow)
+                return False
+            self.last_error = None
+            return True
+
+    def _spill(self, entries):
+        """Move entries the queue has no room for to the daily .txt logs, or drop them"""
+        try:
+            append_text_logs(entries)
+            self.last_error += f"; {len(entries)} queued entries were written to the daily text log"
+        except OSError as e:
+            self.dropped += len(entries)
+            self.last_error += f"; the text log cannot be written either ({e}), {self.dropped} entries dropped"
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: len(self.pending) >= LOG_BATCH_SIZE, timeout=LOG_FLUSH_INTERVAL)
+            if not self.flush():
+                # Give a locked or unavailable database time before retrying
+                time.sleep(LOG_FLUSH_INTERVAL)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_log_writer():
+    """The process-wide log writer, started on first use"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = LogWriter()
+            atexit.register(_writer.flush)
+        return _writer
+
+
+def flush_logs():
+    """Write all queued log entries before returning"""
+    if _writer is None:
+        return True
+    return _writer.flush()
+
+
 def log_to_text(username, product_code, references, match_status, po_number="", so_number=""):
-    """Log analysis results to a daily text file"""
+    """Queue analysis results for the log database; returns without waiting for the write"""
     try:
-        # Define the directory for text files
-        log_dir = r"C:\Users\APP\Desktop\ITL\CSAPP_Logs"
-        
-        # Create the directory if it doesn't exist
-        os.makedirs(log_dir, exist_ok=True)
-        
-        # Get current date for filename
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        file_path = os.path.join(log_dir, f"{current_date}.txt")
-        
-        # Get current timestamp
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Prepare the log entry
-        log_entry = f"{timestamp},{username},{product_code},{references},{po_number},{so_number},{match_status}\n"
-        
-        # Append to the file
-        with open(file_path, "a", encoding="utf-8") as f:
-            f.write(log_entry)
-        
-        return True, f"Report successfully logged to {file_path}"
+        now = datetime.now()
+        entry = (now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"), username, product_code,
+                 references, po_number, so_number, match_status)
+        writer = get_log_writer()
+        writer.put(entry)
+
+        if writer.last_error:
+            return False, f"{writer.last_error} (the report is queued and will be retried)"
+        if writer.dropped:
+            return True, f"Report queued for logging to {LOG_DB} ({writer.dropped} earlier entries were dropped)"
+        return True, f"Report queued for logging to {LOG_DB}"
     except Exception as e:
-        return False, f"Error logging to text file: {e}"
+        return False, f"Error logging to log database: {e}"
+
+
+def append_text_logs(entries, log_dir=None):
+    """Append entries to the daily <date>.txt logs, in the format import_text_logs reads"""
+    log_dir = log_dir or LOG_DIR
+    os.makedirs(log_dir, exist_ok=True)
+    by_date = {}
+    for entry in entries:
+        by_date.setdefault(entry[0], []).append(entry)
+    for log_date, day_entries in by_date.items():
+        with open(os.path.join(log_dir, f"{log_date}.txt"), "a", encoding="utf-8") as f:
+            for date_part, time_part, *fields in day_entries:
+                values = ["" if value is None else str(value).replace("\n", " ") for value in fields]
+                f.write(f"{date_part} {time_part}," + ",".join(values) + "\n")
+
+
+def parse_text_log_line(line):
+    """
+    Fields of a legacy "timestamp,user,product code,references,PO,SO,status" line,
+    or None. References may contain commas, so the fields are taken from both ends.
+    The oldest files have no SO column ("timestamp,user,product code,references,PO,status");
+    their 6-field lines get an empty SO.
+    """
+    parts = line.strip().split(",")
+    if len(parts) < 6:
+        return None
+    if len(parts) == 6:
+        parts.insert(5, "")
+    timestamp = parts[0]
+    if " " in timestamp:
+        date_part, time_part = timestamp.split(" ", 1)
+    else:
+        date_part, time_part = timestamp, ""
+    references = ",".join(parts[3:-3])
+    return (date_part, time_part, parts[1], parts[2], references, parts[-3], parts[-2], parts[-1])
+
+
+def import_text_logs(log_dir=None):
+    """
+    Copy the daily .txt logs of older versions into the database.
+
+    Each file is imported once; a file that grew since (an older instance
+    still logging) has its new lines appended. Returns the number of entries added.
+    """
+    log_dir = log_dir or LOG_DIR
+    if not os.path.isdir(log_dir):
+        return 0
+    added = 0
+    with closing(_connect()) as conn, _write_transaction(conn):
+        imported = dict(conn.execute("SELECT file_name, size FROM imported_text_logs"))
+        rescanned = {row[0] for row in conn.execute("SELECT file_name FROM rescanned_text_logs")}
+        for file_name in sorted(os.listdir(log_dir)):
+            if not file_name.endswith(".txt"):
+                continue
+            with open(os.path.join(log_dir, file_name), "rb") as f:
+                data = f.read()
+            done = imported.get(file_name, 0)
+            if file_name in imported and file_name not in rescanned:
+                # Earlier imports skipped the 6-field lines (no SO column); add them once
+                old_lines = data[:done].decode("utf-8", errors="replace").splitlines()
+                entries = [parse_text_log_line(line) for line in old_lines if len(line.strip().split(",")) == 6]
+                _insert_entries(conn, entries)
+                conn.execute("INSERT INTO rescanned_text_logs VALUES (?)", (file_name,))
+                added += len(entries)
+            if len(data) <= done:
+                continue
+            # Only whole lines; a partly written last line is picked up next time
+            end = data.rfind(b"\n") + 1
+            if end <= done:
+                continue
+            lines = data[done:end].decode("utf-8", errors="replace").splitlines()
+            entries = [entry for entry in map(parse_text_log_line, lines) if entry]
+            _insert_entries(conn, entries)
+            conn.execute("INSERT OR REPLACE INTO imported_text_logs VALUES (?, ?)", (file_name, end))
+            conn.execute("INSERT OR IGNORE INTO rescanned_text_logs VALUES (?)", (file_name,))
+            added += len(entries)
+    return added
+
+
+def query_logs(start_date=None, end_date=None, username=None, po_number=None,
+               so_number=None, product_code=None, status=None):
+    """
+    Log entries as a DataFrame with LOG_COLUMNS, oldest first.
+
+    Dates are "YYYY-MM-DD" strings (or date objects) and both ends are
+    inclusive; every other filter is an exact match. Filters left as None
+    are not applied.
+    """
+    filters = {
+        "log_date >= ?": start_date,
+        "log_date <= ?": end_date,
+        "username = ?": username,
+        "po_number = ?": po_number,
+        "so_number = ?": so_number,
+        "product_code = ?": product_code,
+        "status = ?": status,
+    }
+    conditions = [condition for condition, value in filters.items() if value is not None]
+    params = [str(value) for value in filters.values() if value is not None]
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    with closing(_connect(readonly=True)) as conn:
+        rows = conn.execute(
+            "SELECT log_date, log_time, username, product_code, reference_list, po_number, so_number, status "
+            f"FROM analysis_log {where} ORDER BY log_date, log_time, id",
+            params
+        ).fetchall()
+    return pd.DataFrame(rows, columns=LOG_COLUMNS)
+
+
+def refresh_rollups(conn):
+    """
+    Fold log rows added since the last refresh into the daily rollup tables.
+
+    Run it inside _write_transaction, so no other refresh moves the watermark
+    between its read and the rollup writes.
+    """
+    last_id = conn.execute("SELECT last_id FROM rollup_state").fetchone()[0]
+    max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM analysis_log").fetchone()[0]
+    if max_id <= last_id:
+        return
+    new_rows = "FROM analysis_log WHERE id > ? AND id <= ?"
+    conn.execute(f"""
+        INSERT INTO daily_user_counts
+        SELECT log_date, username, COUNT(*), SUM(status = ?) {new_rows} GROUP BY log_date, username
+        ON CONFLICT (log_date, username) DO UPDATE SET
+            checks = checks + excluded.checks, not_perfect = not_perfect + excluded.not_perfect
+    """, (NOT_PERFECT_STATUS, last_id, max_id))
+    conn.execute(f"""
+        INSERT INTO daily_product_counts
+        SELECT log_date, product_code, COUNT(*), SUM(status = ?) {new_rows} GROUP BY log_date, product_code
+        ON CONFLICT (log_date, product_code) DO UPDATE SET
+            checks = checks + excluded.checks, not_perfect = not_perfect + excluded.not_perfect
+    """, (NOT_PERFECT_STATUS, last_id, max_id))
+    conn.execute(f"""
+        INSERT INTO daily_reference_counts
+        SELECT log_date, reference_list, COUNT(*) {new_rows} AND reference_list != '' GROUP BY log_date, reference_list
+        ON CONFLICT (log_date, reference_list) DO UPDATE SET checks = checks + excluded.checks
+    """, (last_id, max_id))
+    conn.execute("UPDATE rollup_state SET last_id = ?", (max_id,))
+
+
+def log_report(start_date, end_date, top_references=20):
+    """
+    Log entries and aggregates of a date range (inclusive "YYYY-MM-DD" strings or dates).
+
+    Returns a dict of DataFrames: "entries" (LOG_COLUMNS), "users" (checks
+    per user), "product_codes" (NOT PERFECT rate per product code) and
+    "rechecked_references" (references checked more than once, most first).
+    The aggregates come from the daily rollup tables, so a long range only
+    sums one row per day and key.
+    """
+    start_date, end_date = str(start_date), str(end_date)
+    flush_logs()
+    import_text_logs()
+    # The watermark read and the rollup writes share one write lock
+    with closing(_connect()) as conn, _write_transaction(conn):
+        refresh_rollups(conn)
+    with closing(_connect(readonly=True)) as conn:
+        users = conn.execute("""
+            SELECT username, SUM(checks), SUM(not_perfect) FROM daily_user_counts
+            WHERE log_date BETWEEN ? AND ? GROUP BY username ORDER BY SUM(checks) DESC, username
+        """, (start_date, end_date)).fetchall()
+        product_codes = conn.execute("""
+            SELECT product_code, SUM(checks), SUM(not_perfect) FROM daily_product_counts
+            WHERE log_date BETWEEN ? AND ? GROUP BY product_code
+            ORDER BY SUM(not_perfect) * 1.0 / SUM(checks) DESC, SUM(checks) DESC, product_code
+        """, (start_date, end_date)).fetchall()
+        references = conn.execute("""
+            SELECT reference_list, SUM(checks) FROM daily_reference_counts
+            WHERE log_date BETWEEN ? AND ? GROUP BY reference_list HAVING SUM(checks) > 1
+            ORDER BY SUM(checks) DESC, reference_list LIMIT ?
+        """, (start_date, end_date, top_references)).fetchall()
+
+    product_df = pd.DataFrame(product_codes, columns=["Product code", "Checks", "NOT PERFECT"])
+    product_df["NOT PERFECT Rate"] = (product_df["NOT PERFECT"] / product_df["Checks"]).round(3)
+    return {
+        "entries": query_logs(start_date=start_date, end_date=end_date),
+        "users": pd.DataFrame(users, columns=["User Name", "Checks", "NOT PERFECT"]),
+        "product_codes": product_df,
+        "rechecked_references": pd.DataFrame(references, columns=["References", "Checks"]),
+    }
+
+
+def report_to_excel(report):
+    """Excel workbook of a log_report, one sheet per table"""
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        report["entries"].to_excel(writer, index=False, sheet_name='Log Data')
+        report["users"].to_excel(writer, index=False, sheet_name='Checks per User')
+        report["product_codes"].to_excel(writer, index=False, sheet_name='Product Codes')
+        report["rechecked_references"].to_excel(writer, index=False, sheet_name='Re-checked References')
+    output.seek(0)
+    return output
+
 
 def read_log_file_and_convert_to_excel(date_str):
-    """Read a log file by date and convert to Excel with separate date and time columns"""
+    """Read the log entries of a date and convert to Excel with separate date and time columns"""
     try:
-        # Define the directory for text files
-        log_dir = r"C:\Users\APP\Desktop\ITL\CSAPP_Logs"
-        file_path = os.path.join(log_dir, f"{date_str}.txt")
-        
-        # Check if the file exists
-        if not os.path.exists(file_path):
-            return None, f"Log file for {date_str} not found"
-        
-        # Read the text file
-        with open(file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-        
-        # Parse the lines into a DataFrame
-        data = []
-        for line in lines:
-            if line.strip():
-                parts = line.strip().split(",")
-                if len(parts) >= 7:
-                    # Split timestamp into date and time
-                    timestamp = parts[0]
-                    if " " in timestamp:
-                        date_part, time_part = timestamp.split(" ", 1)
-                    else:
-                        date_part = timestamp
-                        time_part = ""
-                    
-                    data.append({
-                        "Date": date_part,
-                        "Time": time_part,
-                        "User Name": parts[1],
-                        "Product code": parts[2],
-                        "References": parts[3],
-                        "PO Number": parts[4],
-                        "SO Number": parts[5],
-                        "Status": parts[6]
-                    })
-        
-        # Create DataFrame
-        df = pd.DataFrame(data)
-        
+        flush_logs()
+        import_text_logs()
+        df = query_logs(start_date=date_str, end_date=date_str)
+        if df.empty:
+            return None, f"No log entries found for {date_str}"
+
         # Convert to Excel
         output = BytesIO()
         with pd.ExcelWriter(output, engine='openpyxl') as writer:
             df.to_excel(writer, index=False, sheet_name='Log Data')
         output.seek(0)
-        
-        return output, f"Successfully converted log file for {date_str}"
+
+        return output, f"Successfully converted log entries for {date_str}"
     except Exception as e:
-        return None, f"Error converting log file: {e}"
\ No newline at end of file
+        return None, f"Error converting log file: {e}"
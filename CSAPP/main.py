@@ -8,41 +8,59 @@ from io import BytesIO
 from ui_config import configure_page, apply_custom_css, display_header, display_footer
 from auth import setup_sidebar
 from logging_utils import log_to_text
-from excel_utils import read_excel_table, process_excel_table_data
+from excel_utils import combine_excel_tables, find_style_in_cells
+from excel_cache import read_excel_files_cached
+from analysis import run_analysis, dataframe_sha256
+from timing_utils import collect_timings, timings_dataframe
 from pdf_utils import (
+    ParsedPDF,
     uploaded_file_to_bytesio, 
     create_styles_pdf, 
     merge_pdfs_with_po,
-    extract_style_numbers_from_po_first_page, 
-    extract_po_number, 
     extract_so_number_from_wo,
-    extract_all_so_numbers_from_wo, 
-    extract_wo_fields, 
     extract_po_fields,
-    extract_wo_items_table, 
-    extract_po_details, 
-    reorder_wo_by_size, 
-    reorder_po_by_size,
-    debug_po_extraction, 
-    compare_addresses, 
-    check_vsba_in_po_line,
-    extract_item_description_product_code_and_check_vsba,
-    extract_wo_product_code_with_vsba, 
-    extract_po_product_code_with_vsba,
-    compare_vsba_status
+    debug_po_extraction
 )
 from data_comparison import (
-    enhanced_quantity_matching, 
-    compare_codes, 
-    get_excel_style_number, 
     update_po_details_with_excel_styles,
     update_matched_items_with_excel_styles, 
-    combine_wo_and_excel_data,
     update_so_color_display, 
-    clean_product_code,
-    fill_empty_style_2_from_excel  
+    display_so_color_table,
+    clean_product_code
 )
 
+# Text engine for the PDF extractors: "pdfplumber" or "pymupdf" (faster per page)
+PDF_TEXT_BACKEND = "pdfplumber"
+
+# WO/PO item matching: "indexed" (greedy, original results) or "optimal" (global assignment, needs SciPy)
+MATCHING_MODE = "indexed"
+
+# Show the per-stage timings (wall time, pages, bytes) under each section;
+# the numbers are appended to timing_utils.METRICS_FILE either way
+SHOW_TIMING_PANEL = False
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def cached_analysis(wo_sha256, po_sha256, excel_sha256, backend, matching_mode, _wo_doc, _po_doc, _excel_data):
+    """
+    Full WO/PO analysis memoized across reruns.
+
+    Streamlit hashes only the content hashes and settings; the underscore
+    arguments carry the documents and Excel data without being hashed.
+    """
+    return run_analysis(_wo_doc, _po_doc, _excel_data, backend=backend, matching_mode=matching_mode)
+
+def show_timing_panel(records, title):
+    """Expander with the stage timings of the last run, when SHOW_TIMING_PANEL is on"""
+    if not SHOW_TIMING_PANEL:
+        return
+    with st.expander(f"⏱️ {title}", expanded=False):
+        if not records:
+            st.info("Results were served from the cache; no stage ran.")
+            return
+        st.dataframe(timings_dataframe(records), use_container_width=True, hide_index=True)
+        total = sum(r["seconds"] for r in records if r["depth"] == 0)
+        st.caption(f"Total of the top-level stages: {total:.3f} s")
+
 def show_progress_steps(current_step=1):
     return ""
 
@@ -162,6 +180,7 @@ def main():
     selected_user, wo_file, po_file = setup_sidebar()
     
     # -------------------- Excel/PDF Merger Section --------------------
+    excel_timings = None
     with st.expander("📓 Excel Table Data Extractor", expanded=False):
         st.markdown("""
         <div class="section-header">
@@ -196,17 +215,20 @@ def main():
             with st.spinner("🔄 Extracting table data from multiple files..."):
                 # Process each Excel file
                 all_files_data = []
+                normalized_tables = []
                 all_styles = []
                 
-                for excel_file in excel_files:
-                    # Extract table data from all sheets of this file
-                    all_sheets_data = read_excel_table(excel_file)
-                    
+                # Extract table data from all sheets of every file (files are parsed in
+                # parallel; workbooks seen before are loaded from the Parquet cache)
+                with collect_timings("excel") as excel_timings:
+                    excel_results = read_excel_files_cached(excel_files)
+                for excel_file, (all_sheets_data, normalized) in zip(excel_files, excel_results):
                     # Add file information to each sheet
                     for sheet_data in all_sheets_data:
                         sheet_data['file_name'] = excel_file.name
                     
                     all_files_data.extend(all_sheets_data)
+                    normalized_tables.append(normalized)
                     
                     # Extract styles from this file
                     sheets_with_data = [s for s in all_sheets_data if not s['data'].empty]
@@ -218,7 +240,7 @@ def main():
                 sheets_with_data = [s for s in all_files_data if not s['data'].empty]
                 
                 if sheets_with_data:
-                    processed_data = process_excel_table_data(sheets_with_data)
+                    processed_data = combine_excel_tables(normalized_tables)
                     
                     # Store processed data in session state
                     st.session_state.processed_excel_data = processed_data
@@ -226,19 +248,11 @@ def main():
                     # If no style numbers found in STYLE columns, try to extract from the data
                     if not all_styles:
                         for sheet_data in sheets_with_data:
-                            df = sheet_data['data']
-                            if not df.empty:
-                                # Look for any 8-digit number in the dataframe
-                                for col in df.columns:
-                                    for val in df[col].dropna():
-                                        val_str = str(val).strip()
-                                        if re.match(r'^\d{8}$', val_str):
-                                            all_styles.append(val_str)
-                                            break
-                                    if all_styles:
-                                        break
-                                if all_styles:
-                                    break
+                            # Look for any 8-digit number in the dataframe
+                            style = find_style_in_cells(sheet_data['data'])
+                            if style:
+                                all_styles.append(style)
+                                break
                     
                     # Display the extracted table data
                     st.markdown(f"""
@@ -357,7 +371,9 @@ def main():
                             pdf_merger_bytes = uploaded_file_to_bytesio(pdf_file_merger)
                             
                             # Merge PDFs with PO if available
-                            final_pdf = merge_pdfs_with_po(styles_pdf, pdf_merger_bytes, po_pdf_for_merge)
+                            with collect_timings("merge") as merge_timings:
+                                final_pdf = merge_pdfs_with_po(styles_pdf, pdf_merger_bytes, po_pdf_for_merge)
+                            excel_timings.extend(merge_timings)
                             
                             if final_pdf:
                                 if po_pdf_for_merge:
@@ -391,91 +407,33 @@ def main():
             </div>
             """, unsafe_allow_html=True)
 
+    if excel_timings is not None:
+        show_timing_panel(excel_timings, "Excel Stage Timings")
+
     # -------------------- Main Analysis Section --------------------
     if selected_user and wo_file and po_file:
         with st.spinner("🔄 Processing files and analyzing data..."):
-            wo = extract_wo_fields(wo_file)
-            po = extract_po_fields(po_file)
-            wo_items = extract_wo_items_table(wo_file, wo["product_codes"])
-            wo_items = reorder_wo_by_size(wo_items)
-            
-            # Updated to handle new return format with PO product codes from Item column
-            po_details_result = extract_po_details(po_file)
-            po_details_raw = po_details_result["po_items"]
-            po_product_codes_from_item = po_details_result.get("po_product_codes_from_item", [])
-            po_details = reorder_po_by_size(po_details_raw)
-            
-            addr_res = compare_addresses(wo, po)
-            
-            # Updated to include PO product codes from Item column
-            code_res = compare_codes(po_details, wo_items, po_product_codes_from_item)
-            code_table_df = compare_codes(po_details, wo_items, po_product_codes_from_item)
-            
-            matched, mismatched = enhanced_quantity_matching(wo_items, po_details)
-            po_number = extract_po_number(po_file)
-            so_numbers = extract_all_so_numbers_from_wo(wo_file)
-            
-            # NEW: Check if VSBA is in the same line as PO number
-            vsba_in_po_line = check_vsba_in_po_line(po_file)
-            
-            # NEW: Extract product code from Item Description and check for VSBA
-            item_desc_product_code, vsba_in_item_desc = extract_item_description_product_code_and_check_vsba(po_file)
-            
-            # NEW: Update Style 2 from Excel if missing from PO
-            # Fill empty Style 2 values from Excel data if available
-            if hasattr(st.session_state, 'processed_excel_data') and st.session_state.processed_excel_data is not None:
-                matched, mismatched = fill_empty_style_2_from_excel(
-                    matched, mismatched, st.session_state.processed_excel_data
+            # Parse each PDF once; every extractor reuses the cached pages.
+            # Results are also kept on disk by content hash, so a repeat upload
+            # of the same file does not open the PDF at all, and the whole
+            # analysis is memoized so widget reruns skip it entirely.
+            wo_doc = ParsedPDF(wo_file, backend=PDF_TEXT_BACKEND)
+            po_doc = ParsedPDF(po_file, backend=PDF_TEXT_BACKEND)
+            excel_data = st.session_state.processed_excel_data
+            with collect_timings("analysis") as analysis_timings:
+                result = cached_analysis(
+                    wo_doc.sha256, po_doc.sha256, dataframe_sha256(excel_data), PDF_TEXT_BACKEND, MATCHING_MODE,
+                    wo_doc, po_doc, excel_data
                 )
-
-            # Get Excel style number (if available)
-            excel_style_number = None
-            if hasattr(st.session_state, 'processed_excel_data') and st.session_state.processed_excel_data is not None:
-                excel_style_number = get_excel_style_number(st.session_state.processed_excel_data)
-
-            # ...
-
-            # Update the call to enhanced_quantity_matching to include the excel_style_number
-            matched, mismatched = enhanced_quantity_matching(wo_items, po_details, tolerance=0, excel_style=excel_style_number)
-            
-            # Check if PO has style numbers
-            po_has_styles = any(po_item.get("Style 2", "") for po_item in po_details)
-            
-            # DO NOT merge Excel styles into PO details anymore
-            # The style number will be displayed separately at the top
-            
-            # Create code_table_df here to ensure it's available in the scope
-            # Include PO product codes from Item column in the comparison
-            po_all_codes = [po.get("Product_Code", "").strip().upper() for po in po_details if po.get("Product_Code")]
-
-            # Add PO product codes from Item column
-            if po_product_codes_from_item:
-                po_all_codes.extend([code.strip().upper() for code in po_product_codes_from_item])
-
-            wo_all_codes = [wo.get("WO Product Code", "").strip().upper() for wo in wo_items if wo.get("WO Product Code")]
-            comparison_rows = []
-            max_len = max(len(po_all_codes), len(wo_all_codes)) if po_all_codes or wo_all_codes else 0
-            for i in range(max_len):
-                po_code = po_all_codes[i] if i < len(po_all_codes) else ""
-                wo_code = wo_all_codes[i] if i < len(wo_all_codes) else ""
-                if po_code and wo_code and po_code == wo_code:
-                    status = "✅ Exact Match"
-                elif po_code and wo_code and "/" in wo_code:
-                    wo_parts = [part.strip().upper() for part in wo_code.split("/")]
-                    status = "✅ Exact Match" if po_code in wo_parts else "❌ No Match"
-                elif po_code and wo_code and "/" in po_code:
-                    po_parts = [part.strip().upper() for part in po_code.split("/")]
-                    status = "✅ Partial Match" if wo_code in po_parts else "❌ No Match"
-                elif po_code and wo_code:
-                    status = "❌ No Match"
-                else:
-                    status = "⚪ Empty"
-                comparison_rows.append({
-                    "📋 PO Product Code": po_code,
-                    "📄 WO Product Code": wo_code,
-                    "🔍 Match Status": status
-                })
-            code_table_df = pd.DataFrame(comparison_rows)
+            wo_items = result["wo_items"]
+            po_details = result["po_details"]
+            addr_res = result["addr_res"]
+            code_table_df = result["code_table_df"]
+            matched = result["matched"]
+            mismatched = result["mismatched"]
+            po_number = result["po_number"]
+            so_numbers = result["so_numbers"]
+            excel_style_number = result["excel_style_number"]
         
         st.markdown(show_progress_steps(4), unsafe_allow_html=True)
 
@@ -485,6 +443,8 @@ def main():
         </div>
         """, unsafe_allow_html=True)
 
+        show_timing_panel(analysis_timings, "Analysis Stage Timings")
+
         # Display Excel style number at the very top (only once)
         if excel_style_number:
             st.markdown(f"""
@@ -571,14 +531,10 @@ def main():
         st.dataframe(code_table_df, use_container_width=True, hide_index=True)
 
 
-         # Extract VSBA information from WO
-        wo_vsba_data = extract_wo_product_code_with_vsba(wo_file)
-        
-        # Extract VSBA information from PO
-        po_vsba_data = extract_po_product_code_with_vsba(po_file)
-        
-        # Compare VSBA status
-        vsba_comparison = compare_vsba_status(wo_vsba_data, po_vsba_data)
+        # VSBA information from WO and PO
+        wo_vsba_data = result["wo_vsba_data"]
+        po_vsba_data = result["po_vsba_data"]
+        vsba_comparison = result["vsba_comparison"]
         
         # Display WO Product Codes with VSBA Status (only first row)
         st.markdown("#### 📄 Work Order (WO) Product Codes")
@@ -640,112 +596,13 @@ def main():
         </div>
         """, unsafe_allow_html=True)
         
-        # Check if we need to update PO details with style numbers from processed Excel data
-        # First, check if any Style 2 values are empty in the matched and mismatched data
-        has_empty_style_2 = False
-        for item in matched + mismatched:
-            if not item.get("Style 2", ""):
-                has_empty_style_2 = True
-                break
-        
-        # If there are empty Style 2 values and we have processed Excel data, update them
-        if has_empty_style_2 and hasattr(st.session_state, 'processed_excel_data') and st.session_state.processed_excel_data is not None:
-            # Update matched and mismatched data with style numbers from processed Excel data
-            updated_matched = []
-            for match_item in matched:
-                # Only update if Style 2 is empty
-                if not match_item.get("Style 2", ""):
-                    # Try to find a matching style from the processed Excel data
-                    wo_style = match_item.get("Style", "")
-                    wo_color = match_item.get("WO Colour Code", "")
-                    wo_size = match_item.get("WO Size", "")
-                    
-                    # Look for matching style in processed Excel data
-                    excel_style = None
-                    if hasattr(st.session_state, 'processed_excel_data') and st.session_state.processed_excel_data is not None:
-                        excel_data = st.session_state.processed_excel_data
-                        for _, row in excel_data.iterrows():
-                            excel_style_val = str(row.get('Excel Style', '')).strip()
-                            excel_color_val = str(row.get('Excel Colour Code', '')).strip().upper()
-                            excel_size_val = str(row.get('Excel Size', '')).strip().upper()
-                            
-                            if (excel_style_val and 
-                                excel_color_val == wo_color.upper() and 
-                                excel_size_val == wo_size.upper()):
-                                excel_style = excel_style_val
-                                break
-                    
-                    # Update the match item with the found style
-                    updated_match_item = match_item.copy()
-                    if excel_style:
-                        updated_match_item["Style 2"] = excel_style
-                    
-                    updated_matched.append(updated_match_item)
-                else:
-                    # Keep the original item if Style 2 is not empty
-                    updated_matched.append(match_item)
-
-              
-                if hasattr(st.session_state, 'processed_excel_data') and st.session_state.processed_excel_data is not None:
-                    # Check if PO has Style 2
-                    po_has_style_2 = any(po_item.get("Style 2", "") for po_item in po_details)
-                    
-                    # Check if matched or mismatched items have Style 2
-                    items_have_style_2 = any(item.get("Style 2", "") for item in matched + mismatched)
-                    
-                    # If PO doesn't have Style 2 but items do, it means Excel style was used
-                    if not po_has_style_2 and items_have_style_2:
-                        excel_style = None
-                        for _, row in st.session_state.processed_excel_data.iterrows():
-                            style = str(row.get('Style', '')).strip()
-                            if style:
-                                excel_style = style
-                                break
-                        
-                        if excel_style:
-                            st.markdown(f"""
-                            <div class="alert-info">
-                                ℹ️ <strong>Style Number from Excel:</strong> {excel_style} (used because PO was missing style information)
-                            </div>
-                            """, unsafe_allow_html=True)
-            
-            # Update mismatched data with style numbers from processed Excel data
-            updated_mismatched = []
-            for mismatch_item in mismatched:
-                # For items with WO data and empty Style 2
-                if mismatch_item.get("Style") and not mismatch_item.get("Style 2", ""):
-                    wo_style = mismatch_item.get("Style", "")
-                    wo_color = mismatch_item.get("WO Colour Code", "")
-                    wo_size = mismatch_item.get("WO Size", "")
-                    
-                    # Look for matching style in processed Excel data
-                    excel_style = None
-                    if hasattr(st.session_state, 'processed_excel_data') and st.session_state.processed_excel_data is not None:
-                        excel_data = st.session_state.processed_excel_data
-                        for _, row in excel_data.iterrows():
-                            excel_style_val = str(row.get('Excel Style', '')).strip()
-                            excel_color_val = str(row.get('Excel Colour Code', '')).strip().upper()
-                            excel_size_val = str(row.get('Excel Size', '')).strip().upper()
-                            
-                            if (excel_style_val and 
-                                excel_color_val == wo_color.upper() and 
-                                excel_size_val == wo_size.upper()):
-                                excel_style = excel_style_val
-                                break
-                    
-                    # Update the mismatch item with the found style
-                    updated_mismatch_item = mismatch_item.copy()
-                    if excel_style:
-                        updated_mismatch_item["Style 2"] = excel_style
-                    
-                    updated_mismatched.append(updated_mismatch_item)
-                else:
-                    # For items with PO data only or already filled Style 2, keep as is
-                    updated_mismatched.append(mismatch_item)
-            
-            # Use the updated matched and mismatched data
-            matched = updated_matched
-            mismatched = updated_mismatched
+        # Style 2 values missing from the PO were filled from the processed Excel data
+        if result["excel_style_notice"]:
+            st.markdown(f"""
+            <div class="alert-info">
+                ℹ️ <strong>Style Number from Excel:</strong> {result["excel_style_notice"]} (used because PO was missing style information)
+            </div>
+            """, unsafe_allow_html=True)
         
         if matched:
             matched_df = pd.DataFrame(matched)
@@ -771,29 +628,15 @@ def main():
         </div>
         """, unsafe_allow_html=True)
         
-        # Prepare WO Items table with empty columns removed and WO Product Code removed
-        wo_df = pd.DataFrame(wo_items)
-        for col in wo_df.columns:
-            if wo_df[col].isnull().all() or (wo_df[col].astype(str).str.strip() == '').all():
-                wo_df = wo_df.drop(columns=[col])
-        
-        # Remove WO Product Code column if it exists
-        if 'WO Product Code' in wo_df.columns:
-            wo_df = wo_df.drop(columns=['WO Product Code'])
-        
-        # Initialize combined_df as an empty DataFrame
-        combined_df = pd.DataFrame()
+        # WO Items table with empty columns removed and WO Product Code removed
+        wo_df = result["wo_df"]
+        combined_df = result["combined_df"]
         
         # Check if we have Excel data
         if hasattr(st.session_state, 'processed_excel_data') and st.session_state.processed_excel_data is not None:
             excel_df = st.session_state.processed_excel_data
             
             if not excel_df.empty:
-                # Combine the data using the enhanced function
-                with st.spinner("🔄 Combining WO and Excel data..."):
-                    combined_df = combine_wo_and_excel_data(wo_df, excel_df)
-                
-                # Now combined_df is guaranteed to be a DataFrame (not None)
                 if not combined_df.empty:
                     # Count matches and mismatches
                     total_rows = len(combined_df)
@@ -875,59 +718,13 @@ def main():
             """, unsafe_allow_html=True)
             st.dataframe(wo_df, use_container_width=True, hide_index=True)
         
-                # SO Number and WO Color Code section
-        so_color_df = update_so_color_display(so_numbers, wo_items)
+        # SO Number and WO Color Code section
+        display_so_color_table(result["so_color_df"])
         
-        # Check for perfect matches in both tables
-        combined_perfect_match = False
-        so_color_perfect_match = False
-        
-        # Check Combined WO and Excel Data table
-        if not combined_df.empty:
-            if "Overall Match" in combined_df.columns:
-                # Check if all rows have "✅ Full Match"
-                combined_perfect_match = all(combined_df["Overall Match"] == "✅ Full Match")
-        
-        # Check WO Color Codes vs SO Numbers Comparison table
-        if not so_color_df.empty and "Status" in so_color_df.columns:
-            # Check if all rows have "✅ Match"
-            so_color_perfect_match = all(so_color_df["Status"] == "✅ Match")
-        
-        address_ok = addr_res.get("Status", "") == "✅ Match"
-        codes_ok = not code_table_df.empty and all(code_table_df["🔍 Match Status"].isin(["✅ Exact Match", "✅ Partial Match"]))
-        matched_df = pd.DataFrame(matched) if matched else pd.DataFrame()
-        matched_ok = not matched_df.empty and all(matched_df["Status"] == "🟩 Full Match")
-        mismatched_empty = len(mismatched) == 0
-
-        # Check VSBA status for balloon condition - more robust handling
-        vsba_ok = False
-        vsba_status = None
+        match_status = result["match_status"]
         
-        # Handle both dictionary and DataFrame cases for vsba_comparison
-        if isinstance(vsba_comparison, dict):
-            vsba_status = vsba_comparison.get("Status", "")
-        elif isinstance(vsba_comparison, pd.DataFrame) and not vsba_comparison.empty:
-            if "Status" in vsba_comparison.columns:
-                # Get the first row's status or check if all rows have the same status
-                vsba_status = vsba_comparison["Status"].iloc[0]
-            elif "Overall Status" in vsba_comparison.columns:
-                vsba_status = vsba_comparison["Overall Status"].iloc[0]
-        
-        # Check VSBA conditions
-        if vsba_status == "✅ Both have VSBA":
-            vsba_ok = True
-        elif vsba_status == "❌ Neither has VSBA":
-            vsba_ok = True
-        else:
-            vsba_ok = False
-            
-        # Debug: Uncomment these lines to see what's happening
-        # st.write(f"VSBA Status: {vsba_status}")
-        # st.write(f"VSBA OK: {vsba_ok}")
-
-        # Updated condition: All checks must pass AND VSBA condition must be satisfied
-        if address_ok and codes_ok and matched_ok and mismatched_empty and combined_perfect_match and so_color_perfect_match and vsba_ok:
-            match_status = "PERFECT MATCH!"
+        # All checks, including the VSBA condition, must pass
+        if match_status == "PERFECT MATCH!":
             st.markdown("""
             <audio autoplay>
                 <source src="">
@@ -944,25 +741,7 @@ def main():
             st.balloons()
             
         else:
-            match_status = "NOT PERFECT"
-            
-            # Create a detailed mismatch message
-            issues = []
-            if not address_ok:
-                issues.append("Address mismatch")
-            if not codes_ok:
-                issues.append("Product code mismatch")
-            if not matched_ok or not mismatched_empty:
-                issues.append("Item matching issues")
-            if not combined_perfect_match:
-                issues.append("WO/Excel data mismatch")
-            if not so_color_perfect_match:
-                issues.append("SO/Color mismatch")
-            if not vsba_ok:
-                if vsba_status:
-                    issues.append(f"VSBA mismatch (Status: {vsba_status})")
-                else:
-                    issues.append("VSBA mismatch (status not found)")
+            issues = result["issues"]
             
             issues_text = ", ".join(issues) if issues else "Some data points need verification"
             
@@ -972,34 +751,10 @@ def main():
             </div>
             """, unsafe_allow_html=True)
         
-        wo_product_codes = []
-        for item in wo_items:
-            code = item.get("WO Product Code", "")
-            if code:
-                if isinstance(code, list):
-                    for c in code:
-                        if c and c.strip():
-                            wo_product_codes.append(c.strip().upper())
-                elif code.strip():
-                    wo_product_codes.append(code.strip().upper())
-        
-        references = []
-        extracted_styles = extract_style_numbers_from_po_first_page(po_file)
-        if extracted_styles:
-            references.extend(extracted_styles)
-        for item in wo_items:
-            style = item.get("Style", "")
-            if style and style not in references:
-                references.append(style)
-        for item in po_details:
-            style = item.get("Style 2", "")
-            if style and style not in references:
-                references.append(style)
-        
-        first_product_code = wo_product_codes[0] if wo_product_codes else ""
-        first_reference = references[0] if references else ""
+        first_product_code = result["first_product_code"]
+        first_reference = result["first_reference"]
         
-        with st.spinner("📊 Logging report to text file..."):
+        with st.spinner("📊 Logging report..."):
             so_numbers_str = "; ".join(so_numbers) if so_numbers else ""
             success, message = log_to_text(
                 selected_user, 
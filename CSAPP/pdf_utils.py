@@ -1,11 +1,15 @@
 from turtle import st
+import hashlib
 import pdfplumber
 import streamlit as st
 import fitz  # PyMuPDF
 import re
 import pandas as pd
 from io import BytesIO
+from contextlib import contextmanager
+from contextvars import ContextVar
 from fuzzywuzzy import fuzz
+from timing_utils import timed
 
 
 def uploaded_file_to_bytesio(uploaded_file):
@@ -24,6 +28,152 @@ def uploaded_file_to_bytesio(uploaded_file):
     
     return bytes_io
 
+# Engines for page text and words; tables always come from pdfplumber
+TEXT_BACKENDS = ("pdfplumber", "pymupdf")
+DEFAULT_TEXT_BACKEND = "pdfplumber"
+
+class ParsedPDF:
+    """
+    Parse-once view of a PDF that is shared by all extractors of one comparison.
+
+    The document bytes are read once and pdfplumber is only opened on first use.
+    Page text, words and tables are extracted lazily and cached per page, so the
+    pdfminer layout work happens once per page no matter how many extractors
+    receive the same object.
+
+    backend selects the engine for page text and words: "pdfplumber" (the
+    original pdfminer layout) or "pymupdf", which is much faster per page.
+    """
+
+    def __init__(self, pdf_file, backend=None):
+        backend = backend or DEFAULT_TEXT_BACKEND
+        if backend not in TEXT_BACKENDS:
+            raise ValueError(f"Unknown text backend '{backend}', expected one of {TEXT_BACKENDS}")
+        self.backend = backend
+        if isinstance(pdf_file, (bytes, bytearray)):
+            self.data = bytes(pdf_file)
+        else:
+            pdf_file.seek(0)
+            self.data = pdf_file.read()
+            pdf_file.seek(0)
+        self.name = getattr(pdf_file, "name", "")
+        self._sha256 = None
+        self._pdf = None
+        self._fitz_doc = None
+        self._texts = {}
+        self._words = {}
+        self._tables = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+        if self._fitz_doc is not None:
+            self._fitz_doc.close()
+            self._fitz_doc = None
+
+    @property
+    def sha256(self):
+        """Content hash of the document bytes, used as the extraction cache key"""
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.data).hexdigest()
+        return self._sha256
+
+    @property
+    def pages(self):
+        if self._pdf is None:
+            self._pdf = pdfplumber.open(BytesIO(self.data))
+        return self._pdf.pages
+
+    @property
+    def fitz_doc(self):
+        if self._fitz_doc is None:
+            self._fitz_doc = fitz.open(stream=self.data, filetype="pdf")
+        return self._fitz_doc
+
+    @property
+    def page_count(self):
+        if self.backend == "pymupdf":
+            return self.fitz_doc.page_count
+        return len(self.pages)
+
+    def page_text(self, page_num):
+        """Text of one page ("" for pages without a text layer)"""
+        if page_num not in self._texts:
+            if self.backend == "pymupdf":
+                # sort=True reads top-to-bottom, left-to-right like pdfplumber
+                text = self.fitz_doc[page_num].get_text("text", sort=True).rstrip("\n")
+            else:
+                text = self.pages[page_num].extract_text() or ""
+            self._texts[page_num] = text
+        return self._texts[page_num]
+
+    def page_texts(self):
+        return [self.page_text(i) for i in range(self.page_count)]
+
+    def iter_page_texts(self, start=0):
+        """Yield (page_num, text) on demand, so lookups can stop at the first page that resolves"""
+        for page_num in range(start, self.page_count):
+            yield page_num, self.page_text(page_num)
+
+    @property
+    def text(self):
+        """All page texts joined by newlines, as the extractors have always read it"""
+        return "\n".join(self.page_texts())
+
+    def page_words(self, page_num):
+        if page_num not in self._words:
+            if self.backend == "pymupdf":
+                self._words[page_num] = [
+                    {"text": w[4], "x0": w[0], "top": w[1], "x1": w[2], "bottom": w[3]}
+                    for w in self.fitz_doc[page_num].get_text("words", sort=True)
+                ]
+            else:
+                self._words[page_num] = self.pages[page_num].extract_words()
+        return self._words[page_num]
+
+    def page_tables(self, page_num, table_settings=None):
+        """Tables of one page; only the default table settings are cached"""
+        if table_settings is not None:
+            return self.pages[page_num].extract_tables(table_settings)
+        if page_num not in self._tables:
+            self._tables[page_num] = self.pages[page_num].extract_tables()
+        return self._tables[page_num]
+
+def as_parsed_pdf(pdf_file):
+    """Return pdf_file as a ParsedPDF, wrapping uploads/BytesIO objects on the fly"""
+    if isinstance(pdf_file, ParsedPDF):
+        return pdf_file
+    return ParsedPDF(pdf_file)
+
+# Errors reported by the extractors of the current track_extraction_errors()
+# block; the extractors return an empty result on error, so the extraction
+# cache needs this to tell a failed run from a document with nothing in it
+_extraction_errors = ContextVar("csapp_extraction_errors", default=None)
+
+@contextmanager
+def track_extraction_errors():
+    """Collect the errors reported by the extractors run inside the block; yields the list"""
+    errors = []
+    token = _extraction_errors.set(errors)
+    try:
+        yield errors
+    finally:
+        _extraction_errors.reset(token)
+
+def extraction_error(message):
+    """Show an extractor error and record it for track_extraction_errors()"""
+    errors = _extraction_errors.get()
+    if errors is not None:
+        errors.append(message)
+    st.error(message)
+
 def create_styles_pdf(styles: list) -> BytesIO:
     doc = fitz.open()
     page = doc.new_page()
@@ -49,6 +199,7 @@ def merge_pdfs(original_pdf: BytesIO, styles_pdf: BytesIO) -> BytesIO:
     output.seek(0)
     return output
 
+@timed()
 def merge_pdfs_with_po(styles_pdf, original_pdf, po_pdf=None):
     """
     Merge multiple PDFs: styles PDF, original PDF, and optionally PO PDF
@@ -96,86 +247,82 @@ def merge_pdfs_with_po(styles_pdf, original_pdf, po_pdf=None):
 def extract_style_numbers_from_po_first_page(pdf_file):
     """Extract style numbers from the first page of PO PDF"""
     try:
-        pdf_file.seek(0)
-        with pdfplumber.open(pdf_file) as pdf:
-            if len(pdf.pages) > 0:
-                first_page_text = pdf.pages[0].extract_text() or ""
-                # Look for "Extracted Style Numbers:" section
-                extracted_section_match = re.search(r'Extracted Style Numbers:\s*(.+)', first_page_text, re.IGNORECASE)
-                if extracted_section_match:
-                    extracted_styles = re.findall(r'\b\d{8}\b', extracted_section_match.group(1))
-                    return extracted_styles
-                
-                # Fallback: look for any 8-digit numbers
-                style_numbers = re.findall(r'\b\d{8}\b', first_page_text)
-                return style_numbers
+        doc = as_parsed_pdf(pdf_file)
+        if doc.page_count > 0:
+            first_page_text = doc.page_text(0)
+            # Look for "Extracted Style Numbers:" section
+            extracted_section_match = re.search(r'Extracted Style Numbers:\s*(.+)', first_page_text, re.IGNORECASE)
+            if extracted_section_match:
+                extracted_styles = re.findall(r'\b\d{8}\b', extracted_section_match.group(1))
+                return extracted_styles
+            
+            # Fallback: look for any 8-digit numbers
+            style_numbers = re.findall(r'\b\d{8}\b', first_page_text)
+            return style_numbers
         return []
     except Exception as e:
-        st.error(f"Error extracting style numbers from PO: {e}")
+        extraction_error(f"Error extracting style numbers from PO: {e}")
         return []
 
+@timed()
 def extract_po_number(pdf_file):
-    """Extract PO Number from PO PDF"""
+    """Extract PO Number from PO PDF, reading only as many pages as needed"""
     try:
-        pdf_file.seek(0)
-        with pdfplumber.open(pdf_file) as pdf:
-            # Check first page for PO Number
-            if len(pdf.pages) > 0:
-                first_page_text = pdf.pages[0].extract_text() or ""
-                
-                # Look for "PO Number:" pattern
-                po_number_match = re.search(r'PO Number:\s*(\d+)', first_page_text)
-                if po_number_match:
-                    return po_number_match.group(1)
-                
-                # Alternative patterns
-                patterns = [
-                    r'P\.O\.\s*Number:\s*(\d+)',
-                    r'Purchase Order Number:\s*(\d+)',
-                    r'PO\s*#:\s*(\d+)',
-                    r'PO\s*No:\s*(\d+)',
-                    r'PO\s*Number:\s*(\d+)'
-                ]
-                
+        doc = as_parsed_pdf(pdf_file)
+        # Check first page for PO Number
+        if doc.page_count > 0:
+            first_page_text = doc.page_text(0)
+            
+            # Look for "PO Number:" pattern
+            po_number_match = re.search(r'PO Number:\s*(\d+)', first_page_text)
+            if po_number_match:
+                return po_number_match.group(1)
+            
+            # Alternative patterns
+            patterns = [
+                r'P\.O\.\s*Number:\s*(\d+)',
+                r'Purchase Order Number:\s*(\d+)',
+                r'PO\s*#:\s*(\d+)',
+                r'PO\s*No:\s*(\d+)',
+                r'PO\s*Number:\s*(\d+)'
+            ]
+            
+            for pattern in patterns:
+                match = re.search(pattern, first_page_text, re.IGNORECASE)
+                if match:
+                    return match.group(1)
+            
+            # Fallback: Look for any 7-8 digit number on the right side of the page
+            words = first_page_text.split()
+            for i, word in enumerate(words):
+                if re.match(r'^\d{7,8}$', word):
+                    if i > len(words) / 2:
+                        return word
+            
+            # If still not found, try the remaining pages (page 1 was checked above)
+            for page_num, page_text in doc.iter_page_texts(start=1):
                 for pattern in patterns:
-                    match = re.search(pattern, first_page_text, re.IGNORECASE)
+                    match = re.search(pattern, page_text, re.IGNORECASE)
                     if match:
                         return match.group(1)
-                
-                # Fallback: Look for any 7-8 digit number on the right side of the page
-                words = first_page_text.split()
-                for i, word in enumerate(words):
-                    if re.match(r'^\d{7,8}$', word):
-                        if i > len(words) / 2:
-                            return word
-                
-                # If still not found, try all pages
-                for page in pdf.pages:
-                    page_text = page.extract_text() or ""
-                    for pattern in patterns:
-                        match = re.search(pattern, page_text, re.IGNORECASE)
-                        if match:
-                            return match.group(1)
-                
-                # Last resort: look for any 7-8 digit number in the entire document
-                full_text = "\n".join([page.extract_text() or "" for page in pdf.pages])
-                numbers = re.findall(r'\b\d{7,8}\b', full_text)
+            
+            # Last resort: the first 7-8 digit number in the document
+            for page_num, page_text in doc.iter_page_texts():
+                numbers = re.findall(r'\b\d{7,8}\b', page_text)
                 if numbers:
                     return numbers[0]
         return ""
     except Exception as e:
-        st.error(f"Error extracting PO number: {e}")
+        extraction_error(f"Error extracting PO number: {e}")
         return ""
 
 def extract_so_number_from_wo(pdf_file):
     """Extract SO Number from WO PDF under Product Details section"""
     try:
-        with pdfplumber.open(pdf_file) as pdf:
-            full_text = ""
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    full_text += text + "\n"
+        full_text = ""
+        for text in as_parsed_pdf(pdf_file).page_texts():
+            if text:
+                full_text += text + "\n"
         
         # Look for SO Number pattern
         so_number_match = re.search(r"SO Number:\s*([A-Z0-9]+)", full_text)
@@ -189,18 +336,17 @@ def extract_so_number_from_wo(pdf_file):
             
         return None
     except Exception as e:
-        st.error(f"Error extracting SO Number: {e}")
+        extraction_error(f"Error extracting SO Number: {e}")
         return None
 
+@timed()
 def extract_all_so_numbers_from_wo(pdf_file):
     """Extract all SO Numbers from WO PDF (one per WO)"""
     try:
-        with pdfplumber.open(pdf_file) as pdf:
-            full_text = ""
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    full_text += text + "\n"
+        full_text = ""
+        for text in as_parsed_pdf(pdf_file).page_texts():
+            if text:
+                full_text += text + "\n"
         
         # Look for SO Number patterns
         so_numbers = []
@@ -239,7 +385,7 @@ def extract_all_so_numbers_from_wo(pdf_file):
         return unique_so_numbers
         
     except Exception as e:
-        st.error(f"Error extracting SO Numbers: {e}")
+        extraction_error(f"Error extracting SO Numbers: {e}")
         return []  # Always return a list, even on error
 
 def clean_quantity(qty_str):
@@ -294,9 +440,9 @@ def clean_size(size_str):
         return size_str.split("/")[0].strip()
     return size_str
 
+@timed()
 def extract_wo_fields(pdf_file):
-    with pdfplumber.open(pdf_file) as pdf:
-        text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+    text = as_parsed_pdf(pdf_file).text
     delivery = ""
     lines = text.split("\n")
     for i, ln in enumerate(lines):
@@ -369,9 +515,9 @@ def extract_size_from_cell(cell_text):
     # If no newline, return as is
     return text
 
+@timed()
 def extract_po_fields(pdf_file):
-    with pdfplumber.open(pdf_file) as pdf:
-        text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+    text = as_parsed_pdf(pdf_file).text
     lines = [ln.strip() for ln in text.split("\n")]
     capture = False
     address_lines = []
@@ -526,6 +672,7 @@ def clean_address_for_comparison(address):
     
     return cleaned.strip()
 
+@timed()
 def compare_addresses(wo, po):
     # Clean addresses using the enhanced function
     wo_name_clean = clean_address_for_comparison(wo["customer_name"])
@@ -613,22 +760,21 @@ def sort_items_by_size(items):
         return size_order.get(size, 99)
     return sorted(items, key=get_size_key)
 
+@timed()
 def extract_po_details(pdf_file):
     """Enhanced function to handle multiple PO formats with quantity aggregation"""
-    pdf_file.seek(0)
-    extracted_styles = extract_style_numbers_from_po_first_page(pdf_file)
+    doc = as_parsed_pdf(pdf_file)
+    extracted_styles = extract_style_numbers_from_po_first_page(doc)
     repeated_style = extracted_styles[0] if extracted_styles else ""
-    pdf_file.seek(0)
-    with pdfplumber.open(pdf_file) as pdf:
-        text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-        lines = [ln.strip() for ln in text.split("\n") if ln.strip()]
+    text = doc.text
+    lines = [ln.strip() for ln in text.split("\n") if ln.strip()]
     has_tag_format = "TAG.PRC.TKT_" in text and "Color/Size/Destination :" in text
     has_original_format = any("Colour/Size/Destination:" in line for line in lines) or re.search(r"Sup\.?\s*Ref\.?\s*[:\-]?\s*([A-Z]+[-\s]?\d+)", text, re.IGNORECASE)
     po_items = []
     item_dict = {}  # Dictionary to aggregate quantities by size, color, and style
     
     # NEW: Extract PO product codes from Item column using TAG.HANG pattern
-    po_product_codes_from_item = extract_po_product_codes_from_tag_hang_pattern(pdf_file)
+    po_product_codes_from_item = extract_po_product_codes_from_tag_hang_pattern(doc)
     
     if has_tag_format and not has_original_format:
         tag_match = re.search(r"TAG\.PRC\.TKT_(.*?)_REG", text)
@@ -768,6 +914,7 @@ def extract_po_details(pdf_file):
         "po_items": po_items,
         "po_product_codes_from_item": po_product_codes_from_item
     }
+@timed()
 def extract_wo_items_table(pdf_file, product_codes=None):
     """
     Enhanced function to extract WO items from Victoria's Secret price ticket tables
@@ -775,271 +922,268 @@ def extract_wo_items_table(pdf_file, product_codes=None):
     """
     items = []
     
-    with pdfplumber.open(pdf_file) as pdf:
-        for page in pdf.pages:
-            # First try standard table extraction
-            tables = page.extract_tables()
-            
-            # If standard extraction fails, try with explicit lines
-            if not tables or len(tables) == 0:
-                tables = page.extract_tables({
-                    "vertical_strategy": "text",
-                    "horizontal_strategy": "text",
-                    "explicit_vertical_lines": page.curves + page.edges,
-                    "explicit_horizontal_lines": page.curves + page.edges,
-                })
+    doc = as_parsed_pdf(pdf_file)
+    for page_num, page in enumerate(doc.pages):
+        # First try standard table extraction
+        tables = doc.page_tables(page_num)
+        
+        # If standard extraction fails, try with explicit lines
+        if not tables or len(tables) == 0:
+            tables = page.extract_tables({
+                "vertical_strategy": "text",
+                "horizontal_strategy": "text",
+                "explicit_vertical_lines": page.curves + page.edges,
+                "explicit_horizontal_lines": page.curves + page.edges,
+            })
+        
+        # Process each table
+        for table_idx, table in enumerate(tables):
+            if not table or len(table) < 2:
+                continue
             
-            # Process each table
-            for table_idx, table in enumerate(tables):
-                if not table or len(table) < 2:
+            # Pre-process table to handle sizes split across cells and within cells
+            processed_table = []
+            for row in table:
+                if not row:
                     continue
                 
-                # Pre-process table to handle sizes split across cells and within cells
-                processed_table = []
-                for row in table:
-                    if not row:
-                        continue
+                processed_row = []
+                i = 0
+                while i < len(row):
+                    cell = str(row[i]) if row[i] is not None else ""
                     
-                    processed_row = []
-                    i = 0
-                    while i < len(row):
-                        cell = str(row[i]) if row[i] is not None else ""
-                        
-                        # Check if this cell ends with a slash and the next cell contains a size suffix
-                        if i < len(row) - 1 and cell.strip().endswith("/"):
-                            next_cell = str(row[i+1]) if row[i+1] is not None else ""
-                            # Check if next cell is a size suffix (XP, P, M, G, XG)
-                            if next_cell.strip().upper() in ["XP", "P", "M", "G", "XG"]:
-                                # Combine the cells
-                                combined_cell = cell + next_cell
-                                processed_row.append(combined_cell)
-                                i += 2  # Skip the next cell
-                                continue
-                        
-                        # If not a split size, just add the cell as-is
-                        processed_row.append(cell)
-                        i += 1
+                    # Check if this cell ends with a slash and the next cell contains a size suffix
+                    if i < len(row) - 1 and cell.strip().endswith("/"):
+                        next_cell = str(row[i+1]) if row[i+1] is not None else ""
+                        # Check if next cell is a size suffix (XP, P, M, G, XG)
+                        if next_cell.strip().upper() in ["XP", "P", "M", "G", "XG"]:
+                            # Combine the cells
+                            combined_cell = cell + next_cell
+                            processed_row.append(combined_cell)
+                            i += 2  # Skip the next cell
+                            continue
                     
-                    processed_table.append(processed_row)
+                    # If not a split size, just add the cell as-is
+                    processed_row.append(cell)
+                    i += 1
                 
-                # Now find the header row
-                header_row_idx = -1
-                column_positions = {}
+                processed_table.append(processed_row)
+            
+            # Now find the header row
+            header_row_idx = -1
+            column_positions = {}
+            
+            for i, row in enumerate(processed_table):
+                if not row:
+                    continue
                 
+                row_text = " ".join([str(cell).strip() for cell in row if cell])
+                if any(term in row_text for term in ["Style", "Colour Code", "Size", "Quantity"]):
+                    header_row_idx = i
+                    
+                    # Map column positions
+                    for j, cell in enumerate(row):
+                        cell_text = str(cell).strip().lower() if cell else ""
+                        if "style" in cell_text:
+                            column_positions["style"] = j
+                        elif "colour" in cell_text or "color" in cell_text:
+                            column_positions["color_code"] = j
+                        elif "size 1" in cell_text or "size" in cell_text:
+                            column_positions["size1"] = j
+                        elif "size 2" in cell_text:
+                            column_positions["size2"] = j
+                        elif "panty" in cell_text:
+                            column_positions["panty_length"] = j
+                        elif "retail" in cell_text and "us" in cell_text:
+                            column_positions["retail_us"] = j
+                        elif "retail" in cell_text and "ca" in cell_text:
+                            column_positions["retail_ca"] = j
+                        elif "multi" in cell_text:
+                            column_positions["multi_price"] = j
+                        elif "sku" in cell_text:
+                            column_positions["sku"] = j
+                        elif "article" in cell_text:
+                            column_positions["article"] = j
+                        elif "quantity" in cell_text or "qty" in cell_text:
+                            column_positions["quantity"] = j
+                    break
+            
+            # If we couldn't find a header row, try to infer it
+            if header_row_idx == -1:
                 for i, row in enumerate(processed_table):
-                    if not row:
+                    if not row or len(row) < 8:
                         continue
                     
-                    row_text = " ".join([str(cell).strip() for cell in row if cell])
-                    if any(term in row_text for term in ["Style", "Colour Code", "Size", "Quantity"]):
-                        header_row_idx = i
-                        
-                        # Map column positions
-                        for j, cell in enumerate(row):
-                            cell_text = str(cell).strip().lower() if cell else ""
-                            if "style" in cell_text:
-                                column_positions["style"] = j
-                            elif "colour" in cell_text or "color" in cell_text:
-                                column_positions["color_code"] = j
-                            elif "size 1" in cell_text or "size" in cell_text:
-                                column_positions["size1"] = j
-                            elif "size 2" in cell_text:
-                                column_positions["size2"] = j
-                            elif "panty" in cell_text:
-                                column_positions["panty_length"] = j
-                            elif "retail" in cell_text and "us" in cell_text:
-                                column_positions["retail_us"] = j
-                            elif "retail" in cell_text and "ca" in cell_text:
-                                column_positions["retail_ca"] = j
-                            elif "multi" in cell_text:
-                                column_positions["multi_price"] = j
-                            elif "sku" in cell_text:
-                                column_positions["sku"] = j
-                            elif "article" in cell_text:
-                                column_positions["article"] = j
-                            elif "quantity" in cell_text or "qty" in cell_text:
-                                column_positions["quantity"] = j
-                        break
-                
-                # If we couldn't find a header row, try to infer it
-                if header_row_idx == -1:
-                    for i, row in enumerate(processed_table):
-                        if not row or len(row) < 8:
-                            continue
-                        
-                        first_cell = str(row[0]).strip()
-                        if re.match(r'^\d{8}$', first_cell):
-                            has_size = False
-                            for cell in row:
-                                cell_str = str(cell).strip().upper()
-                                # Check for any size format, including combined ones
-                                if any(size in cell_str for size in ["XS/XP", "S/P", "M/M", "L/G", "XL/XG", "XXL", "XXXL", "XXG", "XG", "XS", "S", "M", "L", "XL", "P", "G"]):
-                                    has_size = True
-                                    break
-                            
-                            if has_size:
-                                header_row_idx = i
-                                column_positions = {
-                                    "style": 0,
-                                    "color_code": 1,
-                                    "size1": 2,
-                                    "size2": 3,
-                                    "panty_length": 4,
-                                    "retail_us": 5,
-                                    "retail_ca": 6,
-                                    "multi_price": 7,
-                                    "sku": 8,
-                                    "article": 9,
-                                    "quantity": len(row) - 1
-                                }
+                    first_cell = str(row[0]).strip()
+                    if re.match(r'^\d{8}$', first_cell):
+                        has_size = False
+                        for cell in row:
+                            cell_str = str(cell).strip().upper()
+                            # Check for any size format, including combined ones
+                            if any(size in cell_str for size in ["XS/XP", "S/P", "M/M", "L/G", "XL/XG", "XXL", "XXXL", "XXG", "XG", "XS", "S", "M", "L", "XL", "P", "G"]):
+                                has_size = True
                                 break
-                
-                # Skip if we couldn't determine the header
-                if header_row_idx == -1:
+                        
+                        if has_size:
+                            header_row_idx = i
+                            column_positions = {
+                                "style": 0,
+                                "color_code": 1,
+                                "size1": 2,
+                                "size2": 3,
+                                "panty_length": 4,
+                                "retail_us": 5,
+                                "retail_ca": 6,
+                                "multi_price": 7,
+                                "sku": 8,
+                                "article": 9,
+                                "quantity": len(row) - 1
+                            }
+                            break
+            
+            # Skip if we couldn't determine the header
+            if header_row_idx == -1:
+                continue
+            
+            # Process data rows
+            for row_idx, row in enumerate(processed_table[header_row_idx + 1:], header_row_idx + 1):
+                if not row or len(row) < max(column_positions.values()) + 1:
                     continue
                 
-                # Process data rows
-                for row_idx, row in enumerate(processed_table[header_row_idx + 1:], header_row_idx + 1):
-                    if not row or len(row) < max(column_positions.values()) + 1:
-                        continue
+                try:
+                    style = str(row[column_positions.get("style", 0)] or "").strip()
+                    color_code = str(row[column_positions.get("color_code", 1)] or "").strip().upper()
                     
-                    try:
-                        style = str(row[column_positions.get("style", 0)] or "").strip()
-                        color_code = str(row[column_positions.get("color_code", 1)] or "").strip().upper()
-                        
-                        # Extract size1 with special handling for multi-line cells
-                        size1_raw = str(row[column_positions.get("size1", 2)] or "")
-                        size1 = extract_size_from_cell(size1_raw)
+                    # Extract size1 with special handling for multi-line cells
+                    size1_raw = str(row[column_positions.get("size1", 2)] or "")
+                    size1 = extract_size_from_cell(size1_raw)
 
-                        # If we didn't get a valid size, try to find it in other cells
-                        if not size1 or not any(size in size1.upper() for size in ["XS", "S", "M", "L", "XL", "XXL", "XXXL", "XXG", "XG", "P", "G"]):
-                            # Check each cell for size patterns
-                            for cell in row:
-                                cell_str = str(cell) if cell is not None else ""
-                                extracted_size = extract_size_from_cell(cell_str)
-                                if any(size in extracted_size.upper() for size in ["XS", "S", "M", "L", "XL", "XXL", "XXXL", "XXG", "XG", "P", "G"]):
-                                    size1 = extracted_size
-                                    break
+                    # If we didn't get a valid size, try to find it in other cells
+                    if not size1 or not any(size in size1.upper() for size in ["XS", "S", "M", "L", "XL", "XXL", "XXXL", "XXG", "XG", "P", "G"]):
+                        # Check each cell for size patterns
+                        for cell in row:
+                            cell_str = str(cell) if cell is not None else ""
+                            extracted_size = extract_size_from_cell(cell_str)
+                            if any(size in extracted_size.upper() for size in ["XS", "S", "M", "L", "XL", "XXL", "XXXL", "XXG", "XG", "P", "G"]):
+                                size1 = extracted_size
+                                break
+                    
+                    # Check if the size cell contains a newline (like "XS\nXP")
+                    if "\n" in size1_raw:
+                        # Split by newline and take the first part
+                        size_parts = size1_raw.split("\n")
+                        # Process each part to handle the case where one part is just "/" and the next is "XP"
+                        processed_size = ""
+                        for part in size_parts:
+                            if part.strip() == "/":
+                                processed_size += "/"
+                            else:
+                                processed_size += part.strip()
                         
-                        # Check if the size cell contains a newline (like "XS\nXP")
-                        if "\n" in size1_raw:
-                            # Split by newline and take the first part
-                            size_parts = size1_raw.split("\n")
-                            # Process each part to handle the case where one part is just "/" and the next is "XP"
-                            processed_size = ""
-                            for part in size_parts:
-                                if part.strip() == "/":
-                                    processed_size += "/"
-                                else:
-                                    processed_size += part.strip()
+                        # Now clean the processed size
+                        size1 = clean_size(processed_size)
+                    else:
+                        size1 = clean_size(size1_raw)
+                    
+                    # If we didn't get a valid size, try to find it in other cells
+                    if not size1:
+                        # Check each cell for size patterns
+                        for cell in row:
+                            cell_str = str(cell).strip()
                             
-                            # Now clean the processed size
-                            size1 = clean_size(processed_size)
-                        else:
-                            size1 = clean_size(size1_raw)
+                            # Check if the cell contains a newline
+                            if "\n" in cell_str:
+                                # Split by newline and check each part
+                                parts = cell_str.split("\n")
+                                processed_cell = ""
+                                for part in parts:
+                                    if part.strip() == "/":
+                                        processed_cell += "/"
+                                    else:
+                                        processed_cell += part.strip()
+                                
+                                # Look for size patterns in the processed cell
+                                cell_upper = processed_cell.upper()
+                                size_match = re.search(r'\b(XS/XP|S/P|M/M|L/G|XL/XG|XXL|XXXL|XXG|XG|XS|S|M|L|XL|P|G)\b', cell_upper)
+                                if size_match:
+                                    size1 = clean_size(size_match.group(1))
+                                    break
+                            else:
+                                # Look for size patterns in the whole cell
+                                cell_upper = cell_str.upper()
+                                size_match = re.search(r'\b(XS/XP|S/P|M/M|L/G|XL/XG|XXL|XXXL|XXG|XG|XS|S|M|L|XL|P|G)\b', cell_upper)
+                                if size_match:
+                                    size1 = clean_size(size_match.group(1))
+                                    break
+                    
+                    # Extract quantity
+                    quantity_str = ""
+                    if "quantity" in column_positions:
+                        quantity_str = str(row[column_positions["quantity"]] or "").strip()
+                    
+                    if not quantity_str or not re.search(r'\d', quantity_str):
+                        # Try the last column as a fallback
+                        quantity_str = str(row[-1] or "").strip()
+                    
+                    quantity = clean_quantity(quantity_str)
+                    
+                    # Only add item if we have valid style and quantity
+                    if style and quantity > 0:
+                        item_data = {
+                            "Style": style,
+                            "WO Colour Code": color_code,
+                            "Size 1": size1,
+                            "Quantity": quantity,
+                            "WO Product Code": " / ".join(product_codes) if product_codes else ""
+                        }
                         
-                        # If we didn't get a valid size, try to find it in other cells
-                        if not size1:
-                            # Check each cell for size patterns
-                            for cell in row:
-                                cell_str = str(cell).strip()
+                        # Extract size2 with special handling for multi-line cells
+                        if "size2" in column_positions:
+                            size2_raw = str(row[column_positions["size2"]] or "")
+                            item_data["Size 2"] = extract_size_from_cell(size2_raw)
+                            if "\n" in size2_raw:
+                                # Split by newline and process each part
+                                size_parts = size2_raw.split("\n")
+                                processed_size = ""
+                                for part in size_parts:
+                                    if part.strip() == "/":
+                                        processed_size += "/"
+                                    else:
+                                        processed_size += part.strip()
                                 
-                                # Check if the cell contains a newline
-                                if "\n" in cell_str:
-                                    # Split by newline and check each part
-                                    parts = cell_str.split("\n")
-                                    processed_cell = ""
-                                    for part in parts:
-                                        if part.strip() == "/":
-                                            processed_cell += "/"
-                                        else:
-                                            processed_cell += part.strip()
-                                    
-                                    # Look for size patterns in the processed cell
-                                    cell_upper = processed_cell.upper()
-                                    size_match = re.search(r'\b(XS/XP|S/P|M/M|L/G|XL/XG|XXL|XXXL|XXG|XG|XS|S|M|L|XL|P|G)\b', cell_upper)
-                                    if size_match:
-                                        size1 = clean_size(size_match.group(1))
-                                        break
-                                else:
-                                    # Look for size patterns in the whole cell
-                                    cell_upper = cell_str.upper()
-                                    size_match = re.search(r'\b(XS/XP|S/P|M/M|L/G|XL/XG|XXL|XXXL|XXG|XG|XS|S|M|L|XL|P|G)\b', cell_upper)
-                                    if size_match:
-                                        size1 = clean_size(size_match.group(1))
-                                        break
+                                item_data["Size 2"] = clean_size(processed_size)
+                            else:
+                                item_data["Size 2"] = clean_size(size2_raw)
                         
-                        # Extract quantity
-                        quantity_str = ""
-                        if "quantity" in column_positions:
-                            quantity_str = str(row[column_positions["quantity"]] or "").strip()
+                        if "panty_length" in column_positions:
+                            item_data["Panty Length"] = str(row[column_positions["panty_length"]] or "").strip()
                         
-                        if not quantity_str or not re.search(r'\d', quantity_str):
-                            # Try the last column as a fallback
-                            quantity_str = str(row[-1] or "").strip()
+                        if "retail_us" in column_positions:
+                            item_data["Retail US"] = str(row[column_positions["retail_us"]] or "").strip()
                         
-                        quantity = clean_quantity(quantity_str)
+                        if "retail_ca" in column_positions:
+                            item_data["Retail CA"] = str(row[column_positions["retail_ca"]] or "").strip()
                         
-                        # Only add item if we have valid style and quantity
-                        if style and quantity > 0:
-                            item_data = {
-                                "Style": style,
-                                "WO Colour Code": color_code,
-                                "Size 1": size1,
-                                "Quantity": quantity,
-                                "WO Product Code": " / ".join(product_codes) if product_codes else ""
-                            }
-                            
-                            # Extract size2 with special handling for multi-line cells
-                            if "size2" in column_positions:
-                                size2_raw = str(row[column_positions["size2"]] or "")
-                                item_data["Size 2"] = extract_size_from_cell(size2_raw)
-                                if "\n" in size2_raw:
-                                    # Split by newline and process each part
-                                    size_parts = size2_raw.split("\n")
-                                    processed_size = ""
-                                    for part in size_parts:
-                                        if part.strip() == "/":
-                                            processed_size += "/"
-                                        else:
-                                            processed_size += part.strip()
-                                    
-                                    item_data["Size 2"] = clean_size(processed_size)
-                                else:
-                                    item_data["Size 2"] = clean_size(size2_raw)
-                            
-                            if "panty_length" in column_positions:
-                                item_data["Panty Length"] = str(row[column_positions["panty_length"]] or "").strip()
-                            
-                            if "retail_us" in column_positions:
-                                item_data["Retail US"] = str(row[column_positions["retail_us"]] or "").strip()
-                            
-                            if "retail_ca" in column_positions:
-                                item_data["Retail CA"] = str(row[column_positions["retail_ca"]] or "").strip()
-                            
-                            if "multi_price" in column_positions:
-                                item_data["Multi Price"] = str(row[column_positions["multi_price"]] or "").strip()
-                            
-                            if "sku" in column_positions:
-                                item_data["SKU"] = str(row[column_positions["sku"]] or "").strip()
-                            
-                            if "article" in column_positions:
-                                item_data["Article"] = str(row[column_positions["article"]] or "").strip()
-                            
-                            items.append(item_data)
-                    
-                    except (ValueError, IndexError):
-                        continue
-    
+                        if "multi_price" in column_positions:
+                            item_data["Multi Price"] = str(row[column_positions["multi_price"]] or "").strip()
+                        
+                        if "sku" in column_positions:
+                            item_data["SKU"] = str(row[column_positions["sku"]] or "").strip()
+                        
+                        if "article" in column_positions:
+                            item_data["Article"] = str(row[column_positions["article"]] or "").strip()
+                        
+                        items.append(item_data)
+                
+                except (ValueError, IndexError):
+                    continue
+
     # If we still don't have items, try text-based extraction
     if not items:
-        pdf_file.seek(0)
-        with pdfplumber.open(pdf_file) as pdf:
-            full_text = ""
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    full_text += text + "\n"
+        full_text = ""
+        for text in doc.page_texts():
+            if text:
+                full_text += text + "\n"
         
         # Try the existing pattern first
         lines = full_text.split('\n')
@@ -1249,7 +1393,7 @@ def compare_excel_style_with_po_style2(wo_pdf_file, po_pdf_file, excel_file=None
                     if str(style).strip():  # Make sure it's not empty
                         excel_styles.append(str(style).strip())
         except Exception as e:
-            st.error(f"Error reading Excel file: {e}")
+            extraction_error(f"Error reading Excel file: {e}")
     
     # Remove duplicates
     wo_styles = list(set(wo_styles))
@@ -1432,7 +1576,7 @@ def get_excel_style_numbers(excel_file):
                         return styles
             return []
     except Exception as e:
-        st.error(f"Error reading Excel file: {e}")
+        extraction_error(f"Error reading Excel file: {e}")
         return []
 
 def extract_wo_items_table_enhanced(pdf_file, product_codes=None):
@@ -1555,7 +1699,7 @@ def debug_extract_product_codes(pdf_file):
                                 st.write(f"  ✗ No match found")
     
     except Exception as e:
-        st.error(f"Error in debug extraction: {e}")
+        extraction_error(f"Error in debug extraction: {e}")
 
 def extract_product_codes_from_item_column(pdf_file):
     """
@@ -1619,7 +1763,7 @@ def extract_product_codes_from_item_column(pdf_file):
                                     product_codes.append(product_code)
     
     except Exception as e:
-        st.error(f"Error extracting product codes: {e}")
+        extraction_error(f"Error extracting product codes: {e}")
     
     # Remove duplicates while preserving order
     seen = set()
@@ -1711,15 +1855,13 @@ def extract_po_product_codes_from_tag_hang_pattern(pdf_file):
     This function looks for patterns like "TAG.HANG_ABC123_TAGPRCTKT" in the text.
     """
     try:
-        pdf_file.seek(0)
-        with pdfplumber.open(pdf_file) as pdf:
-            text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+        text = as_parsed_pdf(pdf_file).text
         
         # Extract TAG.HANG patterns
         tag_hang_codes = re.findall(r'TAG\.HANG_(.*?)_TAGPRCTKT', text)
         return tag_hang_codes
     except Exception as e:
-        st.error(f"Error extracting PO product codes from TAG.HANG pattern: {e}")
+        extraction_error(f"Error extracting PO product codes from TAG.HANG pattern: {e}")
         return []
 
 def extract_all_po_product_codes(pdf_file):
@@ -1728,9 +1870,8 @@ def extract_all_po_product_codes(pdf_file):
     Returns a list of unique product codes found in the PO.
     """
     try:
-        pdf_file.seek(0)
-        with pdfplumber.open(pdf_file) as pdf:
-            text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+        doc = as_parsed_pdf(pdf_file)
+        text = doc.text
         
         all_codes = []
         
@@ -1751,7 +1892,7 @@ def extract_all_po_product_codes(pdf_file):
         all_codes.extend(tag_hang_codes)
         
         # Pattern 4: Extract from Item column using TAG.HANG pattern
-        tag_hang_item_codes = extract_po_product_codes_from_tag_hang_pattern(pdf_file)
+        tag_hang_item_codes = extract_po_product_codes_from_tag_hang_pattern(doc)
         all_codes.extend(tag_hang_item_codes)
         
         # Pattern 5: Any 8-digit numbers (common style numbers)
@@ -1778,7 +1919,7 @@ def extract_all_po_product_codes(pdf_file):
         return cleaned_codes
         
     except Exception as e:
-        st.error(f"Error extracting PO product codes: {e}")
+        extraction_error(f"Error extracting PO product codes: {e}")
         return []
     
 def check_vsba_in_po_line(pdf_file):
@@ -1788,28 +1929,26 @@ def check_vsba_in_po_line(pdf_file):
     """
     try:
         # First, extract the PO number
-        po_number = extract_po_number(pdf_file)
+        doc = as_parsed_pdf(pdf_file)
+        po_number = extract_po_number(doc)
         if not po_number:
             return False
         
         # Now, search for the line containing the PO number
-        pdf_file.seek(0)
-        with pdfplumber.open(pdf_file) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    lines = text.split('\n')
-                    for line in lines:
-                        # Check if this line contains the PO number
-                        if po_number in line:
-                            # Now check if "VSBA" is in the same line
-                            if "VSBA" in line.upper():
-                                return True
-        
+        for page_num, text in doc.iter_page_texts():
+            if text:
+                lines = text.split('\n')
+                for line in lines:
+                    # Check if this line contains the PO number
+                    if po_number in line:
+                        # Now check if "VSBA" is in the same line
+                        if "VSBA" in line.upper():
+                            return True
+
         return False
         
     except Exception as e:
-        st.error(f"Error checking VSBA in PO line: {e}")
+        extraction_error(f"Error checking VSBA in PO line: {e}")
         return False
     
 def extract_item_description_product_code_and_check_vsba(pdf_file):
@@ -1819,28 +1958,26 @@ def extract_item_description_product_code_and_check_vsba(pdf_file):
     Returns a tuple: (product_code, vsba_found)
     """
     try:
-        pdf_file.seek(0)
-        with pdfplumber.open(pdf_file) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    lines = text.split('\n')
-                    for i, line in enumerate(lines):
-                        # Look for "Item Description" line
-                        if "Item Description" in line:
-                            # The product code should be in the next line (i+1)
-                            if i + 1 < len(lines):
-                                next_line = lines[i+1].strip()
-                                # Check if this line contains a product code pattern
-                                # Example: AG.PRC.TKT_PILB 497_REG_L47.625XW28.575mm-336593-VSBA
-                                if next_line and ("PRC.TKT" in next_line or "AG.PRC.TKT" in next_line):
-                                    # Check if VSBA is at the end
-                                    vsba_found = next_line.upper().endswith("VSBA")
-                                    return next_line, vsba_found
+        doc = as_parsed_pdf(pdf_file)
+        for page_num, text in doc.iter_page_texts():
+            if text:
+                lines = text.split('\n')
+                for i, line in enumerate(lines):
+                    # Look for "Item Description" line
+                    if "Item Description" in line:
+                        # The product code should be in the next line (i+1)
+                        if i + 1 < len(lines):
+                            next_line = lines[i+1].strip()
+                            # Check if this line contains a product code pattern
+                            # Example: AG.PRC.TKT_PILB 497_REG_L47.625XW28.575mm-336593-VSBA
+                            if next_line and ("PRC.TKT" in next_line or "AG.PRC.TKT" in next_line):
+                                # Check if VSBA is at the end
+                                vsba_found = next_line.upper().endswith("VSBA")
+                                return (next_line, vsba_found)
         return "", False
     except Exception as e:
         
-        st.error(f"Error extracting item description product code: {e}")
+        extraction_error(f"Error extracting item description product code: {e}")
         return "", False
 
 def extract_wo_product_code_with_vsba(pdf_file):
@@ -1849,9 +1986,7 @@ def extract_wo_product_code_with_vsba(pdf_file):
     Returns a dictionary with product code and VSBA status.
     """
     try:
-        pdf_file.seek(0)
-        with pdfplumber.open(pdf_file) as pdf:
-            text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+        text = as_parsed_pdf(pdf_file).text
         
         lines = text.split("\n")
         wo_codes_with_vsba = []
@@ -1881,7 +2016,7 @@ def extract_wo_product_code_with_vsba(pdf_file):
         
     except Exception as e:
         
-        st.error(f"Error extracting WO product code with VSBA: {e}")
+        extraction_error(f"Error extracting WO product code with VSBA: {e}")
         return []
 
 
@@ -1891,9 +2026,7 @@ def extract_po_product_code_with_vsba(pdf_file):
     Returns a dictionary with product code and VSBA status.
     """
     try:
-        pdf_file.seek(0)
-        with pdfplumber.open(pdf_file) as pdf:
-            text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+        text = as_parsed_pdf(pdf_file).text
         
         lines = text.split("\n")
         po_codes_with_vsba = []
@@ -1966,7 +2099,7 @@ def extract_po_product_code_with_vsba(pdf_file):
         
     except Exception as e:
         
-        st.error(f"Error extracting PO product code with VSBA: {e}")
+        extraction_error(f"Error extracting PO product code with VSBA: {e}")
         return []
 
 
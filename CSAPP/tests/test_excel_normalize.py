@@ -0,0 +1,143 @@
+import os
+import sys
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from excel_utils import process_excel_table_data, convert_excel_size_codes, excel_style_number, map_excel_columns
+from data_comparison import _excel_style_lookup
+
+
+# The iterrows implementations the column-wise code replaced, kept as the reference behaviour
+
+def iterrows_process_excel_table_data(all_table_data):
+    all_excel_items = []
+    for table_info in all_table_data:
+        excel_df = table_info['data']
+        if excel_df.empty:
+            continue
+        column_mapping = map_excel_columns(excel_df.columns)
+        for _, row in excel_df.iterrows():
+            excel_item = {}
+            for std_col, excel_col in column_mapping.items():
+                value = row[excel_col]
+                if pd.notna(value):
+                    if 'size' in std_col.lower():
+                        value = convert_excel_size_codes(value)
+                    excel_item[std_col] = str(value).strip()
+                else:
+                    excel_item[std_col] = ""
+            excel_item['Source File'] = table_info.get('file_name', 'Unknown File')
+            excel_item['Source Sheet'] = table_info['sheet_name']
+            for col in excel_df.columns:
+                if col not in column_mapping.values():
+                    value = row[col]
+                    excel_item[f"Excel {col}"] = str(value).strip() if pd.notna(value) else ""
+            all_excel_items.append(excel_item)
+
+    excel_data_df = pd.DataFrame(all_excel_items)
+    if not excel_data_df.empty:
+        excel_data_df = excel_data_df.replace("", float("nan"))
+        excel_data_df = excel_data_df.dropna(axis=1, how='all')
+        excel_data_df = excel_data_df.fillna("")
+        if 'Size' in excel_data_df.columns:
+            size_order = {"XS": 0, "S": 1, "M": 2, "L": 3, "XL": 4, "XXL": 5}
+            excel_data_df["Size_Order"] = excel_data_df["Size"].map(lambda x: size_order.get(str(x).strip().upper(), 99))
+            excel_data_df = excel_data_df.sort_values("Size_Order").drop("Size_Order", axis=1)
+        excel_data_df = excel_data_df.reset_index(drop=True)
+    return excel_data_df
+
+
+def iterrows_first_style(processed_data):
+    for _, row in processed_data.iterrows():
+        style = str(row.get('Style', '')).strip()
+        if style:
+            return style
+    return None
+
+
+def iterrows_find_excel_style(excel_data, wo_color, wo_size):
+    for _, row in excel_data.iterrows():
+        style = str(row.get('Excel Style', '')).strip()
+        color = str(row.get('Excel Colour Code', '')).strip().upper()
+        size = str(row.get('Excel Size', '')).strip().upper()
+        if style and color == wo_color.upper() and size == wo_size.upper():
+            return style
+    return None
+
+
+def sheet(data, name="Sheet1", file_name="order.xlsx"):
+    return {'data': pd.DataFrame(data), 'sheet_name': name, 'file_name': file_name}
+
+
+SHEET_SETS = {
+    "size codes and names": [sheet({
+        "Style": ["11200001", " 11200002 ", "11200003", "11200004"],
+        "CC": ["BLK", "WHT ", np.nan, "PINK"],
+        "Size": [33904, "033902", "XL", 0],
+        "Qty": [100, 250.5, np.nan, 3],
+    })],
+    "unmapped columns and blanks": [sheet({
+        "Style": ["", "A1", None, "A2"],
+        "Size": ["M", " s ", "XS", "33906"],
+        "Notes": [np.nan, np.nan, np.nan, np.nan],
+        "Vendor": ["v1", "", "  v3  ", np.nan],
+    })],
+    "sheets with different columns": [
+        sheet({"Style": ["A1", "A2"], "Size": ["L", "S"], "Retail US": [9.5, 12]}, "S1"),
+        sheet({"Colour": ["NAVY", "GRY"], "Size": [33901, 33905], "SKU": ["k1", "k2"]}, "S2", "other.xlsx"),
+        sheet({}, "Empty"),
+    ],
+    "float size codes stay as text": [sheet({"Style": ["A1", "A2"], "Size": [33902.0, 33903.5]})],
+    "only empty sheets": [sheet({}, "Empty")],
+}
+
+
+@pytest.mark.parametrize("name", SHEET_SETS)
+def test_process_excel_table_data_matches_iterrows(name):
+    new = process_excel_table_data(SHEET_SETS[name])
+    old = iterrows_process_excel_table_data(SHEET_SETS[name])
+    assert excel_style_number(new) == iterrows_first_style(old)
+    new.attrs = {}
+    pd.testing.assert_frame_equal(new, old)
+
+
+def random_sheet(rng):
+    columns = rng.sample(["Style", "CC", "Size", "Qty", "Retail US", "SKU", "Article", "Notes"], rng.randint(1, 6))
+    values = {
+        "Style": ["11200001", " A2 ", "", None, np.nan],
+        "CC": ["BLK", "wht", np.nan, ""],
+        "Size": [33901, 33906, "033903", "XL", " m ", np.nan, 0, 33902.0],
+        "Qty": [1, 2.5, np.nan, 1000],
+    }
+    rows = rng.randint(0, 8)
+    data = {col: [rng.choice(values.get(col, ["x", " y ", np.nan, 3])) for _ in range(rows)] for col in columns}
+    return sheet(data, f"S{rng.randint(1, 3)}")
+
+
+def test_random_sheet_sets_match_iterrows():
+    rng = random.Random(0)
+    for _ in range(200):
+        sheets = [random_sheet(rng) for _ in range(rng.randint(1, 3))]
+        new = process_excel_table_data(sheets)
+        old = iterrows_process_excel_table_data(sheets)
+        new.attrs = {}
+        pd.testing.assert_frame_equal(new, old)
+
+
+def test_style_lookups_match_iterrows():
+    processed = process_excel_table_data(SHEET_SETS["unmapped columns and blanks"])
+    assert excel_style_number(processed) == iterrows_first_style(processed)
+
+    excel_data = pd.DataFrame({
+        "Excel Style": ["", "S1", "S2", "S3", None],
+        "Excel Colour Code": ["blk", "BLK ", "BLK", "wht", "WHT"],
+        "Excel Size": ["M", "m", "M", "L", "L"],
+    })
+    lookup = _excel_style_lookup(excel_data)
+    for color, size in [("BLK", "M"), ("blk", "m"), ("WHT", "L"), ("NAVY", "S")]:
+        assert lookup.get((color.upper(), size.upper())) == iterrows_find_excel_style(excel_data, color, size)
@@ -0,0 +1,92 @@
+import os
+import sys
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from excel_scan import STOP_TEXT, find_table_end, rows_with_text
+
+
+# The row-by-row loops excel_scan replaced, kept as the reference behaviour
+
+def loop_rows_with_text(df, text, start=0):
+    """read_excel_table: rows from `start` with `text` in a string cell"""
+    return [idx for idx in range(start, len(df))
+            if any(isinstance(cell, str) and text in cell for cell in df.iloc[idx])]
+
+
+def loop_find_table_end(df, stop_phrase=STOP_TEXT.lower()):
+    """ExcelExtracter: first row with the stop phrase or "total", or "None" in the first column"""
+    for i in range(len(df)):
+        row = df.iloc[i]
+        row_text = " ".join(str(x).lower() for x in row if pd.notna(x))
+        if stop_phrase in row_text:
+            return i
+        if len(row) > 0 and str(row.iloc[0]).strip().lower() == "none":
+            return i
+        if "total" in row_text:
+            return i
+    return None
+
+
+def frame(columns, dtype=None):
+    return pd.DataFrame(columns, dtype=dtype)
+
+
+FRAMES = {
+    "no stop": frame({"Style": ["A1", "A2", "A3"], "Qty": [10, 20, 30]}),
+    "None text in first column": frame({"Style": ["A1", " none ", "A3"], "Qty": [1, 2, 3]}),
+    "Python None in first column": frame({"Style": ["A1", None, "A3"], "Qty": [1, 2, 3]}, dtype=object),
+    "NaN in first column": frame({"Style": ["A1", np.nan, "A3"], "Qty": [1.0, np.nan, 3.0]}),
+    "total in a later column": frame({"Style": ["A1", "A2", ""], "Note": [np.nan, "x", "Grand TOTAL"]}),
+    "total inside a word": frame({"Style": ["A1", "subtotals"], "Qty": [1, 2]}),
+    "stop phrase, other case": frame({"Style": ["A1", "A2"], "Note": ["", STOP_TEXT.upper()]}),
+    "stop phrase across two cells": frame({
+        "Style": ["A1", "Ticket quantities will be rounded up"],
+        "Note": ["", "in minimums and multiples of 100 pcs."],
+    }),
+    "numeric and NaN cells only": frame({"a": [1.5, np.nan, 3.0], "b": [np.nan, np.nan, 7]}),
+    "dates and booleans": frame({
+        "Style": ["A1", "A2"],
+        "Date": pd.to_datetime(["2025-01-01", "2025-02-01"]),
+        "Flag": [True, False],
+    }),
+    "mixed object column": frame({"Style": ["A1", 5, "A3"], "Note": [3.5, "x", STOP_TEXT]}, dtype=object),
+    "empty": pd.DataFrame(),
+}
+
+
+@pytest.mark.parametrize("name", FRAMES)
+def test_find_table_end_matches_the_row_loop(name):
+    df = FRAMES[name]
+    assert find_table_end(df) == loop_find_table_end(df)
+
+
+@pytest.mark.parametrize("name", FRAMES)
+def test_rows_with_text_matches_the_row_loop(name):
+    df = FRAMES[name]
+    for start in (0, 1):
+        assert rows_with_text(df, STOP_TEXT, start=start) == loop_rows_with_text(df, STOP_TEXT, start=start)
+
+
+def random_frame(rng, rows, cols):
+    """Frame mixing every kind of cell the stop conditions look at"""
+    cells = ["A1", "B2", " None ", "none", "Total", "subtotal", STOP_TEXT, STOP_TEXT.lower(),
+             "Ticket quantities", None, np.nan, 0, 12.5, 33902, True, ""]
+    data = {f"c{c}": [rng.choice(cells) for _ in range(rows)] for c in range(cols)}
+    # Some all-number columns, as read_excel gives for quantity columns
+    data["qty"] = [rng.choice([1.0, 2.5, np.nan]) for _ in range(rows)]
+    return pd.DataFrame(data)
+
+
+def test_random_frames_match_the_row_loops():
+    rng = random.Random(0)
+    for _ in range(300):
+        df = random_frame(rng, rng.randint(0, 12), rng.randint(1, 4))
+        assert find_table_end(df) == loop_find_table_end(df)
+        start = rng.randint(0, 3)
+        assert rows_with_text(df, STOP_TEXT, start=start) == loop_rows_with_text(df, STOP_TEXT, start=start)
@@ -0,0 +1,141 @@
+import os
+import csv
+import time
+import uuid
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+import pandas as pd
+
+from logging_utils import LOG_DIR
+
+# Stage timings of every run are appended here for trend analysis
+METRICS_FILE = os.path.join(LOG_DIR, "stage_timings.csv")
+METRICS_COLUMNS = ["Timestamp", "Run ID", "Run", "Stage", "Depth", "Seconds", "Pages", "Bytes"]
+
+# Records of the run being collected and the nesting depth of the open stages;
+# both are per thread, so concurrent Streamlit sessions do not mix their numbers
+_current_run = ContextVar("csapp_timing_run", default=None)
+_depth = ContextVar("csapp_timing_depth", default=0)
+
+_metrics_lock = threading.Lock()
+
+
+@contextmanager
+def stage(name, pages=None, nbytes=None):
+    """
+    Time the enclosed block as one stage of the current run.
+
+    Yields the stage record, so the caller can fill in "pages" and "bytes"
+    once they are known. Outside collect_timings() nothing is recorded.
+    """
+    record = {"stage": name, "depth": _depth.get(), "seconds": None, "pages": pages, "bytes": nbytes}
+    run = _current_run.get()
+    if run is not None:
+        run.append(record)  # in start order, so a parent stage comes before its nested ones
+    token = _depth.set(record["depth"] + 1)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        _depth.reset(token)
+
+
+def _document_size(doc):
+    """(pages, bytes) of a document argument, without opening it just for the count"""
+    pages = None
+    nbytes = None
+    data = getattr(doc, "data", None)
+    if isinstance(data, (bytes, bytearray)):
+        nbytes = len(data)
+        # ParsedPDF opens its document on first use; only count pages of an engine already open
+        engine = "_fitz_doc" if getattr(doc, "backend", None) == "pymupdf" else "_pdf"
+        if getattr(doc, engine, None) is not None:
+            try:
+                pages = doc.page_count
+            except Exception:
+                pages = None
+    elif isinstance(doc, (bytes, bytearray)):
+        nbytes = len(doc)
+    elif hasattr(doc, "getbuffer"):
+        nbytes = doc.getbuffer().nbytes  # BytesIO and Streamlit uploads
+    elif isinstance(doc, (str, os.PathLike)) and os.path.isfile(doc):
+        nbytes = os.path.getsize(doc)
+    return pages, nbytes
+
+
+def timed(name=None):
+    """Decorator recording each call as a stage, sized by its first (document) argument"""
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_run.get() is None:
+                return func(*args, **kwargs)
+            with stage(stage_name) as record:
+                result = func(*args, **kwargs)
+                if args:
+                    record["pages"], record["bytes"] = _document_size(args[0])
+            return result
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def collect_timings(run_name, write_metrics=True):
+    """
+    Collect the stages timed inside the block; yields the list of records.
+
+    When the block ends the records are appended to METRICS_FILE (unless
+    write_metrics is False). Nested collections each keep their own records.
+    """
+    records = []
+    token = _current_run.set(records)
+    try:
+        yield records
+    finally:
+        _current_run.reset(token)
+        if write_metrics and records:
+            append_metrics(run_name, records)
+
+
+def append_metrics(run_name, records, metrics_file=None):
+    """Append the stage records of one run to the metrics CSV; returns False if it cannot be written"""
+    metrics_file = metrics_file or METRICS_FILE
+    timestamp = datetime.now().isoformat(timespec="seconds")
+    run_id = uuid.uuid4().hex[:12]
+    rows = [
+        [timestamp, run_id, run_name, r["stage"], r["depth"], f"{r['seconds']:.4f}",
+         "" if r["pages"] is None else r["pages"], "" if r["bytes"] is None else r["bytes"]]
+        for r in records
+    ]
+    try:
+        os.makedirs(os.path.dirname(metrics_file), exist_ok=True)
+        with _metrics_lock:
+            new_file = not os.path.exists(metrics_file) or os.path.getsize(metrics_file) == 0
+            with open(metrics_file, "a", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(METRICS_COLUMNS)
+                writer.writerows(rows)
+        return True
+    except OSError:
+        # Metrics are best effort; they never block an analysis
+        return False
+
+
+def timings_dataframe(records):
+    """Stage records as a table for the timing panel, in the order the stages started"""
+    if not records:
+        return pd.DataFrame(columns=["Stage", "Seconds", "Pages", "Bytes"])
+    return pd.DataFrame({
+        "Stage": ["    " * r["depth"] + r["stage"] for r in records],
+        "Seconds": [round(r["seconds"], 4) for r in records],
+        "Pages": pd.array([r["pages"] for r in records], dtype="Int64"),
+        "Bytes": pd.array([r["bytes"] for r in records], dtype="Int64"),
+    })
@@ -1,6 +1,12 @@
+import os
+import sys
 import streamlit as st
 import pandas as pd
 
+# The stop-condition scanner is shared with the CSAPP Excel reader
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "CSAPP"))
+from excel_scan import find_table_end
+
 st.title("📊 Extract Table from B22 Until End Conditions")
 
 uploaded_files = st.file_uploader("Upload Excel files", type=["xlsx", "xls"], accept_multiple_files=True)
@@ -12,29 +18,8 @@ def extract_table(file):
     # Start from column B (index 1) and drop completely empty columns
     df = df.iloc[:, 1:].dropna(axis=1, how='all')
     
-    # Initialize variables
-    stop_phrase = "ticket quantities will be rounded up in minimums and multiples of 100 pcs."
-    cut_index = None
-    
-    # Find the first row where any stop condition is met
-    for i in range(len(df)):
-        row = df.iloc[i]
-        
-        # Condition 1: Check for stop phrase in any column
-        row_text = " ".join(str(x).lower() for x in row if pd.notna(x))
-        if stop_phrase in row_text:
-            cut_index = i
-            break
-            
-        # Condition 2: Check for "None" in first column (Style column)
-        if len(row) > 0 and str(row.iloc[0]).strip().lower() == "none":
-            cut_index = i
-            break
-            
-        # Condition 3: Check for "total" in the row
-        if "total" in row_text:
-            cut_index = i
-            break
+    # Find the first row with the stop phrase or "total" in any column, or "None" in the first (Style) column
+    cut_index = find_table_end(df)
     
     # If stop condition found, keep only rows before it
     if cut_index is not None:
@@ -0,0 +1,340 @@
+import io
+import re
+import fitz  # PyMuPDF
+import pdfplumber
+
+# Text engines for price tickets; "pymupdf" is much faster per page than "pdfplumber"
+TEXT_BACKENDS = ("pdfplumber", "pymupdf")
+TEXT_BACKEND = "pdfplumber"
+
+# ---------------------- Helpers for Price Tickets ----------------------
+def read_pdf_text(file_bytes: bytes, backend: str = TEXT_BACKEND) -> list[str]:
+    if backend not in TEXT_BACKENDS:
+        raise ValueError(f"Unknown text backend '{backend}', expected one of {TEXT_BACKENDS}")
+    texts = []
+    if backend == "pymupdf":
+        with fitz.open(stream=file_bytes, filetype="pdf") as doc:
+            for page in doc:
+                # sort=True reads top-to-bottom, left-to-right like pdfplumber
+                text = page.get_text("text", sort=True).rstrip("\n")
+                text = re.sub(r"\u00A0", " ", text)
+                texts.append(text)
+        return texts
+    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+        for page in pdf.pages:
+            text = page.extract_text() or ""
+            text = re.sub(r"\u00A0", " ", text)
+            texts.append(text)
+    return texts
+
+def full_text(pages: list[str]) -> str:
+    return "\n".join(pages)
+
+# ------------------ Field Extractors for Price Tickets ------------------
+PO_NUM_PATTERNS = [
+    r"\bPO\s*Number\s*[-:]*\s*(\d+)\b",
+    r"\bPO\s*Number\s*\n\s*(\d+)\b",
+]
+
+def extract_po_number(text: str) -> str | None:
+    for pat in PO_NUM_PATTERNS:
+        m = re.search(pat, text, flags=re.IGNORECASE)
+        if m:
+            return m.group(1).strip()
+    return None
+
+def extract_product_codes(text: str) -> list[dict]:
+    # Split text into lines for line-by-line processing
+    lines = text.split('\n')
+    result = []
+    
+    # Pattern to match item code and product code line for TKT
+    tkt_pattern = r'^(\d+)\s+(TKT\s+.*)$'
+    
+    # Pattern to match terms and conditions section (numbered items)
+    terms_pattern = r'^\d+\.\s+The\s+'
+    
+    # Pattern to match SO number
+    so_pattern = r'^(\d+\s*/\s*\d+)$'
+    
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        
+        # Skip terms and conditions section
+        if re.match(terms_pattern, line, re.IGNORECASE):
+            # Skip all numbered items until we find a non-numbered line
+            while i < len(lines) and re.match(r'^\d+\.', lines[i].strip()):
+                i += 1
+            continue
+        
+        # Try to match TKT pattern first
+        tkt_match = re.match(tkt_pattern, line, re.IGNORECASE)
+        
+        if tkt_match:
+            item_code = tkt_match.group(1).strip()
+            full_product_code = tkt_match.group(2).strip()
+            
+            # Extract SO Number from the line immediately after this line (i+1)
+            primary_so_number = None
+            if i + 1 < len(lines):
+                so_line = lines[i + 1].strip()
+                primary_so_number = so_line
+            
+            # Remove "TKT" from the beginning of the product code
+            without_tkt = re.sub(r'^TKT\s*', '', full_product_code, flags=re.IGNORECASE).strip()
+            
+            # Check if this is a TKT LB product code
+            if "LB" in without_tkt:
+                # Extract LB and 4 digits (skip any "-" between)
+                lb_match = re.search(r'LB\s*-?(\d{4})', without_tkt, re.IGNORECASE)
+                if lb_match:
+                    product_code = "LB" + lb_match.group(1).strip()
+                    
+                    # Get the text after the product code
+                    after_product = without_tkt[lb_match.end():].strip()
+                    
+                    # Find 8-digit style number
+                    style_match = re.search(r'(\d{8})', after_product)
+                    if style_match:
+                        style = style_match.group(1)
+                        
+                        # Get the text after the style number
+                        after_style = after_product[style_match.end():].strip()
+                        
+                        # Find 4-character code (letters and numbers) before slash
+                        color_match = re.search(r'([A-Z0-9]{4})\s*/', after_style)
+                        if color_match:
+                            color_code = color_match.group(1)
+                        else:
+                            # Try to find 4-character code without slash
+                            color_match = re.search(r'([A-Z0-9]{4})', after_style)
+                            if color_match:
+                                color_code = color_match.group(1)
+                            else:
+                                color_code = None
+                    else:
+                        style = None
+                        color_code = None
+                else:
+                    product_code = without_tkt
+                    style = None
+                    color_code = None
+            else:
+                # Regular TKT product code processing
+                # Extract base product code (up to and including first 'F')
+                f_match = re.search(r"(.*?F)", without_tkt, re.IGNORECASE)
+                base_product_code = f_match.group(1) if f_match else without_tkt
+                
+                # Get the text after the base product code
+                after_base = without_tkt[len(base_product_code):].strip()
+                
+                # Find 8-digit style number
+                style_match = re.search(r'(\d{8})', after_base)
+                if style_match:
+                    style = style_match.group(1)
+                    
+                    # Get the text after the style number
+                    after_style = after_base[style_match.end():].strip()
+                    
+                    # Find 4-character code (letters and numbers) before slash
+                    color_match = re.search(r'([A-Z0-9]{4})\s*/', after_style)
+                    if color_match:
+                        color_code = color_match.group(1)
+                    else:
+                        # Try to find 4-character code without slash
+                        color_match = re.search(r'([A-Z0-9]{4})', after_style)
+                        if color_match:
+                            color_code = color_match.group(1)
+                        else:
+                            color_code = None
+                else:
+                    style = None
+                    color_code = None
+                
+                product_code = base_product_code
+            
+            # Now extract table data belonging to this SO number
+            table_data = []
+            current_so_number = primary_so_number
+            j = i + 2  # Start from the line after SO number
+            
+            # Continue until we hit another item code or end of document
+            while j < len(lines):
+                next_line = lines[j].strip()
+                
+                # Check if we've reached another item code
+                if re.match(r'^\d+\s+(TKT|LB)', next_line, re.IGNORECASE):
+                    break
+                
+                # Check if we've reached terms and conditions
+                if re.match(terms_pattern, next_line, re.IGNORECASE):
+                    break
+                
+                # Check if this line is an SO number
+                so_match = re.match(so_pattern, next_line)
+                if so_match:
+                    # Update the current SO number
+                    current_so_number = so_match.group(1)
+                    j += 1
+                    continue
+                
+                # Skip empty lines
+                if not next_line:
+                    j += 1
+                    continue
+                
+                # Check if this line is a table row (starts with a number)
+                if re.match(r'^\d', next_line):
+                    tokens = next_line.split()
+                    
+                    # Extract table data if we have at least 3 tokens (line number, size, size qty)
+                    if len(tokens) >= 3:
+                        line_number = tokens[0]
+                        size = tokens[1]
+                        size_qty = tokens[2]
+                        
+                        table_data.append({
+                            "Line Number": line_number,
+                            "Size": size,
+                            "Size Qty": size_qty,
+                            "SO Number": current_so_number
+                        })
+                
+                j += 1
+            
+            # Add all table data rows to the result
+            for data in table_data:
+                result.append({
+                    "Item Code": item_code,
+                    "Product Code": product_code,
+                    "Style": style,
+                    "Color Code": color_code,
+                    "SO Number": data["SO Number"],
+                    "Line Number": data["Line Number"],
+                    "Size": data["Size"],
+                    "Size Qty": data["Size Qty"]
+                })
+            
+            # Move the index to the end of the current table data
+            i = j
+        else:
+            # Check for LB product code pattern (without TKT)
+            lb_match = re.match(r'^(\d+)\s+(LB\d{4})\s+(\d{8})\s+([A-Z0-9]{4})', line, re.IGNORECASE)
+            if lb_match:
+                item_code = lb_match.group(1).strip()
+                product_code = lb_match.group(2).strip()  # LB followed by 4 digits
+                style = lb_match.group(3).strip()          # 8 digits
+                color_code = lb_match.group(4).strip()     # 4 alphanumeric characters
+                
+                # Extract SO Number from the line immediately after this line (i+1)
+                primary_so_number = None
+                if i + 1 < len(lines):
+                    so_line = lines[i + 1].strip()
+                    primary_so_number = so_line
+                
+                # Now extract table data belonging to this SO number
+                table_data = []
+                current_so_number = primary_so_number
+                j = i + 2  # Start from the line after SO number
+                
+                # Continue until we hit another item code or end of document
+                while j < len(lines):
+                    next_line = lines[j].strip()
+                    
+                    # Check if we've reached another item code
+                    if re.match(r'^\d+\s+(TKT|LB)', next_line, re.IGNORECASE):
+                        break
+                    
+                    # Check if we've reached terms and conditions
+                    if re.match(terms_pattern, next_line, re.IGNORECASE):
+                        break
+                    
+                    # Check if this line is an SO number
+                    so_match = re.match(so_pattern, next_line)
+                    if so_match:
+                        # Update the current SO number
+                        current_so_number = so_match.group(1)
+                        j += 1
+                        continue
+                    
+                    # Skip empty lines
+                    if not next_line:
+                        j += 1
+                        continue
+                    
+                    # Check if this line is a table row (starts with a number)
+                    if re.match(r'^\d', next_line):
+                        tokens = next_line.split()
+                        
+                        # Extract table data if we have at least 3 tokens (line number, size, size qty)
+                        if len(tokens) >= 3:
+                            line_number = tokens[0]
+                            size = tokens[1]
+                            size_qty = tokens[2]
+                            
+                            table_data.append({
+                                "Line Number": line_number,
+                                "Size": size,
+                                "Size Qty": size_qty,
+                                "SO Number": current_so_number
+                            })
+                    
+                    j += 1
+                
+                # Add all table data rows to the result
+                for data in table_data:
+                    result.append({
+                        "Item Code": item_code,
+                        "Product Code": product_code,
+                        "Style": style,
+                        "Color Code": color_code,
+                        "SO Number": data["SO Number"],
+                        "Line Number": data["Line Number"],
+                        "Size": data["Size"],
+                        "Size Qty": data["Size Qty"]
+                    })
+                
+                # Move the index to the end of the current table data
+                i = j
+            else:
+                i += 1
+    
+    return result
+
+
+def process_ticket(file_bytes: bytes, backend: str = TEXT_BACKEND) -> list[dict]:
+    """Table rows of one price ticket PDF; top-level so it can run in a worker process"""
+    text = full_text(read_pdf_text(file_bytes, backend=backend))
+    
+    po_number = extract_po_number(text)
+    product_codes = extract_product_codes(text)
+    
+    if not product_codes:
+        # If no product codes found, add a row with PO number only
+        return [{
+            "PO Number": po_number,
+            "Item Code": None,
+            "Product Code": None,
+            "Style": None,
+            "Color Code": None,
+            "SO Number": None,
+            "Line Number": None,
+            "Size": None,
+            "Size Qty": None
+        }]
+    
+    rows = []
+    for code_data in product_codes:
+        rows.append({
+            "PO Number": po_number,
+            "Item Code": code_data["Item Code"],
+            "Product Code": code_data["Product Code"],
+            "Style": code_data["Style"],
+            "Color Code": code_data["Color Code"],
+            "SO Number": code_data["SO Number"],
+            "Line Number": code_data["Line Number"],
+            "Size": code_data["Size"],
+            "Size Qty": code_data["Size Qty"]
+        })
+    return rows
@@ -0,0 +1,185 @@
+import re
+import pandas as pd
+import streamlit as st
+import pdfplumber
+
+# ---------------------- WO PDF Extractor Functions ----------------------
+def extract_data_from_pdf(uploaded_file):
+    """
+    Extract data from MAS WO PDF with specific format handling for both formats
+    """
+    extracted_data = {
+        "PO Number": [],
+        "Item Code": [],
+        "Product Code": [],
+        "Style": [],
+        "Color Code": [],
+        "SO Number": [],
+        "Line Number": [],
+        "Size": [],
+        "SKU Desc": [],   # ✅ Changed header name
+        "Panty Length 2": [],
+        "Retail (US)": [],
+        "Retail (CA)": [],
+        "Multi Price": [],
+        "Product Desc": [],  # renamed for clarity (old SKU Desc was product description)
+        "Article": [],
+        "Quantity": []
+    }
+
+    try:
+        with pdfplumber.open(uploaded_file) as pdf:
+            text = ""
+            for page in pdf.pages:
+                page_text = page.extract_text()
+                if page_text:
+                    text += page_text + "\n"
+
+        # Extract header info
+        po_match = re.search(r'VS PO Number:\s*([^\n\r]+)', text, re.IGNORECASE)
+        item_match = re.search(r'Item Code:\s*([^\n\r]+)', text, re.IGNORECASE)
+        product_match = re.search(r'Product Code:\s*([^\n\r]+)', text, re.IGNORECASE)
+        so_match = re.search(r'SO Number:\s*([^\n\r]+)', text, re.IGNORECASE)
+        line_match = re.search(r'Line Item:\s*([^\n\r]+)', text, re.IGNORECASE)
+        product_desc_match = re.search(r'Product Description:\s*([^\n\r]+)', text, re.IGNORECASE)
+
+        po_number = po_match.group(1).strip() if po_match else ""
+        item_code = item_match.group(1).strip() if item_match else ""
+        product_code = product_match.group(1).strip() if product_match else ""
+        so_number = so_match.group(1).strip() if so_match else ""
+        line_number = line_match.group(1).strip() if line_match else ""
+        product_desc = product_desc_match.group(1).strip() if product_desc_match else ""
+
+        # Detect tables
+        lines = text.split('\n')
+        table_started = False
+        table_rows = []
+        table_format = None
+        
+        for i, line in enumerate(lines):
+            line = line.strip()
+
+            # Detect table header
+            if "Style Colour Code Size Panty Length" in line:
+                if "Retail (US)" in line and "Retail (CA)" in line:
+                    table_format = 'extended'
+                else:
+                    table_format = 'basic'
+                table_started = True
+                continue
+
+            if table_started:
+                if ("Number of Size Changes" in line or 
+                    "End of Works Order" in line or 
+                    line.startswith("International Trimmings")):
+                    break
+
+                if not line:
+                    continue
+
+                if table_format == 'extended':
+                    parts = re.split(r'\s+', line)
+                    if len(parts) >= 8:
+                        style = parts[0]
+                        color_code = parts[1]
+
+                        size_parts, price_start_idx = [], None
+                        for j, part in enumerate(parts[2:], 2):
+                            if part.startswith("$"):
+                                price_start_idx = j
+                                break
+                            size_parts.append(part)
+
+                        size = " ".join(size_parts) if size_parts else ""
+
+                        retail_us, retail_ca, multi_price = "", "", ""
+                        sku, article, quantity = "", "", ""
+
+                        if price_start_idx is not None and price_start_idx + 1 < len(parts):
+                            retail_us = parts[price_start_idx]
+                            retail_ca = parts[price_start_idx + 1]
+
+                            for k in range(price_start_idx + 2, len(parts)):
+                                if len(parts[k]) == 13 and parts[k].isdigit():
+                                    sku = parts[k]
+                                elif len(parts[k]) == 8 and parts[k].isdigit():
+                                    article = parts[k]
+                                elif parts[k].isdigit():
+                                    quantity = parts[k]
+
+                        # ✅ Skip empty rows
+                        if any([style, color_code, size, sku, article, quantity]):
+                            table_rows.append({
+                                "style": style,
+                                "color_code": color_code,
+                                "size": size,
+                                "sku_desc": sku,  # ✅ renamed
+                                "panty_length_2": "",
+                                "retail_us": retail_us,
+                                "retail_ca": retail_ca,
+                                "multi_price": multi_price,
+                                "article": article,
+                                "quantity": quantity
+                            })
+
+                elif table_format == 'basic':
+                    parts = re.split(r'\s+', line)
+                    if len(parts) >= 6:
+                        style = parts[0]
+                        color_code = parts[1]
+                        size = parts[2]
+
+                        sku, article, quantity = "", "", ""
+
+                        for j, part in enumerate(parts[3:], 3):
+                            if len(part) == 13 and part.isdigit():
+                                sku = part
+                                if j + 1 < len(parts) and len(parts[j+1]) == 8 and parts[j+1].isdigit():
+                                    article = parts[j+1]
+                                    if j + 2 < len(parts) and parts[j+2].isdigit():
+                                        quantity = parts[j+2]
+                                break
+
+                        if not quantity and parts[-1].isdigit():
+                            quantity = parts[-1]
+
+                        # ✅ Skip empty rows
+                        if any([style, color_code, size, sku, article, quantity]):
+                            table_rows.append({
+                                "style": style,
+                                "color_code": color_code,
+                                "size": size,
+                                "sku_desc": sku,  # ✅ renamed
+                                "panty_length_2": "",
+                                "retail_us": "",
+                                "retail_ca": "",
+                                "multi_price": "",
+                                "article": article,
+                                "quantity": quantity
+                            })
+
+        # Process extracted rows
+        for row in table_rows:
+            extracted_data["PO Number"].append(po_number)
+            extracted_data["Item Code"].append(item_code)
+            extracted_data["Product Code"].append(product_code)
+            extracted_data["Style"].append(row["style"])
+            extracted_data["Color Code"].append(row["color_code"])
+            extracted_data["SO Number"].append(so_number)
+            extracted_data["Line Number"].append(line_number)
+            extracted_data["Size"].append(row["size"])
+            extracted_data["SKU Desc"].append(row["sku_desc"])  # ✅ updated
+            extracted_data["Panty Length 2"].append(row["panty_length_2"])
+            extracted_data["Retail (US)"].append(row.get("retail_us", ""))
+            extracted_data["Retail (CA)"].append(row.get("retail_ca", ""))
+            extracted_data["Multi Price"].append(row.get("multi_price", ""))
+            extracted_data["Product Desc"].append(product_desc)
+            extracted_data["Article"].append(row["article"])
+            extracted_data["Quantity"].append(row["quantity"])
+
+    except Exception as e:
+        st.error(f"Error extracting data from {uploaded_file.name}: {str(e)}")
+        import traceback
+        st.error(f"Traceback: {traceback.format_exc()}")
+
+    return pd.DataFrame(extracted_data)
@@ -0,0 +1,91 @@
+"""
+Backend parity harness: run the text-only extractors with the pdfplumber and
+pymupdf text backends over the sample PDFs and diff the field output.
+
+Usage:
+    python benchmarks/backend_parity.py [pdf_dir ...] [--verbose]
+
+Defaults to the PDFs under "MAS/PriceTicket/MAS docs". Exits with status 1
+when any field differs between the two backends.
+"""
+import os
+import sys
+import json
+import glob
+import difflib
+import argparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "CSAPP"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "MAS", "PriceTicket"))
+
+import pdf_utils
+import ticket_extractor
+
+DEFAULT_PDF_DIR = os.path.join(REPO_ROOT, "MAS", "PriceTicket", "MAS docs")
+BACKENDS = ("pdfplumber", "pymupdf")
+
+
+def extract_fields(data, backend):
+    """Field output of every text-only extractor for one PDF and one backend"""
+    fields = {}
+    with pdf_utils.ParsedPDF(data, backend=backend) as doc:
+        fields["csapp.extract_wo_fields"] = pdf_utils.extract_wo_fields(doc)
+        fields["csapp.extract_po_details"] = pdf_utils.extract_po_details(doc)
+        fields["csapp.extract_all_so_numbers_from_wo"] = pdf_utils.extract_all_so_numbers_from_wo(doc)
+
+    text = ticket_extractor.full_text(ticket_extractor.read_pdf_text(data, backend=backend))
+    fields["mas.extract_po_number"] = ticket_extractor.extract_po_number(text)
+    fields["mas.extract_product_codes"] = ticket_extractor.extract_product_codes(text)
+    return fields
+
+
+def to_lines(value):
+    return json.dumps(value, indent=1, sort_keys=True, default=str).splitlines()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff extractor output between text backends")
+    parser.add_argument("pdf_dirs", nargs="*", default=[DEFAULT_PDF_DIR])
+    parser.add_argument("--verbose", action="store_true", help="print a unified diff for every mismatch")
+    args = parser.parse_args()
+
+    pdf_paths = []
+    for pdf_dir in args.pdf_dirs:
+        pdf_paths.extend(glob.glob(os.path.join(pdf_dir, "**", "*.pdf"), recursive=True))
+    pdf_paths.sort()
+    if not pdf_paths:
+        print("No PDFs found")
+        return 1
+
+    field_totals = {}
+    mismatches = 0
+    for path in pdf_paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        results = {backend: extract_fields(data, backend) for backend in BACKENDS}
+        name = os.path.relpath(path, REPO_ROOT)
+        for field, expected in results[BACKENDS[0]].items():
+            actual = results[BACKENDS[1]][field]
+            same = expected == actual
+            matched, total = field_totals.get(field, (0, 0))
+            field_totals[field] = (matched + same, total + 1)
+            if same:
+                continue
+            mismatches += 1
+            print(f"DIFF  {name}  {field}")
+            if args.verbose:
+                diff = difflib.unified_diff(to_lines(expected), to_lines(actual), BACKENDS[0], BACKENDS[1], lineterm="")
+                for line in diff:
+                    print(f"      {line}")
+
+    print()
+    print(f"{'Field':45} {'Identical':>10}")
+    for field, (matched, total) in field_totals.items():
+        print(f"{field:45} {matched:>4}/{total:<5}")
+    print(f"\n{len(pdf_paths)} PDFs, {mismatches} field mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""
+Extraction benchmark over the bundled MAS sample documents.
+
+Runs the price-ticket reader (read_pdf_text / extract_product_codes), the MAS
+WO extractor (extract_data_from_pdf), read_excel_table and the CSAPP WO/PO
+extractors over the PDFs and workbooks under MAS/PriceTicket. Each extractor
+is timed on a fresh document, so parsing is included. Reports per-document
+and per-page latency, peak Python memory (tracemalloc) and throughput.
+
+Baselines are per machine: run once with --save-baseline, later runs compare
+against the stored numbers and exit with status 1 when a benchmark's median
+ms/page or peak memory grew by more than --tolerance.
+
+Usage:
+    python benchmarks/bench_documents.py [doc_dir ...] [--repeat 3] [--limit 5] [--only csapp.] [--no-memory] [--verbose]
+    python benchmarks/bench_documents.py --save-baseline
+"""
+import os
+import io
+import sys
+import glob
+import json
+import time
+import argparse
+import statistics
+import tracemalloc
+from collections import Counter
+
+import fitz  # PyMuPDF
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "CSAPP"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "MAS", "PriceTicket"))
+
+import pdf_utils
+import ticket_extractor
+from excel_utils import read_excel_table
+from wo_extractor import extract_data_from_pdf
+
+MAS_DIR = os.path.join(REPO_ROOT, "MAS", "PriceTicket")
+DEFAULT_DOC_DIRS = [
+    os.path.join(MAS_DIR, "MAS docs"),
+    os.path.join(MAS_DIR, "MAS docs", "WO"),
+    os.path.join(MAS_DIR, "complete docs with one ref number"),
+]
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "bench_documents_baseline.json")
+
+
+def named_stream(path, data):
+    """BytesIO carrying the file name, like a Streamlit upload"""
+    stream = io.BytesIO(data)
+    stream.name = os.path.basename(path)
+    return stream
+
+
+def csapp_extractor(extractor):
+    """Run a CSAPP extractor on a freshly parsed document"""
+    def run(path, data):
+        with pdf_utils.ParsedPDF(data) as doc:
+            return extractor(doc)
+    return run
+
+
+def product_codes(path, data):
+    text = ticket_extractor.full_text(ticket_extractor.read_pdf_text(data))
+    return ticket_extractor.extract_product_codes(text)
+
+
+# name -> (document kind, runner(path, data))
+BENCHMARKS = {
+    "ticket.read_pdf_text": ("pdf", lambda path, data: ticket_extractor.read_pdf_text(data)),
+    "ticket.extract_product_codes": ("pdf", product_codes),
+    "mas.extract_data_from_pdf": ("wo", lambda path, data: extract_data_from_pdf(named_stream(path, data))),
+    "csapp.extract_wo_fields": ("wo", csapp_extractor(pdf_utils.extract_wo_fields)),
+    "csapp.extract_wo_items_table": ("wo", csapp_extractor(pdf_utils.extract_wo_items_table)),
+    "csapp.extract_all_so_numbers_from_wo": ("wo", csapp_extractor(pdf_utils.extract_all_so_numbers_from_wo)),
+    "csapp.extract_po_fields": ("po", csapp_extractor(pdf_utils.extract_po_fields)),
+    "csapp.extract_po_details": ("po", csapp_extractor(pdf_utils.extract_po_details)),
+    "csapp.extract_po_number": ("po", csapp_extractor(pdf_utils.extract_po_number)),
+    "excel.read_excel_table": ("excel", lambda path, data: read_excel_table(named_stream(path, data))),
+}
+
+
+def collect_documents(doc_dirs):
+    """(path, kind, pages) of every sample document; kind is "wo", "po" or "excel" """
+    documents = []
+    seen = set()
+    for doc_dir in doc_dirs:
+        for path in sorted(glob.glob(os.path.join(doc_dir, "*"))):
+            if path in seen or not os.path.isfile(path):
+                continue
+            seen.add(path)
+            name = os.path.basename(path)
+            ext = os.path.splitext(name)[1].lower()
+            if ext in (".xlsx", ".xls"):
+                documents.append((path, "excel", None))
+            elif ext == ".pdf":
+                with fitz.open(path) as doc:
+                    pages = doc.page_count
+                # WO files are named after their SW number; everything else is a PO / price ticket
+                kind = "wo" if name.upper().startswith("SW") else "po"
+                documents.append((path, kind, pages))
+    return documents
+
+
+def applies_to(bench_kind, doc_kind):
+    return bench_kind == doc_kind or (bench_kind == "pdf" and doc_kind in ("wo", "po"))
+
+
+def measure(runner, path, data, repeat, memory=True):
+    """Best wall time over `repeat` runs, and the tracemalloc peak of one more run (None without memory)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        runner(path, data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    if not memory:
+        return best, None
+    # tracemalloc slows pdfminer down several times, so the peak gets its own run
+    tracemalloc.start()
+    try:
+        runner(path, data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_benchmarks(documents, names, repeat, verbose, memory=True):
+    """Summary per benchmark: documents, pages, latencies, throughput and peak memory"""
+    summary = {}
+    for name in names:
+        kind, runner = BENCHMARKS[name]
+        rows = []
+        for path, doc_kind, pages in documents:
+            if not applies_to(kind, doc_kind):
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            seconds, peak = measure(runner, path, data, repeat, memory)
+            rows.append((path, pages, len(data), seconds, peak))
+            if verbose:
+                per_page = f"{seconds * 1000 / pages:10.1f}" if pages else f"{'-':>10}"
+                print(f"  {name:<38} {os.path.basename(path)[:48]:<48} {seconds * 1000:10.1f} ms {per_page} ms/page"
+                      f" {fmt(peak and peak / 2**20, 8)} MB")
+        if not rows:
+            continue
+        total_seconds = sum(r[3] for r in rows)
+        total_pages = sum(r[1] or 0 for r in rows)
+        total_bytes = sum(r[2] for r in rows)
+        paged = [r[3] * 1000 / r[1] for r in rows if r[1]]
+        summary[name] = {
+            "documents": len(rows),
+            "pages": total_pages,
+            "median_ms_per_doc": statistics.median(r[3] * 1000 for r in rows),
+            "median_ms_per_page": statistics.median(paged) if paged else None,
+            "docs_per_s": len(rows) / total_seconds if total_seconds else None,
+            "pages_per_s": total_pages / total_seconds if total_seconds and total_pages else None,
+            "mb_per_s": total_bytes / 2**20 / total_seconds if total_seconds else None,
+            "peak_mb": max(r[4] for r in rows) / 2**20 if memory else None,
+        }
+    return summary
+
+
+def fmt(value, width, digits=1):
+    return f"{'-':>{width}}" if value is None else f"{value:{width}.{digits}f}"
+
+
+def print_summary(summary):
+    print(f"{'Benchmark':<38} {'docs':>5} {'pages':>6} {'ms/doc':>9} {'ms/page':>9} {'docs/s':>8}"
+          f" {'pages/s':>8} {'MB/s':>7} {'peak MB':>8}")
+    for name, s in summary.items():
+        print(f"{name:<38} {s['documents']:>5} {s['pages']:>6} {fmt(s['median_ms_per_doc'], 9)}"
+              f" {fmt(s['median_ms_per_page'], 9)} {fmt(s['docs_per_s'], 8, 2)} {fmt(s['pages_per_s'], 8, 2)}"
+              f" {fmt(s['mb_per_s'], 7, 2)} {fmt(s['peak_mb'], 8)}")
+
+
+def compare_with_baseline(summary, baseline, tolerance):
+    """Regressions against the baseline: (benchmark, metric, baseline value, current value)"""
+    regressions = []
+    for name, current in summary.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in ("median_ms_per_page", "median_ms_per_doc", "peak_mb"):
+            if metric == "median_ms_per_doc" and current["median_ms_per_page"] is not None:
+                continue  # paged benchmarks are compared per page
+            old, new = base.get(metric), current.get(metric)
+            if old and new is not None and new > old * (1 + tolerance):
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the extractors over the bundled sample documents")
+    parser.add_argument("doc_dirs", nargs="*", default=DEFAULT_DOC_DIRS)
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per document (the best one counts)")
+    parser.add_argument("--limit", type=int, default=None, help="at most this many documents of each kind")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run (much faster)")
+    parser.add_argument("--only", default="", help="run only benchmarks whose name starts with this prefix")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a regression is reported")
+    parser.add_argument("--verbose", action="store_true", help="print every document")
+    args = parser.parse_args()
+
+    documents = collect_documents(args.doc_dirs)
+    if args.limit is not None:
+        seen = Counter()
+        limited = []
+        for document in documents:
+            seen[document[1]] += 1
+            if seen[document[1]] <= args.limit:
+                limited.append(document)
+        documents = limited
+    names = [name for name in BENCHMARKS if name.startswith(args.only)]
+    kinds = Counter(kind for _, kind, _ in documents)
+    print(f"{len(documents)} documents (" + ", ".join(f"{kind}: {n}" for kind, n in sorted(kinds.items())) + ")")
+
+    summary = run_benchmarks(documents, names, args.repeat, args.verbose, memory=not args.no_memory)
+    print_summary(summary)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(summary)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline stored; run with --save-baseline to create one")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(summary, baseline, args.tolerance)
+    for name, metric, old, new in regressions:
+        print(f"REGRESSION {name} {metric}: {old:.1f} -> {new:.1f} ({(new / old - 1) * 100:+.0f}%)")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions against the baseline (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark of the email body renderers (xhtml2pdf vs PyMuPDF Story).
+
+Renders email bodies through CARElabelApp's create_pdf_from_html with each
+renderer and prints wall time, output pages and size, and the peak memory
+added by the render. Each renderer runs in its own child process, so the
+peak includes MuPDF's native allocations (resident set size where the
+platform reports it, Python heap via tracemalloc otherwise).
+
+The bodies are the item table of a care-label order email with --rows rows;
+.msg/.eml/.html files given on the command line are rendered as well.
+
+Usage:
+    python benchmarks/bench_email_render.py [email files ...] [--rows 100 500 1000] [--repeat 3]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+import multiprocessing
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "CARElabelApp"))
+
+import email_processor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+COLUMNS = ["Style", "Color", "Care Detail", "Season", "Qty", "PO", "Ref", "Care code + content", "Garment description"]
+SIZES = ["XS", "S", "M", "L", "XL"]
+COLOURS = ["BLK", "WHT", "NAVY", "PINK", "5AR9", "GRY"]
+
+
+def make_email_html(rows, seed=0):
+    """Outlook-like email body: greeting, factory code / COO and an item table of `rows` rows"""
+    rng = random.Random(seed)
+    body = [
+        "<html><body>",
+        "<p>Dear Team,</p><p>Please find the PO details below.</p>",
+        "<p>Factory Code: K43913A6</p><p>COO: Sri Lanka</p>",
+        '<table border="1" cellspacing="0" cellpadding="4">',
+        "<tr>" + "".join(f"<th>{col}</th>" for col in COLUMNS) + "</tr>",
+    ]
+    for i in range(rows):
+        cells = [
+            f"{11200000 + i // 20:08d}", rng.choice(COLOURS), f"CD{rng.randint(100, 999)}", "SP26",
+            str(rng.randint(1, 5000)), f"{5786400 + i // 10}", f"R{i + 1}",
+            f"C{rng.randint(1, 40)} 85% NYLON 15% ELASTANE",
+            f"PINK KNIT BRIEF {rng.choice(SIZES)} WITH LACE TRIM",
+        ]
+        body.append("<tr>" + "".join(f"<td>{cell}</td>" for cell in cells) + "</tr>")
+    body.append("</table><p>Regards,<br>Merchandising</p></body></html>")
+    return "\n".join(body)
+
+
+def load_email_html(path):
+    """HTML body of a .msg/.eml file, or the content of an .html file"""
+    if path.lower().endswith((".msg", ".eml")):
+        deps = email_processor.load_dependencies()
+        _, _, _, html_content, _ = email_processor.extract_email_details(path, deps)
+        return html_content
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        return f.read()
+
+
+def _peak_bytes():
+    """Peak resident set size of this process, in bytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _render_worker(renderer, html, repeat, conn):
+    """Render `html` `repeat` times in this (fresh) process and send back the measurements"""
+    from xhtml2pdf import pisa
+    import fitz
+
+    out_path = os.path.join(tempfile.mkdtemp(), "email.pdf")
+
+    def render():
+        email_processor.create_pdf_from_html(
+            html, out_path, subject="PO 5786464 / 5786466 (N51)", factory_code="K43913A6", coo="Sri Lanka",
+            pisa=pisa, renderer=renderer, fitz=fitz
+        )
+
+    # Warm up fonts and lazy imports so they are not counted as render cost
+    email_processor.create_pdf_from_html("<p>warm up</p>", out_path, pisa=pisa, renderer=renderer, fitz=fitz)
+
+    if resource is not None:
+        baseline = _peak_bytes()
+    else:
+        tracemalloc.start()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    if resource is not None:
+        peak = _peak_bytes() - baseline
+    else:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    with fitz.open(out_path) as doc:
+        pages = doc.page_count
+    conn.send((best, peak, pages, os.path.getsize(out_path)))
+    conn.close()
+
+
+def measure(renderer, html, repeat):
+    parent, child = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_render_worker, args=(renderer, html, repeat, child))
+    process.start()
+    child.close()
+    result = parent.recv()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the email body HTML renderers")
+    parser.add_argument("emails", nargs="*", help=".msg, .eml or .html files to render as well")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--renderers", nargs="+", default=list(email_processor.HTML_RENDERERS),
+                        choices=email_processor.HTML_RENDERERS)
+    args = parser.parse_args()
+
+    bodies = [(f"{rows}-row table", make_email_html(rows)) for rows in args.rows]
+    bodies += [(os.path.basename(path), load_email_html(path)) for path in args.emails]
+
+    print(f"{'Email body':<28} {'renderer':<10} {'time (s)':>9} {'pages':>6} {'PDF KB':>8} {'peak MB':>8} {'speed-up':>9}")
+    for label, html in bodies:
+        times = {}
+        for renderer in args.renderers:
+            seconds, peak, pages, size = measure(renderer, html, args.repeat)
+            times[renderer] = seconds
+            speedup = ""
+            if renderer != "xhtml2pdf" and "xhtml2pdf" in times:
+                speedup = f"{times['xhtml2pdf'] / seconds:8.1f}x"
+            print(f"{label[:28]:<28} {renderer:<10} {seconds:9.3f} {pages:>6} {size / 1024:8.0f}"
+                  f" {peak / 2**20:8.1f} {speedup:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark of the email PDF merge engines (PyPDF2 PdfMerger vs PyMuPDF insert_pdf).
+
+Merges a rendered email page with attachment PDFs through CARElabelApp's
+merge_pdfs / merge_pdfs_pymupdf and prints time, throughput (input MB/s and
+pages/s) and output size for PyPDF2 and for PyMuPDF with several save
+options (garbage collection level, deflate).
+
+The attachments are the sample PDFs under MAS/PriceTicket plus a generated
+scanned attachment of --scan-pages full-page images; PDFs given on the
+command line are used instead of the samples.
+
+Usage:
+    python benchmarks/bench_pdf_merge.py [attachment.pdf ...] [--scan-pages 20] [--repeat 3]
+"""
+import os
+import io
+import sys
+import glob
+import time
+import random
+import argparse
+
+import fitz  # PyMuPDF
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "CARElabelApp"))
+
+import email_processor
+
+SAMPLE_DIR = os.path.join(REPO_ROOT, "MAS", "PriceTicket", "complete docs with one ref number")
+
+# label -> (engine, garbage, deflate)
+VARIANTS = {
+    "pypdf2": ("pypdf2", None, None),
+    "pymupdf": ("pymupdf", 0, False),
+    "pymupdf deflate": ("pymupdf", 0, True),
+    "pymupdf garbage=3+deflate": ("pymupdf", 3, True),
+}
+
+
+def make_scanned_pdf(pages, seed=0):
+    """PDF of `pages` A4 pages that each hold one full-page noisy greyscale image, like a scan"""
+    rng = random.Random(seed)
+    # 150 dpi greyscale A4; light-grey noise compresses about as badly as a real scan
+    width, height = 1240, 1754
+    light_grey = bytes(200 + value % 56 for value in range(256))
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page(width=595, height=842)
+        samples = rng.randbytes(width * height).translate(light_grey)
+        pixmap = fitz.Pixmap(fitz.csGRAY, width, height, samples, False)
+        page.insert_image(page.rect, stream=pixmap.tobytes("jpeg"))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_email_pdf():
+    buffer = io.BytesIO()
+    email_processor.render_html_pymupdf(
+        "<h2>Email Details</h2><p><b>Subject:</b> PO 5786464 / 5786466 (N51)</p><p>Please find the POs attached.</p>",
+        buffer, fitz
+    )
+    return buffer.getvalue()
+
+
+def merge(variant, inputs):
+    engine, garbage, deflate = VARIANTS[variant]
+    pdf_list = [(name, io.BytesIO(data)) for name, data in inputs]
+    output = io.BytesIO()
+    if engine == "pypdf2":
+        from PyPDF2 import PdfMerger, PdfReader
+        email_processor.merge_pdfs(pdf_list, output, PdfMerger, PdfReader)
+    else:
+        email_processor.merge_pdfs_pymupdf(pdf_list, output, fitz, garbage=garbage, deflate=deflate)
+    return output.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the email PDF merge engines")
+    parser.add_argument("attachments", nargs="*", help="attachment PDFs (default: the bundled samples)")
+    parser.add_argument("--scan-pages", type=int, default=20, help="pages of the generated scanned attachment (0 = none)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = args.attachments or sorted(glob.glob(os.path.join(SAMPLE_DIR, "*.pdf")))
+    attachments = []
+    for path in paths:
+        with open(path, "rb") as f:
+            attachments.append((os.path.basename(path), f.read()))
+    if args.scan_pages:
+        attachments.append(("scanned.pdf", make_scanned_pdf(args.scan_pages)))
+
+    inputs = [("email_content.pdf", make_email_pdf())] + attachments
+    input_bytes = sum(len(data) for _, data in inputs)
+    input_pages = 0
+    for _, data in inputs:
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            input_pages += doc.page_count
+    print(f"{len(inputs)} input PDFs, {input_pages} pages, {input_bytes / 2**20:.1f} MB")
+
+    print(f"{'engine':<28} {'time (s)':>9} {'MB/s':>8} {'pages/s':>9} {'output MB':>10} {'pages':>6}")
+    for variant in VARIANTS:
+        best = None
+        output = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            output = merge(variant, inputs)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        with fitz.open(stream=output, filetype="pdf") as doc:
+            pages = doc.page_count
+        print(f"{variant:<28} {best:9.3f} {input_bytes / 2**20 / best:8.1f} {input_pages / best:9.0f}"
+              f" {len(output) / 2**20:10.2f} {pages:>6}")
+
+
+if __name__ == "__main__":
+    main()
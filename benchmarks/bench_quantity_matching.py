@@ -0,0 +1,104 @@
+"""
+Benchmark of the WO/PO quantity matchers on synthetic orders.
+
+Compares the original nested-loop scan with the indexed matcher for growing
+order sizes, checks that both return identical results and prints the
+timings. The scan is quadratic, so it is skipped above --scan-max lines.
+The optimal (global assignment) matcher is timed alongside, with the total
+score (agreeing fields over all pairs) of the greedy and optimal pairings.
+
+Usage:
+    python benchmarks/bench_quantity_matching.py [--sizes 100 1000 10000] [--scan-max 5000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "CSAPP"))
+
+from data_comparison import enhanced_quantity_matching
+
+SIZES = ["XS", "S", "M", "L", "XL", "XXL", "32A", "34B", "36C", "38D"]
+COLOURS = ["BLK", "WHT", "NAVY", "RED", "PINK", "GRY", "BEIG", "5AR9"]
+
+
+def make_order(lines, mismatch_rate=0.1, seed=0):
+    """WO and PO item lists of `lines` lines; mismatch_rate of the PO lines differ in one field"""
+    rng = random.Random(seed)
+    styles = [f"{11200000 + i:08d}" for i in range(max(1, lines // 50))]
+    wo_items, po_details = [], []
+    for i in range(lines):
+        size, colour, style = rng.choice(SIZES), rng.choice(COLOURS), rng.choice(styles)
+        qty = rng.randint(1, 500)
+        wo_items.append({"Style": style, "Size 1": size, "WO Colour Code": colour, "Quantity": qty})
+
+        po = {"Style 2": style, "Size": size, "Colour_Code": colour, "Quantity": qty, "Item_Code": f"{i + 1:05d}"}
+        if rng.random() < mismatch_rate:
+            field = rng.choice(["Quantity", "Size", "Colour_Code", "Style 2"])
+            if field == "Quantity":
+                po["Quantity"] = qty + rng.randint(1, 20)
+            elif field == "Size":
+                po["Size"] = rng.choice(SIZES)
+            elif field == "Colour_Code":
+                po["Colour_Code"] = rng.choice(COLOURS)
+            else:
+                po["Style 2"] = ""
+        po_details.append(po)
+    # PO lines rarely come in WO order
+    rng.shuffle(po_details)
+    return wo_items, po_details
+
+
+def pairing_score(matched):
+    """Agreeing fields summed over all matched pairs (a full match scores 4)"""
+    return sum(
+        [row["Qty Match"], row["Size Match"], row["Colour Match"], row["Style Match"]].count("👍 Yes")
+        for row in matched
+    )
+
+
+def time_matcher(wo_items, po_details, mode, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = enhanced_quantity_matching(wo_items, po_details, tolerance=0, excel_style="11200000", mode=mode)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark WO/PO quantity matching")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 1000, 2500, 5000, 10000])
+    parser.add_argument("--scan-max", type=int, default=5000, help="largest order size to run the O(n*m) scan on")
+    parser.add_argument("--mismatch-rate", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'Lines':>7} {'scan (s)':>10} {'indexed (s)':>12} {'speed-up':>9} {'matched':>8} {'mismatched':>11} {'identical':>10}"
+          f" {'optimal (s)':>12} {'greedy score':>13} {'optimal score':>14}")
+    for lines in args.sizes:
+        wo_items, po_details = make_order(lines, args.mismatch_rate)
+        indexed_time, indexed_result = time_matcher(wo_items, po_details, "indexed", args.repeat)
+
+        if lines <= args.scan_max:
+            scan_time, scan_result = time_matcher(wo_items, po_details, "scan", 1)
+            identical = "yes" if scan_result == indexed_result else "NO"
+            scan_text = f"{scan_time:10.3f}"
+            speedup = f"{scan_time / indexed_time:8.0f}x"
+        else:
+            identical, scan_text, speedup = "-", f"{'skipped':>10}", f"{'-':>9}"
+
+        optimal_time, optimal_result = time_matcher(wo_items, po_details, "optimal", args.repeat)
+
+        matched, mismatched = indexed_result
+        print(f"{lines:>7} {scan_text} {indexed_time:12.4f} {speedup} {len(matched):>8} {len(mismatched):>11} {identical:>10}"
+              f" {optimal_time:12.4f} {pairing_score(matched):>13} {pairing_score(optimal_result[0]):>14}")
+
+
+if __name__ == "__main__":
+    main()